@@ -1,23 +1,47 @@
 import atexit
 import os
 import PySide6
-from PySide6.QtWidgets import QApplication, QGraphicsItem, QGraphicsLineItem, QGraphicsRectItem, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QVBoxLayout, QHBoxLayout, QPushButton, QWidget, QFileDialog, QMainWindow, QScrollArea, QLabel, QMenuBar, QMenu
-from PySide6.QtGui import QAction, QPainter, QPainterPath, QPen, QPixmap, QImage, QColor, QPalette, QIcon, QPolygonF, QWheelEvent
-from PySide6.QtCore import QEvent, QObject, QPointF, Qt, QThread, Signal, QRectF, QSize,  QTimer
-import pygetwindow as gw
+from PySide6.QtWidgets import QApplication, QGraphicsItem, QGraphicsLineItem, QGraphicsRectItem, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QVBoxLayout, QHBoxLayout, QPushButton, QWidget, QFileDialog, QMainWindow, QMenuBar, QMenu, QProgressBar, QToolTip, QListView, QAbstractItemView, QStyledItemDelegate, QStyle
+from PySide6.QtGui import QAction, QActionGroup, QLinearGradient, QPainter, QPainterPath, QPen, QPixelFormat, QPixmap, QImage, QImageWriter, QColor, QColorSpace, QPalette, QIcon, QRegion, QWheelEvent
+from PySide6.QtCore import QAbstractListModel, QEvent, QItemSelectionModel, QModelIndex, QObject, QPointF, Qt, QThread, Signal, QRect, QRectF, QSize,  QTimer
 import threading
-import win32con, win32gui, win32ui, win32process
 import ctypes
 import socket
 import time
 import json
 import sys
-import pywintypes
+import zlib
+import random
+import argparse
+import bisect
+import queue
+import shutil
+import tempfile
+import brv_protocol
+import brv_frames
+import brv_remote
+import mmap
+import struct
+import hashlib
+from collections import OrderedDict
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional, only needed by the vectorized compositor
+try:
+    import pygetwindow as gw
+    import win32con, win32gui, win32ui, win32process
+    import pywintypes
+except (ImportError, NotImplementedError):
+    # Window capture is Windows only, synthetic / replay backends still work without it
+    gw = None
+    win32con = win32gui = win32ui = win32process = pywintypes = None
 
 HOST = '127.0.0.1' 
 status = {'status': 'initial'}  # Global status variable
 status_lock = threading.Lock()  # Lock for thread-safe access to status
-WIN_HANDLES = None
+CAPTURE_RATES = (30, 15, 5)  # Target capture rates offered in the View menu (fps)
+FRAME_RING_SIZE = 3  # Capture buffers per backend: one being written, one queued, one being uploaded by the UI
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 ########################################
@@ -34,8 +58,23 @@ class Blender:
     window = None
     windowHandle = None
     blenderHandle = None
+    render_settings = {'resolution_x': resolution_x, 'resolution_y': resolution_y,
+                       'resolution_percentage': resolution_percentage}  # As last sent by blender, with the border and camera
+
+    @classmethod
+    def resolution_key(cls):
+        return (cls.resolution_x, cls.resolution_y, cls.resolution_percentage)
 
 class BlenderWindowMonitor:
+    WINDOW_TIMEOUT = 30  # Seconds to wait for blender to report the render window
+    FALLBACK_TIMEOUT = 5  # Seconds of window enumeration when it didn't
+    FALLBACK_INTERVAL = 0.1
+    window_event = threading.Event()
+    window_id = None  # Native handle / X11 id sent by blender with the window_created message
+    launched = time.perf_counter()
+    window_found = None  # Seconds after launch
+    first_frame = None
+
     @classmethod
     def start(cls):
         cls.find_new_blender_window()
@@ -43,28 +82,55 @@ class BlenderWindowMonitor:
     @classmethod
     def find_blender_windows(cls):
         # Get all windows with 'Blender' in their title
+        if gw is None:
+            # Linux, X11 window ids are used both as window and handle
+            blender_windows = X11.find_windows('Blender')
+            Blender.blenderHandle = blender_windows[0] if blender_windows else None
+            return blender_windows
         blender_windows = [window for window in gw.getWindowsWithTitle('Blender')]
-        Blender.blenderHandle = blender_windows[0]._hWnd
+        Blender.blenderHandle = blender_windows[0]._hWnd if blender_windows else None
         return blender_windows
-    
+
+    @classmethod
+    def window_created(cls, window_id):
+        # Socket listener thread, window_id is None when blender could not tell which window it created
+        cls.window_id = window_id
+        cls.window_event.set()
+
     @classmethod
     def find_new_blender_window(cls):
-        global status
         print(f"[BlenderRenderView] Waiting for viewport window...")
+        existingWindow = cls.find_blender_windows()  # Only needed by the enumeration fallback
         SocketClient.update_status('extui_waiting')
-        existingWindow = cls.find_blender_windows()
-        while True:
-            
-            if status == "viewport_created":
-                current_windows = cls.find_blender_windows()
-                # Find the window that is not in existing_windows
-                new_window = [window for window in current_windows if window not in existingWindow]
+        method = "reported by blender"
+        if not cls.window_event.wait(cls.WINDOW_TIMEOUT):
+            print(f"[BlenderRenderView] Blender did not report the viewport window within {cls.WINDOW_TIMEOUT} s")
+        if cls.window_id:
+            Blender.window = cls.window_id if gw is None else gw.Win32Window(cls.window_id)
+        else:
+            method = "found by enumeration"
+            deadline = time.perf_counter() + cls.FALLBACK_TIMEOUT
+            while Blender.window is None and time.perf_counter() < deadline:
+                new_window = [window for window in cls.find_blender_windows() if window not in existingWindow]
                 if new_window:
-                    Blender.window =  new_window[0]
-                    Blender.windowHandle = Blender.window._hWnd
-                    break
+                    Blender.window = new_window[0]
+                else:
+                    time.sleep(cls.FALLBACK_INTERVAL)
+        if Blender.window is None:
+            print(f"[BlenderRenderView] Viewport window not found")
+            return
+        Blender.windowHandle = Blender.window if gw is None else Blender.window._hWnd
+        cls.window_found = time.perf_counter() - cls.launched
+        print(f"[BlenderRenderView] Viewport window {Blender.windowHandle} {method} after {cls.window_found:.2f} s")
         cls.resize_window_to_resolution()
         SocketClient.update_status("extui_running")
+
+    @classmethod
+    def first_frame_displayed(cls):
+        cls.first_frame = time.perf_counter() - cls.launched
+        found = f", window found after {cls.window_found:.2f} s" if cls.window_found is not None else ""
+        print(f"[BlenderRenderView] First frame displayed {cls.first_frame:.2f} s after launch{found}")
+        SocketClient.send_message({"first_frame": round(cls.first_frame, 3)})
         
 
     @classmethod    
@@ -80,6 +146,16 @@ class BlenderWindowMonitor:
         if not Blender.window:
             return
         hwnd = Blender.windowHandle
+        resx = int(Blender.resolution_x * (Blender.resolution_percentage / 100))
+        resy = int(Blender.resolution_y * (Blender.resolution_percentage / 100))
+
+        if win32gui is None:
+            # X11: the client window is captured directly so decorations don't matter,
+            # and it stays on screen since an unmapped / offscreen window has no contents to read
+            X11.resize_window(hwnd, resx, resy)
+            SocketClient.send_message({"resized":"true"})
+            print(f"[BlenderRenderView] Blender viewport resized to {resx} x {resy} ({Blender.resolution_x} x {Blender.resolution_y} @ {Blender.resolution_percentage}%)")
+            return
 
         # Remove window borders and title bar
         style = win32gui.GetWindowLong(hwnd, win32con.GWL_STYLE)
@@ -92,8 +168,6 @@ class BlenderWindowMonitor:
         win32gui.SetWindowLong(hwnd, win32con.GWL_EXSTYLE, ex_style)
         
         # Resize the window
-        resx = int(Blender.resolution_x * (Blender.resolution_percentage / 100))
-        resy = int(Blender.resolution_y * (Blender.resolution_percentage / 100))
         win32gui.SetWindowPos(hwnd, win32con.HWND_TOP, 0, 0, int(resx), int(resy), win32con.SWP_NOMOVE | win32con.SWP_NOZORDER | win32con.SWP_FRAMECHANGED)
         SocketClient.send_message({"resized":"true"})
         print(f"[BlenderRenderView] Blender viewport resized to {resx} x {resy} ({Blender.resolution_x} x {Blender.resolution_y} @ {Blender.resolution_percentage}%)")
@@ -126,42 +200,66 @@ class SocketClient:
     PORT = 42069
     client_socket = None
     listener_thread = None
+    frame_backend = None  # SharedFrameBackend receiving the frame_ready messages, or RemoteFrameBackend
+    send_lock = threading.Lock()
+    capabilities = set()  # Shared with blender, known once it answered the hello
 
     @classmethod
-    def start(cls, host=HOST, port=PORT):
+    def start(cls, host=HOST, port=PORT, capabilities=brv_protocol.CAPABILITIES, policy=None):
         cls.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         cls.client_socket.connect((host, port))
+        cls.send_message(brv_protocol.hello(capabilities, policy))
         cls.listener_thread = threading.Thread(target=cls.listen_for_updates)
         cls.listener_thread.daemon = True
         cls.listener_thread.start()
 
     @classmethod
     def listen_for_updates(cls):
+        reader = brv_protocol.FrameReader()
         while True:
             try:
-                data = cls.client_socket.recv(1024)
+                data = cls.client_socket.recv(65536)
                 if not data:
                     break
-                try:
-                    received_message = json.loads(data.decode('utf-8'))
-                except:
-                    print("Error in data")
-                    continue
-                cls.handle_message(received_message)
+                for (received_message, payload) in reader.feed(data):
+                    cls.handle_message(received_message, payload)
+            except brv_protocol.ProtocolError as e:
+                print(f"[BlenderRenderView] Protocol error, disconnecting: {e}")
+                break
             except ConnectionResetError:
                 print("Disconnected from server.")
                 break
         time.sleep(1)
 
     @classmethod
-    def handle_message(cls, message):
+    def handle_message(cls, message, payload=b""):
+        if 'hello' in message:
+            cls.capabilities = brv_protocol.negotiate(message)
+            print(f"[BlenderRenderView] Connected to blender, protocol {message['hello']['version']}, "
+                  f"capabilities: {', '.join(sorted(cls.capabilities)) or 'none'}")
+        if 'error' in message:
+            print(f"[BlenderRenderView] Blender refused the connection: {message['error']}")
         if 'status' in message:
             cls.update_local_status(message['status'])
-        if 'resolution_x' in message:
-            Blender.resolution_x = message['resolution_x']
-            Blender.resolution_y = message['resolution_y']
-            Blender.resolution_percentage = message['resolution_percentage']
-            BlenderWindowMonitor.resize_window_to_resolution()
+        if 'frame_ready' in message and cls.frame_backend is not None:
+            cls.frame_backend.frame_ready(message['frame_ready'])
+        if 'remote_frame' in message and cls.frame_backend is not None:
+            cls.frame_backend.remote_frame(message['remote_frame'], payload)
+        if 'window_created' in message:
+            BlenderWindowMonitor.window_created(message['window_created'])
+        if 'render_settings' in message:
+            # Only the values that changed since the last message
+            settings = message['render_settings']
+            Blender.render_settings.update(settings)
+            if settings.keys() & {'resolution_x', 'resolution_y', 'resolution_percentage'}:
+                Blender.resolution_x = Blender.render_settings['resolution_x']
+                Blender.resolution_y = Blender.render_settings['resolution_y']
+                Blender.resolution_percentage = Blender.render_settings['resolution_percentage']
+                BlenderWindowMonitor.resize_window_to_resolution()
+        if 'final_render' in message:
+            render = message['final_render']
+            print(f"[BlenderRenderView] Final render {render['samples']}/{render['total']} samples, "
+                  f"{render['elapsed']:.1f} s{' (done)' if render['done'] else ''}")
         if 'renderview_running' in message:
             print("ok")
             mainWin.fitToZoom()
@@ -182,13 +280,18 @@ class SocketClient:
             #print(f"[BlenderRenderView] Updated status from External Ui:", status)
 
     @classmethod
-    def send_message(cls, data):
-        message_data = json.dumps(data).encode('utf-8')
-        cls.client_socket.sendall(message_data)
+    def send_message(cls, data, payload=b""):
+        if cls.client_socket is None:
+            return  # Running without blender (synthetic / replay capture)
+        frame = brv_protocol.encode_frame(data, payload)
+        with cls.send_lock:  # Sent from the UI and capture threads
+            cls.client_socket.sendall(frame)
 
     @classmethod
     def stop(cls):
         try:
+            if cls.client_socket:
+                cls.client_socket.shutdown(socket.SHUT_RDWR)  # Wakes the listener blocked in recv()
             if cls.listener_thread and cls.listener_thread.is_alive():
                 cls.listener_thread.join()
             if cls.client_socket:
@@ -205,130 +308,1218 @@ class SignalEmitter(QObject):
 # Initialize your signal emitter
 signal_emitter = SignalEmitter()
 
-class ScreenshotThread(QThread):
-    imageCaptured = Signal(QPixmap)
+class FramePacer:
+    """Schedule captures at a target rate, backing off while the viewport is idle or the UI lags behind."""
+
+    def __init__(self, target_fps=CAPTURE_RATES[0], min_fps=2, backoff=1.5, idle_frames=10):
+        self.target_fps = target_fps
+        self.min_fps = min_fps
+        self.backoff = backoff
+        self.idle_frames = idle_frames  # Unchanged frames in a row before slowing down
+        self.idle_fps = None  # Rate cap while the render has converged
+        self.interval = 1.0 / target_fps
+        self.unchanged_count = 0
+        self.achieved_fps = 0.0
+        self.total_frames = 0
+        self._window_start = time.perf_counter()
+        self._window_frames = 0
+        self._lock = threading.Lock()
+
+    def set_target_fps(self, fps):
+        with self._lock:
+            self.target_fps = fps
+            self.interval = 1.0 / fps
+            self.unchanged_count = 0
+
+    def set_idle_fps(self, fps):
+        # Cap the capture rate (None to go back to the target rate)
+        with self._lock:
+            self.idle_fps = fps
+            self.unchanged_count = 0
+
+    def frame_captured(self, changed, capture_time, ui_busy=False):
+        with self._lock:
+            target_fps = self.target_fps if self.idle_fps is None else min(self.target_fps, self.idle_fps)
+            base_interval = 1.0 / target_fps
+            max_interval = 1.0 / min(self.min_fps, target_fps)
+            if changed:
+                # Image is refining again, go back to full rate
+                self.unchanged_count = 0
+                self.interval = base_interval
+            else:
+                self.unchanged_count += 1
+                if self.unchanged_count >= self.idle_frames:
+                    self.interval = self.interval * self.backoff
+            if capture_time > self.interval:
+                # Capturing is slower than the budget, leave some room to the render
+                self.interval = capture_time * self.backoff
+            if ui_busy:
+                # UI has not displayed the previous frame yet
+                self.interval = self.interval * self.backoff
+            self.interval = min(max(self.interval, base_interval), max_interval)
+
+    def frame_delivered(self):
+        with self._lock:
+            self.total_frames += 1
+            self._window_frames += 1
+
+    def measure(self):
+        # Returns the achieved fps once per second, None otherwise
+        now = time.perf_counter()
+        elapsed = now - self._window_start
+        if elapsed < 1.0:
+            return None
+        with self._lock:
+            self.achieved_fps = self._window_frames / elapsed
+            self._window_frames = 0
+            self._window_start = now
+        return self.achieved_fps
+
+    def next_delay(self, elapsed):
+        with self._lock:
+            return max(0.0, self.interval - elapsed)
+
+class CaptureSurfacePool:
+    """Ring of capture surfaces of a backend (DCs + DIB sections, shared memory images...).
+
+    Surfaces are allocated once and reused across frames, they are only rebuilt when
+    the key (resolution) changes. allocations lets us check the steady state allocates nothing.
+    A surface handed to the UI is locked until the UI uploaded it, the capture thread
+    writes the next frame into the next free surface of the ring."""
+
+    def __init__(self, allocate, release, count=1):
+        self.allocate = allocate
+        self.release = release
+        self.count = count
+        self.key = None
+        self.surfaces = []
+        self.current = None
+        self.next = 0
+        self.locked = set()  # id() of the surfaces being displayed
+        self.retired = []  # Locked surfaces of a previous resolution, released once unlocked
+        self.allocations = 0
+        self._lock = threading.Lock()
+        self._unlocked = threading.Condition(self._lock)
+
+    def acquire(self, key):
+        # Called from the capture thread only (surfaces are allocated / released there)
+        with self._lock:
+            self.release_retired()
+            if not self.surfaces or key != self.key:
+                self.retire_surfaces()
+                self.surfaces = [self.allocate(key) for _ in range(self.count)]
+                self.key = key
+                self.allocations += self.count
+            for _ in range(self.count):
+                surface = self.surfaces[self.next]
+                self.next = (self.next + 1) % self.count
+                if id(surface) not in self.locked:
+                    self.current = surface
+                    return surface
+            self.current = None
+            return None  # Every surface is still waiting for the UI
+
+    def lock_current(self):
+        with self._lock:
+            if self.current is None:
+                return None
+            self.locked.add(id(self.current))
+            return id(self.current)
+
+    def unlock(self, token):
+        with self._lock:
+            self.locked.discard(token)
+            self._unlocked.notify_all()
+
+    def retire_surfaces(self):
+        for surface in self.surfaces:
+            if id(surface) in self.locked:
+                self.retired.append(surface)
+            else:
+                self.release(surface)
+        self.surfaces = []
+        self.current = None
+        self.next = 0
+
+    def release_retired(self):
+        for surface in [surface for surface in self.retired if id(surface) not in self.locked]:
+            self.retired.remove(surface)
+            self.release(surface)
+
+    def clear(self, timeout=1.0):
+        # The UI may still be uploading a surface (the capture thread stops on its own when grab() fails),
+        # it is waited for. One still locked after the timeout is left allocated rather than freed under the UI
+        with self._lock:
+            self._unlocked.wait_for(lambda: not self.locked, timeout)
+            self.retire_surfaces()
+            self.release_retired()
+            self.key = None
+
+class CaptureBackend:
+    """Source of viewport frames for ScreenshotThread.
+
+    grab() returns a QImage, or None when no frame is available. Unless held with
+    hold_frame(), the image is only valid until the next call to grab()."""
+    name = "base"
+    pool = None
+    wake = None  # Set by ScreenshotThread, for backends told when a new frame is available
+
+    def open(self):
+        pass
+
+    def grab(self):
+        raise NotImplementedError
+
+    def hold_frame(self):
+        # Keep the last grabbed frame from being overwritten, returns a token for release_frame()
+        if self.pool is None:
+            return None
+        return self.pool.lock_current()
 
-    def __init__(self, window_handle):
-        super().__init__()
-        self.window_handle = Blender.windowHandle
-        self._is_running = True
-        
-    def run(self):
-        print("[BlenderRenderView] Capturing window..")
-        while self._is_running:
-            try:
-                pixmap = self.screenshot_window(self.window_handle)
-                if pixmap:
-                    self.imageCaptured.emit(pixmap)
-            except Exception as e:
-                print(f"[BlenderRenderView] Fail to find blender window (closed). Exiting External UI.")
-                signal_emitter.exit_signal.emit()
-                break
+    def release_frame(self, token):
+        # Called from the UI thread
+        if self.pool is not None and token is not None:
+            self.pool.unlock(token)
 
-    def stop(self):
-        self._is_running = False
-        self.wait()
+    def full_precision(self):
+        # (slot key, header, pixels) of the last grabbed frame when it was received as floats, None otherwise.
+        # The caller owns it from then on and gives it back with release_full_precision()
+        return None
 
-    def capture_window(self, hwnd):
-        global WIN_HANDLES
+    def release_full_precision(self, precise):
+        pass
 
-        from ctypes import windll
+    def close(self):
+        pass
 
-        import win32gui
-        import win32ui
+class BITMAPINFOHEADER(ctypes.Structure):
+    _fields_ = [("biSize", ctypes.c_uint32), ("biWidth", ctypes.c_int32), ("biHeight", ctypes.c_int32),
+                ("biPlanes", ctypes.c_uint16), ("biBitCount", ctypes.c_uint16), ("biCompression", ctypes.c_uint32),
+                ("biSizeImage", ctypes.c_uint32), ("biXPelsPerMeter", ctypes.c_int32), ("biYPelsPerMeter", ctypes.c_int32),
+                ("biClrUsed", ctypes.c_uint32), ("biClrImportant", ctypes.c_uint32)]
 
-        if WIN_HANDLES is None:
-            windll.user32.SetProcessDPIAware()
-            left, top, right, bottom = win32gui.GetClientRect(hwnd)
-            w = right - left
-            h = bottom - top
-            #print(f"Client rect: {left}, {top}, {right}, {bottom}")
+class BITMAPINFO(ctypes.Structure):
+    _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", ctypes.c_uint32 * 3)]
 
-            hwnd_dc = win32gui.GetWindowDC(hwnd)
-            mfc_dc = win32ui.CreateDCFromHandle(hwnd_dc)
-            save_dc = mfc_dc.CreateCompatibleDC()
+class Win32CaptureBackend(CaptureBackend):
+    """Capture the blender render window with PrintWindow (Windows only).
 
-            bitmap = win32ui.CreateBitmap()
-            bitmap.CreateCompatibleBitmap(mfc_dc, w, h)
+    PrintWindow draws into a DIB section whose pixels live in our memory, the returned
+    QImage is a view over it. DCs and DIB section are pooled per client area size, read
+    on every grab, so a resized window (by blender or by hand) gets new ones."""
+    name = "win32"
+    DIB_RGB_COLORS = 0
 
-            WIN_HANDLES = (hwnd, hwnd_dc, mfc_dc, save_dc, bitmap)
+    def __init__(self):
+        self.pool = CaptureSurfacePool(self.allocate, self.release, FRAME_RING_SIZE)
+        self.user32 = None
+        self.gdi32 = None
 
-        (hwnd, hwnd_dc, mfc_dc, save_dc, bitmap) = WIN_HANDLES
-        save_dc.SelectObject(bitmap)
+    def open(self):
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        user32.SetProcessDPIAware()
+        # Handles are pointer sized, don't let ctypes truncate them to int
+        user32.GetWindowDC.argtypes = [ctypes.c_void_p]
+        user32.GetWindowDC.restype = ctypes.c_void_p
+        user32.ReleaseDC.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        user32.IsWindow.argtypes = [ctypes.c_void_p]
+        user32.PrintWindow.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint]
+        gdi32.CreateCompatibleDC.argtypes = [ctypes.c_void_p]
+        gdi32.CreateCompatibleDC.restype = ctypes.c_void_p
+        gdi32.CreateDIBSection.argtypes = [ctypes.c_void_p, ctypes.POINTER(BITMAPINFO), ctypes.c_uint,
+                                           ctypes.POINTER(ctypes.c_void_p), ctypes.c_void_p, ctypes.c_uint32]
+        gdi32.CreateDIBSection.restype = ctypes.c_void_p
+        gdi32.SelectObject.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        gdi32.SelectObject.restype = ctypes.c_void_p
+        gdi32.DeleteObject.argtypes = [ctypes.c_void_p]
+        gdi32.DeleteDC.argtypes = [ctypes.c_void_p]
+        self.user32, self.gdi32 = user32, gdi32
+
+    def allocate(self, key):
+        (hwnd, width, height) = key
+        hwnd_dc = self.user32.GetWindowDC(hwnd)
+        mem_dc = self.gdi32.CreateCompatibleDC(hwnd_dc)
+        bmi = BITMAPINFO()
+        bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        bmi.bmiHeader.biWidth = width
+        bmi.bmiHeader.biHeight = -height  # Top-down rows, same order as QImage
+        bmi.bmiHeader.biPlanes = 1
+        bmi.bmiHeader.biBitCount = 32
+        bits = ctypes.c_void_p()
+        dib = self.gdi32.CreateDIBSection(mem_dc, ctypes.byref(bmi), self.DIB_RGB_COLORS, ctypes.byref(bits), None, 0)
+        if not dib:
+            self.gdi32.DeleteDC(mem_dc)
+            self.user32.ReleaseDC(hwnd, hwnd_dc)
+            raise RuntimeError("Unable to allocate capture bitmap")
+        previous = self.gdi32.SelectObject(mem_dc, dib)
+        buffer = (ctypes.c_ubyte * (width * height * 4)).from_address(bits.value)
+        view = QImage(buffer, width, height, width * 4, QImage.Format_ARGB32)
+        return (hwnd, hwnd_dc, mem_dc, dib, previous, buffer, view)
+
+    def release(self, surface):
+        (hwnd, hwnd_dc, mem_dc, dib, previous, buffer, view) = surface
+        self.gdi32.SelectObject(mem_dc, previous)
+        self.gdi32.DeleteObject(dib)
+        self.gdi32.DeleteDC(mem_dc)
+        self.user32.ReleaseDC(hwnd, hwnd_dc)
+
+    def grab(self):
+        hwnd = Blender.windowHandle
+        if not hwnd:
+            print(f"[BlenderRenderView] Window '{hwnd}' not found!")
+            return None
+        if not self.user32.IsWindow(hwnd):
+            raise RuntimeError("Blender window closed")
 
-        # If Special K is running, this number is 3. If not, 1
-        result = windll.user32.PrintWindow(hwnd, save_dc.GetSafeHdc(), 3)
+        left, top, right, bottom = win32gui.GetClientRect(hwnd)
+        if right <= left or bottom <= top:
+            return None  # Minimized
+        surface = self.pool.acquire((hwnd, right - left, bottom - top))
+        if surface is None:
+            return None
+        (hwnd, hwnd_dc, mem_dc, dib, previous, buffer, view) = surface
 
-        bmpinfo = bitmap.GetInfo()
-        bmpstr = bitmap.GetBitmapBits(True)
+        #result = ctypes.windll.user32.PrintWindow(hwnd, mem_dc, 1)
+        result = self.user32.PrintWindow(hwnd, mem_dc, 0)
+        if result != 1:
+            print(f"[BlenderRenderView] Failed to capture the window!")
+            return None
+        # Make sure GDI is done writing the DIB section before reading it
+        self.gdi32.GdiFlush()
+        return view
+
+    def close(self):
+        self.pool.clear()
+
+class XImage(ctypes.Structure):
+    _fields_ = [("width", ctypes.c_int), ("height", ctypes.c_int), ("xoffset", ctypes.c_int),
+                ("format", ctypes.c_int), ("data", ctypes.c_void_p), ("byte_order", ctypes.c_int),
+                ("bitmap_unit", ctypes.c_int), ("bitmap_bit_order", ctypes.c_int), ("bitmap_pad", ctypes.c_int),
+                ("depth", ctypes.c_int), ("bytes_per_line", ctypes.c_int), ("bits_per_pixel", ctypes.c_int),
+                ("red_mask", ctypes.c_ulong), ("green_mask", ctypes.c_ulong), ("blue_mask", ctypes.c_ulong),
+                ("obdata", ctypes.c_void_p)]
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [("shmseg", ctypes.c_ulong), ("shmid", ctypes.c_int),
+                ("shmaddr", ctypes.c_void_p), ("readOnly", ctypes.c_int)]
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_int), ("display", ctypes.c_void_p), ("resourceid", ctypes.c_ulong),
+                ("serial", ctypes.c_ulong), ("error_code", ctypes.c_ubyte),
+                ("request_code", ctypes.c_ubyte), ("minor_code", ctypes.c_ubyte)]
+
+X11_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+class X11:
+    """Minimal Xlib / MIT-SHM bindings (Linux capture and window management)"""
+    ZPIXMAP = 2
+    ALL_PLANES = 0xFFFFFFFF
+    IPC_PRIVATE = 0
+    IPC_CREAT = 0o1000
+    IPC_RMID = 0
+    xlib = None
+    xext = None
+    libc = None
+    display = None  # Connection used by the window monitor and the socket listener
+    display_lock = threading.Lock()
+    last_error = 0
+    _error_handler = None
 
+    @classmethod
+    def load(cls):
+        if cls.xlib is not None:
+            return
+        import ctypes.util
+        xlib = ctypes.CDLL(ctypes.util.find_library("X11"))
+        xext = ctypes.CDLL(ctypes.util.find_library("Xext"))
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        c_ulong_p = ctypes.POINTER(ctypes.c_ulong)
+        c_uint_p = ctypes.POINTER(ctypes.c_uint)
+        c_int_p = ctypes.POINTER(ctypes.c_int)
+
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultVisual.restype = ctypes.c_void_p
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XGetGeometry.argtypes = [ctypes.c_void_p, ctypes.c_ulong, c_ulong_p, c_int_p, c_int_p,
+                                      c_uint_p, c_uint_p, c_uint_p, c_uint_p]
+        xlib.XQueryTree.argtypes = [ctypes.c_void_p, ctypes.c_ulong, c_ulong_p, c_ulong_p,
+                                    ctypes.POINTER(c_ulong_p), c_uint_p]
+        xlib.XFetchName.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_char_p)]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xlib.XResizeWindow.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_uint, ctypes.c_uint]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XFlush.argtypes = [ctypes.c_void_p]
+        xlib.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        xlib.XSetErrorHandler.argtypes = [X11_ERROR_HANDLER]
+        xlib.XSetErrorHandler.restype = ctypes.c_void_p
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                         ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+        # Default Xlib handler exits the process, a vanished or resized window must only fail the call
+        cls._error_handler = X11_ERROR_HANDLER(cls.on_error)
+        xlib.XSetErrorHandler(cls._error_handler)
+        cls.xlib, cls.xext, cls.libc = xlib, xext, libc
 
+    @classmethod
+    def on_error(cls, display, event):
+        cls.last_error = event.contents.error_code
+        return 0
 
-        if result != 1:
-            win32gui.DeleteObject(bitmap.GetHandle())
-            save_dc.DeleteDC()
-            mfc_dc.DeleteDC()
-            win32gui.ReleaseDC(hwnd, hwnd_dc)
-            WIN_HANDLES = None
-            raise RuntimeError(f"Unable to acquire screenshot! Result: {result}")
+    @classmethod
+    def open_display(cls):
+        cls.load()
+        display = cls.xlib.XOpenDisplay(None)
+        if not display:
+            raise RuntimeError("Cannot open X display (is DISPLAY set?)")
+        return display
 
-        
-        image = QImage(bmpstr, bmpinfo['bmWidth'], bmpinfo['bmHeight'], QImage.Format_ARGB32)
-        pixmap = QPixmap.fromImage(image)
-        return pixmap
-        
-    def screenshot_window(self, window_handle):
-        global WIN_HANDLES
-        hwnd = Blender.windowHandle
-        if hwnd == 0:
-            print(f"[BlenderRenderView] Window '{window_handle}' not found!")
+    @classmethod
+    def get_geometry(cls, display, xid):
+        root = ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        width, height, border, depth = ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint(), ctypes.c_uint()
+        if not cls.xlib.XGetGeometry(display, xid, ctypes.byref(root), ctypes.byref(x), ctypes.byref(y),
+                                     ctypes.byref(width), ctypes.byref(height), ctypes.byref(border), ctypes.byref(depth)):
             return None
+        return width.value, height.value, depth.value
 
-        # whole window or just the client area.
-        left, top, right, bottom = win32gui.GetClientRect(hwnd)
+    @classmethod
+    def find_windows(cls, title):
+        with cls.display_lock:
+            if cls.display is None:
+                cls.display = cls.open_display()
+            return cls.walk_windows(title, cls.xlib.XDefaultRootWindow(cls.display), 0)
 
-        #left, top, right, bottom = win32gui.GetWindowRect(hwnd)
-        width = right - left
-        height = bottom - top
+    @classmethod
+    def walk_windows(cls, title, window, depth):
+        # Client windows are reparented under the window manager frames, look a few levels down
+        found = []
+        name = ctypes.c_char_p()
+        if depth > 0 and cls.xlib.XFetchName(cls.display, window, ctypes.byref(name)) and name.value:
+            if title.encode() in name.value:
+                found.append(window)
+            cls.xlib.XFree(name)
+        if depth < 3:
+            root, parent = ctypes.c_ulong(), ctypes.c_ulong()
+            children = ctypes.POINTER(ctypes.c_ulong)()
+            count = ctypes.c_uint()
+            if cls.xlib.XQueryTree(cls.display, window, ctypes.byref(root), ctypes.byref(parent),
+                                   ctypes.byref(children), ctypes.byref(count)):
+                child_ids = [children[i] for i in range(count.value)]
+                if children:
+                    cls.xlib.XFree(children)
+                for child in child_ids:
+                    found += cls.walk_windows(title, child, depth + 1)
+        return found
 
-        #print(f"Client rect: {left}, {top}, {right}, {bottom}")
-        
-        hwndDC = None
-        mfcDC = None
-        saveDC = None
-        saveBitMap = None
+    @classmethod
+    def resize_window(cls, xid, width, height):
+        with cls.display_lock:
+            if cls.display is None:
+                cls.display = cls.open_display()
+            cls.xlib.XResizeWindow(cls.display, xid, width, height)
+            cls.xlib.XFlush(cls.display)
+
+class X11ShmCaptureBackend(CaptureBackend):
+    """Capture the blender render window through an X11 shared memory image (Linux).
 
+    XShmGetImage writes the pixels straight into a segment mapped in this process,
+    the returned QImage is a view over that segment (no socket transfer, no copy)."""
+    name = "x11"
+
+    def __init__(self):
+        self.display = None
+        self.pool = CaptureSurfacePool(self.allocate, self.release, FRAME_RING_SIZE)
+        self.resolution = None
+        self.geometry = None
+        self.settled = False
+
+    def open(self):
+        self.display = X11.open_display()
+        if not X11.xext.XShmQueryExtension(self.display):
+            raise RuntimeError("X server has no MIT-SHM extension")
+
+    def grab(self):
+        xid = Blender.windowHandle
+        if not xid:
+            return None
+        resolution = Blender.resolution_key()
+        if resolution != self.resolution or not self.settled:
+            self.resolution = resolution
+            self.update_geometry(xid)
+        surface = self.pool.acquire((xid,) + self.geometry)
+        if surface is None:
+            return None
+        (image, shminfo, buffer, view) = surface
+        if not X11.xext.XShmGetImage(self.display, xid, image, 0, 0, X11.ALL_PLANES):
+            # Window size changed under us, check it again on next frame
+            self.settled = False
+            return None
+        return view
+
+    def update_geometry(self, xid):
+        geometry = X11.get_geometry(self.display, xid)
+        if geometry is None:
+            raise RuntimeError("Blender window closed")
+        expected = (int(Blender.resolution_x * (Blender.resolution_percentage / 100)),
+                    int(Blender.resolution_y * (Blender.resolution_percentage / 100)))
+        # Until the window reached the requested resolution, keep checking its size every frame
+        self.settled = geometry[:2] == expected
+        self.geometry = geometry
+
+    def allocate(self, key):
+        (xid, width, height, depth) = key
+        screen = X11.xlib.XDefaultScreen(self.display)
+        visual = X11.xlib.XDefaultVisual(self.display, screen)
+        shminfo = XShmSegmentInfo()
+        image = X11.xext.XShmCreateImage(self.display, visual, depth, X11.ZPIXMAP, None,
+                                         ctypes.byref(shminfo), width, height)
+        if not image:
+            raise RuntimeError("XShmCreateImage failed")
+        bytes_per_line = image.contents.bytes_per_line
+        size = bytes_per_line * height
+        shmid = X11.libc.shmget(X11.IPC_PRIVATE, size, X11.IPC_CREAT | 0o600)
+        if shmid < 0:
+            X11.xlib.XDestroyImage(image)
+            raise RuntimeError(f"shmget failed (errno {ctypes.get_errno()})")
+        address = X11.libc.shmat(shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            X11.libc.shmctl(shmid, X11.IPC_RMID, None)
+            X11.xlib.XDestroyImage(image)
+            raise RuntimeError(f"shmat failed (errno {ctypes.get_errno()})")
+        shminfo.shmid = shmid
+        shminfo.shmaddr = address
+        shminfo.readOnly = 0
+        image.contents.data = address
+        X11.xext.XShmAttach(self.display, ctypes.byref(shminfo))
+        X11.xlib.XSync(self.display, 0)
+        # Segment is freed by the kernel once both the X server and this process detached
+        X11.libc.shmctl(shmid, X11.IPC_RMID, None)
+
+        buffer = (ctypes.c_ubyte * size).from_address(address)
+        view = QImage(buffer, width, height, bytes_per_line, QImage.Format_RGB32)
+        return (image, shminfo, buffer, view)
+
+    def release(self, surface):
+        (image, shminfo, buffer, view) = surface
+        X11.xext.XShmDetach(self.display, ctypes.byref(shminfo))
+        X11.xlib.XSync(self.display, 0)
+        X11.libc.shmdt(shminfo.shmaddr)
+        # Segment and segment info are not owned by Xlib
+        image.contents.data = None
+        image.contents.obdata = None
+        X11.xlib.XDestroyImage(image)
+
+    def close(self):
+        self.pool.clear()
+        if self.display:
+            X11.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """Generated frames, to profile the frame pipeline without blender.
+
+    change_rate is the number of content changes per second (0 = converged, never changes),
+    noise the fraction of the frame rewritten with random pixels on each change, fading out
+    over converge_after seconds like a render reaching its sample count (0 = never)."""
+    name = "synthetic"
+
+    def __init__(self, width=1920, height=1080, change_rate=10.0, noise=0.1, seed=None, converge_after=0.0):
+        self.width = width
+        self.height = height
+        self.change_rate = change_rate
+        self.noise = noise
+        self.converge_after = converge_after
+        self._random = random.Random(seed)
+        self._last_change = 0.0
+        self._start = time.perf_counter()
+        self.scene = None  # Generated content, copied into a ring buffer on each grab like a real capture
+        self.pool = CaptureSurfacePool(self.allocate, self.release, FRAME_RING_SIZE)
+
+    def open(self):
+        Blender.resolution_x = self.width
+        Blender.resolution_y = self.height
+        Blender.resolution_percentage = 100
+        self._start = time.perf_counter()
+
+    def allocate(self, key):
+        (resolution_x, resolution_y, percentage) = key
+        width = int(resolution_x * (percentage / 100))
+        height = int(resolution_y * (percentage / 100))
+        if self.scene is None or self.scene.size() != QSize(width, height):
+            self.scene = QImage(width, height, QImage.Format_RGB32)
+            gradient = QLinearGradient(0, 0, width, height)
+            gradient.setColorAt(0, QColor(40, 40, 60))
+            gradient.setColorAt(1, QColor(200, 150, 90))
+            painter = QPainter(self.scene)
+            painter.fillRect(self.scene.rect(), gradient)
+            painter.end()
+        buffer = bytearray(self.scene.sizeInBytes())
+        view = QImage(buffer, width, height, self.scene.bytesPerLine(), QImage.Format_RGB32)
+        return (buffer, view)
+
+    def release(self, surface):
+        pass
+
+    def grab(self):
+        surface = self.pool.acquire(Blender.resolution_key())
+        if surface is None:
+            return None
+        (buffer, view) = surface
+        now = time.perf_counter()
+        noise = self.noise
+        if self.converge_after > 0:
+            noise *= max(0.0, 1.0 - (now - self._start) / self.converge_after)
+        if self.change_rate > 0 and noise > 0 and now - self._last_change >= 1.0 / self.change_rate:
+            self._last_change = now
+            self.add_noise(self.scene, noise)
+        memoryview(buffer)[:] = self.scene.constBits()
+        return view
+
+    def close(self):
+        self.pool.clear()
+
+    def add_noise(self, image, noise):
+        # Rewrite a random band of rows, like a few refining buckets
+        bytes_per_line = image.bytesPerLine()
+        height = image.height()
+        rows = max(1, int(height * noise))
+        first_row = self._random.randrange(0, height - rows + 1)
+        bits = image.bits()
+        start = first_row * bytes_per_line
+        end = start + rows * bytes_per_line
+        bits[start:end] = os.urandom(end - start)
+
+class ReplayCaptureBackend(CaptureBackend):
+    """Replay a directory of image files, one file per captured frame (looping)"""
+    name = "replay"
+    extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+    def __init__(self, directory, preload=True):
+        self.directory = directory
+        self.preload = preload
+        self.files = []
+        self.frames = []
+        self.index = 0
+
+    def open(self):
+        self.files = sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                            if name.lower().endswith(self.extensions))
+        if not self.files:
+            raise RuntimeError(f"No image found in {self.directory}")
+        if self.preload:
+            # Decode everything upfront so decoding does not show up in the measurements
+            self.frames = [self.load(path) for path in self.files]
+        first = self.frames[0] if self.preload else self.load(self.files[0])
+        Blender.resolution_x = first.width()
+        Blender.resolution_y = first.height()
+        Blender.resolution_percentage = 100
+
+    def load(self, path):
+        return QImage(path).convertToFormat(QImage.Format_ARGB32)
+
+    def grab(self):
+        if self.preload:
+            image = self.frames[self.index]
+        else:
+            image = self.load(self.files[self.index])
+        self.index = (self.index + 1) % len(self.files)
+        return image
+
+    def close(self):
+        self.frames = []
+
+class SharedFrameBackend(CaptureBackend):
+    """Frames published by a producer through shared memory (brv_frames), nothing is captured.
+
+    8-bit frames stored top to bottom are displayed from the shared memory slot itself, float and
+    bottom to top frames are converted into a ring of 8-bit buffers first. The slot of a frame goes
+    back to the producer once the UI uploaded it, or on the next grab() when it was not displayed."""
+    name = "shm"
+    QT_FORMATS = {"bgra8": QImage.Format_ARGB32, "rgba8": QImage.Format_RGBA8888,
+                  "rgba16f": QImage.Format_RGBA16FPx4, "rgba32f": QImage.Format_RGBA32FPx4}
+    NUMPY_TYPES = {"bgra8": "uint8", "rgba8": "uint8", "rgba16f": "float16", "rgba32f": "float32"}
+    FLOAT_FORMATS = ("rgba16f", "rgba32f")
+    block_rows = 16  # Rows converted at a time, keeps the lookup indices in cache
+
+    def __init__(self):
+        self.consumer = brv_frames.FrameConsumer(SocketClient.send_message)
+        self.pool = CaptureSurfacePool(self.allocate, self.release, FRAME_RING_SIZE)
+        self.current = None  # (slot key, image) of the last frame grabbed in place
+        self.held = {}  # token -> slot key of the frames displayed in place
+        self.held_lock = threading.Lock()  # Released from the UI thread
+        self.tables = {}  # (format, linear) -> 8-bit value of each float bit pattern
+        self.precise = None  # (slot key, header, pixels) of the last float frame grabbed, its slot stays held
+        self.in_place = 0
+        self.converted = 0
+
+    def open(self):
+        SocketClient.frame_backend = self
+        if np is not None:
+            self.build_tables()
+
+    def build_tables(self):
+        # A float is converted with one lookup: float16 by its 16 bits, float32 by its upper 16 bits
+        # (sign, exponent and 7 bits of mantissa, at most one 8-bit level off)
+        patterns = np.arange(65536, dtype=np.uint32)
+        with np.errstate(invalid='ignore'):  # NaN patterns
+            values = {"rgba16f": patterns.astype(np.uint16).view(np.float16).astype(np.float64),
+                      "rgba32f": ((patterns << 16) | (1 << 15)).view(np.float32).astype(np.float64)}
+        for (format, value) in values.items():
+            value = np.clip(np.nan_to_num(value, nan=0.0), 0.0, 1.0)
+            srgb = np.where(value <= 0.0031308, value * 12.92, 1.055 * np.power(value, 1 / 2.4) - 0.055)
+            self.tables[(format, False)] = (value * 255 + 0.5).astype(np.uint8)
+            self.tables[(format, True)] = (srgb * 255 + 0.5).astype(np.uint8)
+
+    def frame_ready(self, message):
+        # Socket listener thread
         try:
-            hwndDC = win32gui.GetWindowDC(hwnd)
-            mfcDC = win32ui.CreateDCFromHandle(hwndDC)
-            saveDC = mfcDC.CreateCompatibleDC()
-
-            saveBitMap = win32ui.CreateBitmap()
-            saveBitMap.CreateCompatibleBitmap(mfcDC, width, height)
-            saveDC.SelectObject(saveBitMap)
-
-            #result = ctypes.windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 1)
-            result = ctypes.windll.user32.PrintWindow(hwnd, saveDC.GetSafeHdc(), 0)
-            if result != 1:
-                print(f"[BlenderRenderView] Failed to capture the window!")
-                return None
+            self.consumer.frame_ready(message)
+        except (OSError, brv_protocol.ProtocolError) as e:
+            print(f"[BlenderRenderView] Can't read frame {message['sequence']}: {e}")
+            self.consumer.send({"frame_consumed": message})
+            return
+        if self.wake is not None:
+            self.wake()
 
-            bmpinfo = saveBitMap.GetInfo()
-            bmpstr = saveBitMap.GetBitmapBits(True)
+    def allocate(self, key):
+        (width, height, format) = key
+        buffer = bytearray(width * height * 4)
+        return (buffer, QImage(buffer, width, height, width * 4, format))
 
-            image = QImage(bmpstr, bmpinfo['bmWidth'], bmpinfo['bmHeight'], QImage.Format_ARGB32)
-            pixmap = QPixmap.fromImage(image)
-        except Exception as e:
-            print(f"[BlenderRenderView] Error occurred: {e}")
+    def release(self, surface):
+        pass
+
+    def grab(self):
+        self.release_current()
+        self.release_full_precision(self.precise)  # Unchanged, not handed to the UI
+        self.precise = None
+        try:
+            frame = self.consumer.take()
+        except brv_protocol.ProtocolError as e:
+            print(f"[BlenderRenderView] Skipped a frame: {e}")
             return None
+        if frame is None:
+            return None
+        (key, header, pixels) = frame
+        width, height, format = header["width"], header["height"], header["format"]
+        if (width, height) != (Blender.resolution_x, Blender.resolution_y):
+            Blender.resolution_x, Blender.resolution_y, Blender.resolution_percentage = width, height, 100
+        if format in ("bgra8", "rgba8") and not header["flags"] & brv_frames.FLIPPED:
+            self.in_place += 1
+            image = QImage(pixels, width, height, header["stride"], self.QT_FORMATS[format])
+            self.current = (key, image)
+            return image
+        # Float frames become RGBA8888, the channels keep their order
+        surface_format = QImage.Format_ARGB32 if format == "bgra8" else QImage.Format_RGBA8888
+        surface = self.pool.acquire((width, height, surface_format))
+        if surface is not None:
+            (buffer, view) = surface
+            self.convert(header, pixels, buffer, surface_format)
+            self.converted += 1
+            if format in self.FLOAT_FORMATS:
+                # The slot is kept instead of copying every frame, the float pixels are only read by a snapshot
+                self.precise = (key, header, pixels)
+                return view
+        pixels.release()
+        self.consumer.release(key)  # Copied, the slot can be written again
+        return None if surface is None else view
+
+    def convert(self, header, pixels, buffer, surface_format):
+        width, height, stride, format = header["width"], header["height"], header["stride"], header["format"]
+        flipped = header["flags"] & brv_frames.FLIPPED
+        linear = bool(header["flags"] & brv_frames.LINEAR) and format in self.FLOAT_FORMATS
+        if np is None or (format in self.FLOAT_FORMATS and not linear):
+            # Qt's own conversion of display referred floats is faster than the lookup
+            image = QImage(pixels, width, height, stride, self.QT_FORMATS[format])
+            if linear:
+                image.setColorSpace(QColorSpace(QColorSpace.SRgbLinear))
+                image = image.convertedToColorSpace(QColorSpace(QColorSpace.SRgb))
+            image = image.convertToFormat(surface_format)
+            if flipped:
+                image = image.mirrored(False, True)
+            memoryview(buffer)[:] = image.constBits()
+            return
+        dtype = np.dtype(self.NUMPY_TYPES[format])
+        source = np.frombuffer(pixels, dtype).reshape(height, stride // dtype.itemsize)[:, :width * 4]
+        source = source.reshape(height, width, 4)
+        if flipped:
+            source = source[::-1]
+        target = np.frombuffer(buffer, np.uint8).reshape(height, width, 4)
+        if dtype == np.uint8:
+            target[:] = source
+            return
+        color = self.tables[(format, linear)]
+        alpha = self.tables[(format, False)]
+        for row in range(0, height, self.block_rows):
+            block = source[row:row + self.block_rows]
+            rows = target[row:row + self.block_rows]
+            patterns = block.view(np.uint16) if dtype == np.float16 else block.view(np.uint32) >> 16
+            np.take(color, patterns, out=rows)
+            rows[..., 3] = alpha.take(patterns[..., 3])
+
+    def full_precision(self):
+        (precise, self.precise) = (self.precise, None)
+        return precise
+
+    def release_full_precision(self, precise):
+        # Any thread
+        if precise is not None:
+            (key, header, pixels) = precise
+            pixels.release()
+            self.consumer.release(key)
+
+    @classmethod
+    def float_image(cls, pixels, header):
+        # Float QImage of a frame, display referred (sRGB encoded, values above 1 kept) like the snapshots
+        image = QImage(pixels, header["width"], header["height"], header["stride"], cls.QT_FORMATS[header["format"]])
+        image = image.mirrored(False, True) if header["flags"] & brv_frames.FLIPPED else image.copy()
+        if header["flags"] & brv_frames.LINEAR:
+            image.setColorSpace(QColorSpace(QColorSpace.SRgbLinear))
+            image = image.convertedToColorSpace(QColorSpace(QColorSpace.SRgb))
+        return image
+
+    def release_current(self):
+        # The frame grabbed in place last time was not displayed (unchanged), give its slot back
+        if self.current is not None:
+            (key, image) = self.current
+            self.current = None
+            with self.held_lock:
+                displayed = key in self.held.values()
+            if not displayed:
+                self.consumer.release(key)
+
+    def hold_frame(self):
+        if self.current is None:
+            return super().hold_frame()
+        (key, image) = self.current
+        token = ("slot",) + key
+        with self.held_lock:
+            self.held[token] = key
+        return token
+
+    def release_frame(self, token):
+        with self.held_lock:
+            key = self.held.pop(token, None)
+        if key is None:
+            super().release_frame(token)
+        else:
+            self.consumer.release(key)
+
+    def close(self):
+        SocketClient.frame_backend = None
+        self.current = None
+        with self.held_lock:
+            self.held.clear()
+        self.pool.clear()
+        self.consumer.close()
+        print(f"[BlenderRenderView] Shared memory frames: {self.consumer.received} received, "
+              f"{self.consumer.superseded} superseded, {self.in_place} displayed in place, {self.converted} converted")
+
+class RemoteFrameBackend(CaptureBackend):
+    """Frames of another render view streamed over the network (brv_remote), rebuilt from their tiles.
+
+    The socket listener decodes each remote_frame into the reconstruction and acknowledges it,
+    grab() copies the reconstruction into a ring buffer when it changed."""
+    name = "remote"
+
+    def __init__(self):
+        self.decoder = brv_remote.TileDecoder()
+        self.pool = CaptureSurfacePool(self.allocate, self.release, FRAME_RING_SIZE)
+        self.updated = False
+        self.lock = threading.Lock()  # Decoder shared with the socket listener
+        self.latency = 0.0  # Capture to acknowledgement, measured by the serving UI
+        self.decode_time = 0.0
+
+    def open(self):
+        SocketClient.frame_backend = self
+
+    def remote_frame(self, header, payload):
+        # Socket listener thread
+        start = time.perf_counter()
+        try:
+            with self.lock:
+                self.decoder.decode(header, payload)
+                self.updated = True
+        except (brv_protocol.ProtocolError, zlib.error) as e:
+            print(f"[BlenderRenderView] Can't decode remote frame {header['sequence']}: {e}")
+            SocketClient.send_message({"remote_keyframe": True})
         finally:
-            if hwndDC:
-                win32gui.ReleaseDC(hwnd, hwndDC)
-            if saveBitMap:
-                win32gui.DeleteObject(saveBitMap.GetHandle())
-            if saveDC:
-                saveDC.DeleteDC()
-        return pixmap
+            SocketClient.send_message({"remote_ack": {"sequence": header["sequence"]}})
+        self.decode_time += time.perf_counter() - start
+        self.latency = header["latency"]
+        if self.wake is not None:
+            self.wake()
+
+    def allocate(self, key):
+        (width, height, format) = key
+        buffer = bytearray(width * height * 4)
+        return (buffer, QImage(buffer, width, height, width * 4, QImage.Format(format)))
+
+    def release(self, surface):
+        pass
+
+    def grab(self):
+        with self.lock:
+            if not self.updated:
+                return None
+            (width, height, format, tile) = self.decoder.key
+            if (width, height) != (Blender.resolution_x, Blender.resolution_y):
+                Blender.resolution_x, Blender.resolution_y, Blender.resolution_percentage = width, height, 100
+            surface = self.pool.acquire((width, height, format))
+            if surface is None:
+                return None
+            (buffer, view) = surface
+            np.frombuffer(buffer, np.uint32).reshape(height, width)[:] = self.decoder.image()
+            self.updated = False
+        return view
+
+    def close(self):
+        SocketClient.frame_backend = None
+        self.pool.clear()
+        decoder = self.decoder
+        print(f"[BlenderRenderView] Remote frames: {decoder.frames} received ({decoder.keyframes} keyframes), "
+              f"{decoder.bytes / max(1, decoder.frames) / 1024:.1f} KB/frame, "
+              f"{self.decode_time / max(1, decoder.frames) * 1000:.1f} ms/frame to decode, "
+              f"latency {self.latency * 1000:.0f} ms")
+
+def create_capture_backend(args):
+    if args.backend == "synthetic":
+        width, height = (int(value) for value in args.size.lower().split("x"))
+        return SyntheticCaptureBackend(width, height, args.change_rate, args.noise, converge_after=args.converge_after)
+    if args.backend == "replay":
+        return ReplayCaptureBackend(args.replay_dir)
+    if args.backend == "shm":
+        return SharedFrameBackend()
+    if args.backend == "remote":
+        return RemoteFrameBackend()
+    if args.backend == "x11":
+        return X11ShmCaptureBackend()
+    return Win32CaptureBackend()
+
+class FrameChangeDetector:
+    """Find the tiles of a frame that changed since the previous capture.
+
+    With numpy the frame is compared with a copy of the previous one, 64 bits at a time and by
+    bands of tile rows that stay in cache, which is exact and cheaper than hashing. Otherwise
+    each tile gets a crc32 over every row_step-th of its rows (row_step=1, every row, is exact).
+    Either is cheap enough to run on every captured frame and drop the identical ones."""
+
+    def __init__(self, tile_size=128, row_step=1):
+        self.tile_size = tile_size
+        self.row_step = row_step
+        self.signatures = None
+        self.previous = None  # Copy of the previous frame (numpy)
+        self.size = None
+        self.dropped = 0
+        self.delivered = 0
+
+    def tile_grid(self, width, height):
+        return ((width + self.tile_size - 1) // self.tile_size,
+                (height + self.tile_size - 1) // self.tile_size)
+
+    def compute_signatures(self, image):
+        width, height = image.width(), image.height()
+        bytes_per_line = image.bytesPerLine()
+        pixel_size = image.depth() // 8
+        bits = image.constBits()
+        columns, rows = self.tile_grid(width, height)
+        column_bounds = [(tx * self.tile_size * pixel_size, min(width, (tx + 1) * self.tile_size) * pixel_size)
+                         for tx in range(columns)]
+        crc32 = zlib.crc32
+        signatures = []
+        for ty in range(rows):
+            crcs = [0] * columns
+            for y in range(ty * self.tile_size, min(height, (ty + 1) * self.tile_size), self.row_step):
+                row = bits[y * bytes_per_line:(y + 1) * bytes_per_line]
+                for tx, (start, end) in enumerate(column_bounds):
+                    crcs[tx] = crc32(row[start:end], crcs[tx])
+            signatures += crcs
+        return signatures
+
+    def tiles_to_rects(self, tiles, width, height):
+        # Merge horizontally adjacent tiles into (x, y, w, h) rectangles clipped to the frame
+        rects = []
+        for tx, ty in tiles:
+            x = tx * self.tile_size
+            y = ty * self.tile_size
+            w = min(self.tile_size, width - x)
+            h = min(self.tile_size, height - y)
+            if rects and rects[-1][1] == y and rects[-1][0] + rects[-1][2] == x:
+                last = rects[-1]
+                rects[-1] = (last[0], y, last[2] + w, h)
+            else:
+                rects.append((x, y, w, h))
+        return rects
+
+    def compare(self, image):
+        # (tx, ty) tiles that differ from the previous frame, which is updated along the way
+        pixels = image_array(image)
+        width, height = pixels.shape[1], pixels.shape[0]
+        if width % 2 == 0:
+            pixels = pixels.view(np.uint64)  # Two pixels at a time
+        tile = self.tile_size * pixels.shape[1] // width
+        starts = np.arange(0, pixels.shape[1], tile)
+        changed = []
+        for ty, y in enumerate(range(0, height, self.tile_size)):
+            band = pixels[y:y + self.tile_size]
+            previous = self.previous[y:y + self.tile_size]
+            columns = np.logical_or.reduceat((band != previous).any(axis=0), starts)
+            if columns.any():
+                previous[:] = band
+                changed += [(int(tx), ty) for tx in np.nonzero(columns)[0]]
+        return changed
+
+    def changed_tiles(self, image):
+        # Returns the (tx, ty) tiles that changed, an empty list if the frame is identical
+        size = (image.width(), image.height())
+        columns, rows = self.tile_grid(*size)
+        exact = np is not None and image.depth() == 32
+        if size != self.size or (self.previous is None if exact else self.signatures is None):
+            changed = [(tx, ty) for ty in range(rows) for tx in range(columns)]
+            if exact:
+                pixels = image_array(image)
+                self.previous = (pixels.view(np.uint64) if size[0] % 2 == 0 else pixels).copy()
+            else:
+                self.signatures = self.compute_signatures(image)
+        elif exact:
+            changed = self.compare(image)
+        else:
+            signatures = self.compute_signatures(image)
+            changed = [(index % columns, index // columns)
+                       for index, (old, new) in enumerate(zip(self.signatures, signatures)) if old != new]
+            self.signatures = signatures
+        self.size = size
+        if changed:
+            self.delivered += 1
+        else:
+            self.dropped += 1
+        return changed
+
+class ConvergenceMonitor:
+    """Track the frame to frame change energy of the live stream and detect when it settles.
+
+    The energy is the mean absolute channel change (0-255) over a grid of sampled pixels,
+    smoothed with an exponential decay over the changed frames. A render is refining from the
+    first frame or when the energy rises above the threshold, and has converged once it decays
+    back below it, or when nothing changed for settle_time seconds."""
+
+    def __init__(self, threshold=0.5, decay=0.8, settle_time=1.0, row_step=8, column_step=4):
+        self.threshold = threshold
+        self.decay = decay  # Weight of the previous energy, higher is smoother but slower to settle
+        self.settle_time = settle_time
+        self.row_step = row_step
+        self.column_step = column_step
+        self.enabled = True
+        self.samples = None
+        self.energy = None
+        self.refining_since = None  # Capture time the current refinement started, None when converged
+        self.last_change = None
+        self.converged_after = None  # Duration of the last refinement
+        self.convergences = 0
+
+    def update(self, image, changed, timestamp):
+        # Returns "refining" or "converged" when the state changes, None otherwise
+        if not self.enabled:
+            return None
+        if changed:
+            energy = None  # First frame or new size, nothing to compare with
+            samples = image_array(image)[::self.row_step, ::self.column_step].copy()
+            if self.samples is not None and self.samples.shape == samples.shape:
+                current = samples.view(np.uint8).reshape(samples.shape + (4,))[:, :, :3]
+                previous = self.samples.view(np.uint8).reshape(samples.shape + (4,))[:, :, :3]
+                energy = float(np.abs(current.astype(np.int16) - previous).mean())
+            self.samples = samples
+
+            if self.refining_since is None:
+                if energy is not None and energy <= self.threshold:
+                    return None  # Small change of a converged render
+                self.refining_since = self.last_change = timestamp
+                self.energy = energy
+                return "refining"
+            self.last_change = timestamp
+            if energy is not None:
+                self.energy = energy if self.energy is None else self.decay * self.energy + (1 - self.decay) * energy
+            if self.energy is None or self.energy >= self.threshold:
+                return None
+            converged_at = timestamp
+        elif self.refining_since is not None and timestamp - self.last_change >= self.settle_time:
+            converged_at = self.last_change  # Render stopped changing
+        else:
+            return None
+        self.converged_after = converged_at - self.refining_since
+        self.convergences += 1
+        self.refining_since = None
+        return "converged"
+
+    def reset(self):
+        self.samples = None
+        self.energy = None
+        self.refining_since = None
+
+class CapturedFrame:
+    """Frame handed from the capture thread to the UI"""
+    def __init__(self, image, rects, token, timestamp):
+        self.image = image  # View over a capture buffer
+        self.rects = rects  # Changed (x, y, w, h) areas since the previous frame
+        self.token = token  # To give back to CaptureBackend.release_frame() once uploaded
+        self.full_precision = None  # Float frame held by the backend, see CaptureBackend.full_precision()
+        self.timestamp = timestamp  # time.perf_counter() at capture
+        self.sequence = 0
+
+class FrameMailbox:
+    """Single slot between the capture thread and the UI, the latest frame wins.
+
+    A frame the UI did not take yet is replaced (and its buffer released) by the newer one,
+    so however slow the UI is, at most one frame is waiting and its latency stays bounded."""
+
+    max_rects = 256  # Beyond that the merged areas of stale frames become a full frame update
+
+    def __init__(self, release):
+        self.release = release
+        self.frame = None
+        self.sequence = 0
+        self.stale = 0
+        self.displayed = 0
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+        self._lock = threading.Lock()
+
+    def busy(self):
+        with self._lock:
+            return self.frame is not None
+
+    def post(self, frame):
+        # Returns True when the slot was empty, the UI then needs to be woken up
+        with self._lock:
+            self.sequence += 1
+            frame.sequence = self.sequence
+            stale = self.frame
+            self.frame = frame
+            if stale is not None:
+                self.stale += 1
+                # The UI never saw those areas, they still have to be updated
+                frame.rects = stale.rects + frame.rects
+                if len(frame.rects) > self.max_rects:
+                    frame.rects = [(0, 0, frame.image.width(), frame.image.height())]
+        if stale is not None:
+            self.release(stale)
+        return stale is None
+
+    def take(self):
+        with self._lock:
+            frame = self.frame
+            self.frame = None
+            return frame
+
+    def frame_displayed(self, frame):
+        latency = time.perf_counter() - frame.timestamp
+        self.displayed += 1
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_avg = latency if self.displayed == 1 else self.latency_avg * 0.9 + latency * 0.1
+
+def upload_frame(image):
+    # Single copy of a reused buffer (capture ring, composite) into display memory, on the UI thread.
+    # fromImage would share the pixels of a premultiplied image; the conversion of the others also
+    # makes the padding byte of RGB32 captures (X11, synthetic) opaque, Qt would copy it as alpha
+    if image.format() == QImage.Format_ARGB32_Premultiplied:
+        return QPixmap.fromImage(image.copy())
+    return QPixmap.fromImage(image.convertToFormat(QImage.Format_ARGB32_Premultiplied))
+
+class ScreenshotThread(QThread):
+    # A frame is waiting in the mailbox, only emitted when it was empty so events never pile up
+    frameReady = Signal()
+    fpsMeasured = Signal(float)
+    refining = Signal()
+    converged = Signal(float)  # Seconds the refinement took
+
+    def __init__(self, backend, target_fps=CAPTURE_RATES[0], convergence=None):
+        super().__init__()
+        self.backend = backend
+        self._is_running = True
+        self._wake = threading.Event()
+        self.pacer = FramePacer(target_fps)
+        self.detector = FrameChangeDetector()
+        self.mailbox = FrameMailbox(self.discard)
+        backend.wake = self._wake.set
+        self.convergence = convergence  # ConvergenceMonitor, optional
+
+    def discard(self, frame):
+        # Frame replaced in the mailbox before the UI took it
+        self.backend.release_frame(frame.token)
+        self.backend.release_full_precision(frame.full_precision)
+
+    def set_target_fps(self, fps):
+        self.pacer.set_target_fps(fps)
+        self._wake.set()
+
+    def set_idle_fps(self, fps):
+        self.pacer.set_idle_fps(fps)
+        self._wake.set()
+
+    def run(self):
+        print(f"[BlenderRenderView] Capturing window.. ({self.backend.name})")
+        while self._is_running:
+            start = time.perf_counter()
+            try:
+                image = self.backend.grab()
+            except Exception as e:
+                print(f"[BlenderRenderView] Fail to find blender window (closed). Exiting External UI.")
+                signal_emitter.exit_signal.emit()
+                break
+            capture_time = time.perf_counter() - start
+            # Identical frames (converged or idle viewport) never reach the UI
+            tiles = self.detector.changed_tiles(image) if image is not None else []
+            changed = bool(tiles)
+            self.pacer.frame_captured(changed, capture_time, self.mailbox.busy())
+            if self.convergence is not None:
+                # Event driven backends return no image while nothing new arrived, the render may have settled
+                state = self.convergence.update(image, changed, start)
+                if state == "refining":
+                    self.refining.emit()
+                elif state == "converged":
+                    self.converged.emit(self.convergence.converged_after)
+            if changed:
+                self.pacer.frame_delivered()
+                rects = self.detector.tiles_to_rects(tiles, image.width(), image.height())
+                # No GUI object is created here, the UI thread uploads the frame
+                frame = CapturedFrame(image, rects, self.backend.hold_frame(), start)
+                frame.full_precision = self.backend.full_precision()
+                if self.mailbox.post(frame):
+                    self.frameReady.emit()
+            fps = self.pacer.measure()
+            if fps is not None:
+                self.fpsMeasured.emit(fps)
+            self._wake.wait(self.pacer.next_delay(time.perf_counter() - start))
+            self._wake.clear()
+        frame = self.mailbox.take()
+        if frame is not None:
+            self.discard(frame)
+        self.backend.close()
+
+    def stop(self):
+        self._is_running = False
+        self._wake.set()
+        self.wait()
 
 ##########
 ### UI ###
@@ -437,6 +1628,8 @@ class CustomRectItem(QGraphicsRectItem):
 
     def mouseMoveEvent(self, event):
         super().mouseMoveEvent(event)
+        # Wipe line moved, live frames may not be coming anymore (converged viewport)
+        mainWin.refreshImage()
 
     def mouseReleaseEvent(self, event):
         self.setCursor(Qt.OpenHandCursor)
@@ -453,6 +1646,52 @@ class CustomRectItem(QGraphicsRectItem):
         super().hoverLeaveEvent(event)
 
 ### Main image display ###
+class LiveImageItem(QGraphicsItem):
+    """Pixmap item that can be updated tile by tile, only the changed areas are uploaded and repainted"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pixmap = QPixmap()
+        self._transformation_mode = Qt.FastTransformation
+        # Needed for option.exposedRect to be the area being repainted
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def boundingRect(self):
+        return QRectF(self._pixmap.rect())
+
+    def paint(self, painter, option, widget=None):
+        if self._pixmap.isNull():
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self._transformation_mode == Qt.SmoothTransformation)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        painter.drawPixmap(exposed, self._pixmap, exposed)
+
+    def pixmap(self):
+        return self._pixmap
+
+    def setPixmap(self, pixmap):
+        if pixmap.size() != self._pixmap.size():
+            self.prepareGeometryChange()
+        self._pixmap = pixmap
+        self.update()
+
+    def setTransformationMode(self, mode):
+        self._transformation_mode = mode
+        self.update()
+
+    def updateTiles(self, source, rects):
+        # Copy the changed rectangles of source (QPixmap or QImage, same size as the item) into the displayed pixmap
+        painter = QPainter(self._pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        for (x, y, w, h) in rects:
+            rect = QRect(x, y, w, h)
+            if isinstance(source, QImage):
+                painter.drawImage(rect, source, rect)
+            else:
+                painter.drawPixmap(rect, source, rect)
+        painter.end()
+        for (x, y, w, h) in rects:
+            self.update(QRectF(x, y, w, h))
+
 class ImageViewer(QGraphicsView):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -465,10 +1704,7 @@ class ImageViewer(QGraphicsView):
         self.background_item.setBrush(Qt.transparent)
         self.scene.addItem(self.background_item)
 
-        self.image_item = QGraphicsPixmapItem()
-        self.scene.addItem(self.image_item)
-
-        self.image_item = QGraphicsPixmapItem()
+        self.image_item = LiveImageItem()
         self.scene.addItem(self.image_item)
         self.setSceneRect(self.scene.itemsBoundingRect())
 
@@ -543,6 +1779,9 @@ class ImageViewer(QGraphicsView):
         self.image_item.setTransformationMode(Qt.SmoothTransformation)
         #self.setSceneRect(QRectF(pixmap.rect()))
 
+    def updateImageTiles(self, pixmap, rects):
+        self.image_item.updateTiles(pixmap, rects)
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             if self._debug_rect_item and  self._debug_rect_item.scene() == self.scene: self.scene.removeItem(self._debug_rect_item) 
@@ -577,6 +1816,14 @@ class ImageViewer(QGraphicsView):
             self.last_mouse_pos = event.position().toPoint()
             self.verticalScrollBar().setValue(self.verticalScrollBar().value() - delta.y())
             self.horizontalScrollBar().setValue(self.horizontalScrollBar().value() - delta.x())
+        elif mainWin.diff_reference:
+            # Error statistics of the tile under the cursor
+            position = self.image_item.mapFromScene(self.mapToScene(event.position().toPoint()))
+            stats = mainWin.difference.tile_at(position.x(), position.y())
+            if stats:
+                QToolTip.showText(event.globalPosition().toPoint(), f"Tile mean {stats[0]:.2f} max {stats[1]}", self)
+            else:
+                QToolTip.hideText()
         super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
@@ -648,86 +1895,610 @@ class ImageViewer(QGraphicsView):
     def startRenderRegionDrawing(self):
         self._drawing_rect = True
 
+### Snapshot store ###
+class SnapshotEntry:
+    """Full resolution pixels of a snapshot: raw, then compressed, then spilled to disk or only kept in the session"""
+    def __init__(self, key, width, height, bytes_per_line, format, raw=None):
+        self.key = key
+        self.width = width
+        self.height = height
+        self.bytes_per_line = bytes_per_line
+        self.format = format
+        self.raw = raw  # Until compressed
+        self.compressed = None  # zlib stream, None once spilled
+        self.path = None  # Spill file
+        self.record = None  # Location of the thumbnail and pixels in the session file
+        self.thumbnail = None  # Until written to the session
+        self.thumbnail_format = None  # Width, height, bytes per line and format of the session thumbnail
+        self.created = time.time()
+        self.last_used = 0
+
+    @classmethod
+    def from_image(cls, key, image):
+        return cls(key, image.width(), image.height(), image.bytesPerLine(), image.format(), bytes(image.constBits()))
+
+    def metadata(self):
+        return {"width": self.width, "height": self.height, "bytes_per_line": self.bytes_per_line,
+                "format": self.format.value, "created": self.created, "thumbnail": self.thumbnail_format}
+
+    def resident_bytes(self):
+        return len(self.raw or self.compressed or b"")
+
+class SnapshotSession:
+    """Snapshots of a .blend file kept across restarts, in one append-only file memory-mapped for reading.
+
+    Each record is a fixed header, JSON metadata, the raw thumbnail pixels and the zlib stream of the
+    full resolution pixels, so reopening a session only touches the thumbnails. Deleted records are
+    flagged in place and dropped when the file is compacted on close."""
+    MAGIC = b"BRVS"
+    VERSION = 1
+    RECORD = struct.Struct("<4sB3xIIQ")  # Magic, flags, metadata, thumbnail and pixels lengths
+    RECORD_MAGIC = b"SNAP"
+    DELETED = 1
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if not os.path.exists(path) or os.path.getsize(path) < len(self.MAGIC) + 4:
+            with open(path, "wb") as file:
+                file.write(self.MAGIC + struct.pack("<I", self.VERSION))
+        self.file = open(path, "r+b")
+        self.map = None
+        self.dead_bytes = 0
+        self._lock = threading.Lock()
+        magic, version = struct.unpack("<4sI", self.file.read(8))
+        if magic != self.MAGIC or version != self.VERSION:
+            self.file.close()
+            raise ValueError(f"{path} is not a version {self.VERSION} snapshot session")
+
+    @staticmethod
+    def path_for(blend_file, directory=None):
+        # One session per .blend, named after it and its full path
+        if directory is None:
+            directory = os.path.join(os.path.expanduser("~"), ".blender_render_view", "sessions")
+        name = os.path.splitext(os.path.basename(blend_file))[0] or "untitled"
+        digest = hashlib.sha1(os.path.abspath(blend_file).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(directory, f"{name}_{digest}.brvs")
+
+    def view(self, offset, length):
+        # Zero copy slice of the file, remapped when it grew since the last read (lock held)
+        end = offset + length
+        if self.map is None or len(self.map) < end:
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.map)[offset:end]
+
+    def scan(self):
+        # (offset, flags, metadata, thumbnail and pixels lengths) of every record (lock held)
+        size = os.fstat(self.file.fileno()).st_size
+        offset = len(self.MAGIC) + 4
+        while offset + self.RECORD.size <= size:
+            with self.view(offset, self.RECORD.size) as view:
+                magic, flags, *lengths = self.RECORD.unpack(view)
+            if magic != self.RECORD_MAGIC or offset + self.RECORD.size + sum(lengths) > size:
+                break
+            yield (offset, flags, *lengths)
+            offset += self.RECORD.size + sum(lengths)
+        if offset != size:
+            # Record cut short by a crash, drop it so the next ones are appended after valid data
+            print(f"[BlenderRenderView] Dropping {size - offset} bytes of incomplete snapshot session data")
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.truncate(offset)
+
+    def records(self):
+        # (record, metadata) of the snapshots in the session, oldest first. A record is the
+        # offsets of its header, thumbnail, pixels and end, nothing past the metadata is read
+        records = []
+        with self._lock:
+            self.dead_bytes = 0
+            for (offset, flags, metadata_length, thumbnail_length, pixels_length) in list(self.scan()):
+                thumbnail = offset + self.RECORD.size + metadata_length
+                pixels = thumbnail + thumbnail_length
+                if flags & self.DELETED:
+                    self.dead_bytes += pixels + pixels_length - offset
+                    continue
+                with self.view(offset + self.RECORD.size, metadata_length) as view:
+                    metadata = json.loads(bytes(view))
+                records.append(((offset, thumbnail, pixels, pixels + pixels_length), metadata))
+        return records
+
+    def append(self, metadata, thumbnail, pixels):
+        # Writes a record (worker thread), returns where it is
+        metadata = json.dumps(metadata).encode("utf-8")
+        with self._lock:
+            offset = self.file.seek(0, os.SEEK_END)
+            self.file.write(self.RECORD.pack(self.RECORD_MAGIC, 0, len(metadata), len(thumbnail), len(pixels)))
+            self.file.write(metadata)
+            self.file.write(thumbnail)
+            self.file.write(pixels)
+            self.file.flush()
+        start = offset + self.RECORD.size + len(metadata)
+        return (offset, start, start + len(thumbnail), start + len(thumbnail) + len(pixels))
+
+    def thumbnail(self, record, thumbnail_format):
+        (offset, start, end, _) = record
+        (width, height, bytes_per_line, format) = thumbnail_format
+        with self._lock:
+            with self.view(start, end - start) as view:
+                data = bytes(view)
+        return QImage(data, width, height, bytes_per_line, QImage.Format(format)).copy()
+
+    def pixels(self, record):
+        # Decompressed full resolution pixels, paged in from the file
+        (offset, _, start, end) = record
+        with self._lock:
+            with self.view(start, end - start) as view:
+                return zlib.decompress(view)  # Releases the GIL
+
+    def delete(self, record):
+        (offset, _, _, end) = record
+        with self._lock:
+            self.file.seek(offset + len(self.RECORD_MAGIC))
+            self.file.write(bytes((self.DELETED,)))
+            self.file.flush()
+            self.dead_bytes += end - offset
+
+    def close(self):
+        with self._lock:
+            size = self.file.seek(0, os.SEEK_END)
+            records = [record for record in self.scan() if not record[1] & self.DELETED]
+            if records and self.dead_bytes * 2 > size:
+                self.compact(records)
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+            if not records:
+                os.remove(self.path)
+
+    def compact(self, records):
+        # Rewrite the live records only (lock held)
+        path = self.path + ".tmp"
+        with open(path, "wb") as file:
+            file.write(self.MAGIC + struct.pack("<I", self.VERSION))
+            for (offset, flags, *lengths) in records:
+                with self.view(offset, self.RECORD.size + sum(lengths)) as view:
+                    file.write(view)
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+        os.replace(path, self.path)
+        self.file = open(self.path, "r+b")
+        self.dead_bytes = 0
+
+class SnapshotStore:
+    """Full resolution snapshots kept within a RAM budget.
+
+    New snapshots are compressed losslessly (zlib) on a worker thread and, when over budget,
+    the least recently used ones are spilled to a temp directory, or simply dropped from RAM
+    when they are already written to the session. Decoded pixmaps of the snapshots in use
+    (selected, A/B, difference reference) stay in a small LRU cache."""
+
+    thumbnail_size = QSize(200, 200)
+
+    def __init__(self, budget=2048 * 1024 * 1024, directory=None, cache_size=4, level=1, session=None):
+        self.budget = budget
+        self.session = session
+        self.directory = directory
+        self.cache_size = cache_size
+        self.level = level
+        self.entries = {}
+        self.cache = OrderedDict()  # key -> decoded QPixmap, most recently used last
+        self.cache_bytes = 0
+        self.next_key = 0
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self._created_directory = None
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self.work, daemon=True)
+        self._worker.start()
+
+    def add(self, image):
+        # Returns the key of the new snapshot
+        with self._lock:
+            key = self.next_key
+            self.next_key += 1
+            entry = SnapshotEntry.from_image(key, image)
+            entry.last_used = self.tick()
+            self.entries[key] = entry
+        self._jobs.put(key)
+        return key
+
+    def get(self, key):
+        # Full resolution pixmap of a snapshot (UI thread)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            with self._lock:
+                self.entries[key].last_used = self.tick()
+            return self.cache[key]
+        self.misses += 1
+        with self._lock:
+            entry = self.entries[key]
+            entry.last_used = self.tick()
+        image = QImage(self.pixels(entry), entry.width, entry.height, entry.bytes_per_line, entry.format)
+        pixmap = QPixmap.fromImage(image.copy())  # Detached from the raw bytes
+        with self._lock:
+            self.cache[key] = pixmap
+            self.cache_bytes += self.pixmap_bytes(pixmap)
+            while len(self.cache) > self.cache_size:
+                self.uncache(next(iter(self.cache)))
+        self._jobs.put("trim")
+        return pixmap
+
+    def image(self, key):
+        # Full resolution image of a snapshot in the format it was stored in, float for the float frames (UI thread)
+        with self._lock:
+            entry = self.entries[key]
+        return QImage(self.pixels(entry), entry.width, entry.height, entry.bytes_per_line, entry.format).copy()
+
+    def pixels(self, entry):
+        # Raw pixels wherever they are (any thread)
+        with self._lock:
+            raw, compressed, path, record = entry.raw, entry.compressed, entry.path, entry.record
+        if raw is not None:
+            return raw
+        if compressed is not None:
+            return zlib.decompress(compressed)
+        if record is not None:
+            return self.session.pixels(record)
+        with open(path, "rb") as file:
+            return zlib.decompress(file.read())
+
+    def thumbnail(self, key):
+        # Thumbnail image of a snapshot (any thread), KeyError once deleted
+        with self._lock:
+            entry = self.entries[key]
+            thumbnail, record = entry.thumbnail, entry.record
+        if thumbnail is not None:
+            return thumbnail
+        if record is not None:
+            return self.session.thumbnail(record, entry.thumbnail_format)
+        thumbnail = self.make_thumbnail(entry, self.pixels(entry))
+        with self._lock:
+            if entry.record is None:
+                entry.thumbnail = thumbnail  # Until written to the session
+        return thumbnail
+
+    def make_thumbnail(self, entry, raw):
+        image = QImage(raw, entry.width, entry.height, entry.bytes_per_line, entry.format)
+        return image.scaled(self.thumbnail_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    def uncache(self, key):
+        self.cache_bytes -= self.pixmap_bytes(self.cache.pop(key))
+
+    def pixmap_bytes(self, pixmap):
+        return pixmap.height() * pixmap.width() * pixmap.depth() // 8
+
+    def remove(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if key in self.cache:
+                self.uncache(key)
+        if entry is not None and entry.path:
+            os.remove(entry.path)
+        if entry is not None and entry.record:
+            self.session.delete(entry.record)
+
+    def restore(self):
+        # Keys of the snapshots of the session, oldest first, thumbnails and pixels left on disk
+        restored = []
+        for (record, metadata) in self.session.records():
+            with self._lock:
+                key = self.next_key
+                self.next_key += 1
+                entry = SnapshotEntry(key, metadata["width"], metadata["height"], metadata["bytes_per_line"],
+                                      QImage.Format(metadata["format"]))
+                entry.record = record
+                entry.thumbnail_format = metadata["thumbnail"]
+                entry.created = metadata["created"]
+                entry.last_used = self.tick()
+                self.entries[key] = entry
+            restored.append(key)
+        return restored
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def resident_bytes(self):
+        return sum(entry.resident_bytes() for entry in self.entries.values()) + self.cache_bytes
+
+    def work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            if job != "trim":
+                self.compress(job)
+            self.trim()
+
+    def compress(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            raw = entry.raw if entry else None
+        if raw is None:
+            return
+        compressed = zlib.compress(raw, self.level)  # Releases the GIL
+        record = None
+        if self.session is not None:
+            with self._lock:
+                thumbnail = entry.thumbnail
+            if thumbnail is None:
+                thumbnail = self.make_thumbnail(entry, raw)
+            entry.thumbnail_format = [thumbnail.width(), thumbnail.height(), thumbnail.bytesPerLine(),
+                                      thumbnail.format().value]
+            record = self.session.append(entry.metadata(), bytes(thumbnail.constBits()), compressed)
+        with self._lock:
+            entry.compressed = compressed
+            entry.raw = None
+            entry.record = record
+            entry.thumbnail = None
+            if record is None or self.entries.get(key) is entry:
+                return
+        self.session.delete(record)  # Deleted meanwhile
+
+    def trim(self):
+        # Spill the least recently used compressed snapshots until within budget
+        while True:
+            with self._lock:
+                if self.resident_bytes() <= self.budget:
+                    return
+                candidates = [entry for entry in self.entries.values()
+                              if entry.compressed is not None and entry.key not in self.cache]
+                if not candidates:
+                    return
+                entry = min(candidates, key=lambda entry: entry.last_used)
+                compressed = entry.compressed
+                if entry.record is not None:
+                    entry.compressed = None  # Read back from the session
+                    continue
+            path = os.path.join(self.spill_directory(), f"snapshot_{entry.key}.zlib")
+            with open(path, "wb") as file:
+                file.write(compressed)
+            with self._lock:
+                if self.entries.get(entry.key) is entry:
+                    entry.path = path
+                    entry.compressed = None
+                    continue
+            os.remove(path)  # Deleted meanwhile
+
+    def spill_directory(self):
+        if self.directory is None:
+            self.directory = self._created_directory = tempfile.mkdtemp(prefix="brv_snapshots_")
+        os.makedirs(self.directory, exist_ok=True)
+        return self.directory
+
+    def stats(self):
+        with self._lock:
+            resident = self.resident_bytes()
+            spilled = sum(1 for entry in self.entries.values() if entry.raw is None and entry.compressed is None)
+        requests = self.hits + self.misses
+        return {"snapshots": len(self.entries), "resident_bytes": resident, "spilled": spilled,
+                "hit_rate": self.hits / requests if requests else 0.0}
+
+    def describe(self):
+        stats = self.stats()
+        return (f"{stats['snapshots']} snapshots, {stats['resident_bytes'] / 1024 ** 2:.0f} MB resident, "
+                f"{stats['spilled']} spilled, {stats['hit_rate'] * 100:.0f}% cache hits")
+
+    def close(self):
+        self._jobs.put(None)
+        self._worker.join()
+        for entry in list(self.entries.values()):
+            if entry.path:
+                os.remove(entry.path)
+        self.entries.clear()
+        if self._created_directory:
+            shutil.rmtree(self._created_directory, ignore_errors=True)
+        if self.session is not None:
+            self.session.close()
+
 ### Bottom Horizontal Scrollbar for snapshot ###
-class SnapshotThumbs(QLabel):
-    clicked = Signal(object)
+class SnapshotModel(QAbstractListModel):
+    """Snapshot keys of the strip, newest first, with their thumbnails and A/B/difference marks.
+
+    Thumbnails are only requested when a row is painted, so restoring a large session does not
+    load the thumbnails that are scrolled out of view."""
+    MarkRole = Qt.UserRole + 1
+    thumbnailRequested = Signal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.keys = []
+        self.thumbnails = {}  # key -> QPixmap
+        self.requested = set()
+        self.marks = {}  # key -> "A", "B" or "D"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.keys)
 
-    def __init__(self, fullres, parent=None):
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        key = self.keys[index.row()]
+        if role == Qt.DecorationRole:
+            thumbnail = self.thumbnails.get(key)
+            if thumbnail is None and key not in self.requested:
+                self.requested.add(key)
+                self.thumbnailRequested.emit(key)
+            return thumbnail
+        if role == self.MarkRole:
+            return self.marks.get(key)
+        return None
+
+    def key(self, row):
+        return self.keys[row]
+
+    def prepend(self, keys):
+        if not keys:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(keys) - 1)
+        self.keys[0:0] = keys
+        self.endInsertRows()
+
+    def removeSnapshot(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        key = self.keys.pop(row)
+        self.thumbnails.pop(key, None)
+        self.requested.discard(key)
+        self.marks.pop(key, None)
+        self.endRemoveRows()
+
+    def setThumbnail(self, key, image):
+        if key not in self.requested:
+            return  # Deleted meanwhile
+        self.thumbnails[key] = QPixmap.fromImage(image)
+        self.changed(key, Qt.DecorationRole)
+
+    def setMark(self, key, mark):
+        if key is None:
+            return
+        if mark is None:
+            self.marks.pop(key, None)
+        else:
+            self.marks[key] = mark
+        self.changed(key, self.MarkRole)
+
+    def changed(self, key, role):
+        if key in self.keys:
+            index = self.index(self.keys.index(key))
+            self.dataChanged.emit(index, index, [role])
+
+class SnapshotDelegate(QStyledItemDelegate):
+    # Paints a thumbnail like the former QLabel strip: left aligned, white border when
+    # selected, grey when hovered and the A/B/D mark in the corner
+    def __init__(self, size, parent=None):
+        super().__init__(parent)
+        self.size = size
+
+    def sizeHint(self, option, index):
+        return self.size
+
+    def paint(self, painter, option, index):
+        rect = option.rect
+        painter.save()
+        painter.setClipRect(rect)
+        thumbnail = index.data(Qt.DecorationRole)
+        if thumbnail is not None:
+            painter.drawPixmap(rect.x(), rect.y() + (rect.height() - thumbnail.height()) // 2, thumbnail)
+        if option.state & QStyle.State_Selected:
+            painter.setPen(Qt.white)
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+        elif option.state & QStyle.State_MouseOver:
+            painter.setPen(Qt.gray)
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+        mark = index.data(SnapshotModel.MarkRole)
+        if mark:
+            metrics = option.fontMetrics
+            label = QRect(rect.x() + 5, rect.y() + 5, metrics.horizontalAdvance(mark), metrics.height())
+            painter.fillRect(label, Qt.black)
+            painter.setPen(Qt.white)
+            painter.drawText(label, Qt.AlignCenter, mark)
+        painter.restore()
+
+class SnapshotStrip(QListView):
+    # Only the visible thumbnails are laid out and painted, clicks go to the main window
+    snapshotClicked = Signal(int)
+
+    def __init__(self, height, parent=None):
         super().__init__(parent)
-        self.snapshot_fullres = fullres
-        self.toggled = False
-        self.is_set_as_a = False  # Flag to track if set as A
-        self.is_set_as_b = False  # Flag to track if set as B
-        self.setStyleSheet("border: 1px solid transparent;")
-        self.label = QLabel(self)
-        self.label.setStyleSheet("color: white; background-color: black;")
-        self.label.move(5, 5)
-        self.label.hide()
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(False)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFocusPolicy(Qt.NoFocus)  # Arrow keys navigate through the main window
+        self.setMouseTracking(True)
+        self.setFixedHeight(height)
+        cell_height = height - self.style().pixelMetric(QStyle.PM_ScrollBarExtent) - 2 * self.frameWidth()
+        self.setItemDelegate(SnapshotDelegate(QSize(SnapshotStore.thumbnail_size.width(), cell_height), self))
 
     def mousePressEvent(self, event):
+        index = self.indexAt(event.position().toPoint())
+        if not index.isValid():
+            return
         if event.button() == Qt.LeftButton:
-            self.clicked.emit(self)  # Emit self as the argument
+            self.snapshotClicked.emit(index.row())
         elif event.button() == Qt.RightButton:
-            self.showContextMenu(event.position().toPoint())
+            self.showContextMenu(index, event.position().toPoint())
 
-    def enterEvent(self, event):
-        self.setStyleSheet("border: 1px solid grey;")
-
-    def leaveEvent(self, event):
-        if not self.toggled:
-            self.setStyleSheet("border: 1px solid transparent;")
-
-    def showContextMenu(self, pos):
+    def showContextMenu(self, index, pos):
+        snapshot_key = self.model().key(index.row())
+        mark = index.data(SnapshotModel.MarkRole)
         context_menu = QMenu(self)
-        
-        set_a_action = context_menu.addAction("Set as A" if not self.is_set_as_a else "Unset A")
-        set_b_action = context_menu.addAction("Set as B" if not self.is_set_as_b else "Unset B")
+
+        set_a_action = context_menu.addAction("Set as A" if mark != "A" else "Unset A")
+        set_b_action = context_menu.addAction("Set as B" if mark != "B" else "Unset B")
+        diff_action = context_menu.addAction("Compare (Difference)" if mark != "D" else "Stop Compare")
+        diff_action.setEnabled(mainWin.difference is not None)
         delete_action = context_menu.addAction("Delete")
 
-        action = context_menu.exec(self.mapToGlobal(pos))
+        action = context_menu.exec(self.viewport().mapToGlobal(pos))
 
         if action == set_a_action:
-            if self.is_set_as_a:
-                # Unset A
-                self.unmark()
+            if mark == "A":
                 mainWin.unsetOverlayA()
             else:
-                # Set as A
-                mainWin.setOverlayA(self.snapshot_fullres, self)  # Set overlay
+                mainWin.setOverlayA(mainWin.snapshot_store.get(snapshot_key), snapshot_key)  # Set overlay
 
         elif action == set_b_action:
-            if self.is_set_as_b:
-                # Unset B
-                self.unmark()
+            if mark == "B":
                 mainWin.unsetOverlayB()
             else:
-                # Set as B
-                self.mark_as("B")
-                mainWin.setOverlayB(self.snapshot_fullres, self)  # Set overlay
-        
+                mainWin.setOverlayB(mainWin.snapshot_store.get(snapshot_key), snapshot_key)  # Set overlay
+
+        elif action == diff_action:
+            if mark == "D":
+                mainWin.unsetDiffReference()
+            else:
+                mainWin.setDiffReference(mainWin.snapshot_store.get(snapshot_key), snapshot_key)
+
         elif action == delete_action:
-            self.unmark()
-            parent_widget = self.parent()
-            if parent_widget is not None:
-                parent_widget.layout().removeWidget(self)
-                self.deleteLater()  # Properly delete the widget
-
-    def mark_as(self, overlay_letter):
-        if overlay_letter == "A":
-            self.is_set_as_a = True
-            self.is_set_as_b = False
-        if overlay_letter == "B":
-            self.is_set_as_a = False
-            self.is_set_as_b = True
-
-        self.label.setText(overlay_letter)
-        self.label.show()
-
-    def unmark(self):
-        if self.is_set_as_a: self.is_set_as_a = False;mainWin.unsetOverlayA()
-        if self.is_set_as_b: self.is_set_as_b = False;mainWin.unsetOverlayB()
-        self.label.hide()
-        self.label.setText("")
+            mainWin.deleteSnapshot(index.row())
+
+class ThumbnailPool(QObject):
+    """Worker threads making the thumbnails off the UI thread, most recently requested first
+    so the rows in view are served before the ones scrolled past"""
+    thumbnailReady = Signal(int, QImage)
+
+    def __init__(self, workers=None, parent=None):
+        super().__init__(parent)
+        self._jobs = queue.LifoQueue()
+        self._workers = [threading.Thread(target=self.work, daemon=True)
+                         for _ in range(workers or max(1, min(4, os.cpu_count() or 1)))]
+        for worker in self._workers:
+            worker.start()
+
+    def request(self, key, make):
+        self._jobs.put((key, make))
+
+    def work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            (key, make) = job
+            try:
+                image = make(key)
+            except KeyError:
+                continue  # Deleted meanwhile
+            self.thumbnailReady.emit(key, image)
+
+    def close(self):
+        for worker in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
 
 ### Global Hotkeys ###
 class KeyPressFilter(QObject):
@@ -747,31 +2518,578 @@ class KeyPressFilter(QObject):
                 self.main_window.deleteCurrent()
         return False
 
+### Compositing ###
+class Compositor:
+    """Composite of the live frame with the selected snapshot and the A/B wipe overlays.
+
+    The static layers (snapshot background, A/B overlays clipped by the wipe line) only
+    depend on the overlays, the line position and the frame size, they are rebuilt when one
+    of those changes. A live frame is then drawn, with the overlay layer on top, into the
+    same reused buffer, only where it changed."""
+
+    def __init__(self):
+        self.key = None
+        self.result = None  # Composite buffer (maximum size of all inputs)
+        self.overlay = None  # A left / B right of the wipe line, transparent elsewhere (live frame size)
+        self.rebuilds = 0
+
+    def compose(self, live, tempOverlay, overlay_A, overlay_B, mask_line, rects=None):
+        # Returns the composite and its changed (x, y, w, h) areas (None: everything)
+        width = max([live.width()] + [pixmap.width() for pixmap in (tempOverlay, overlay_A, overlay_B) if pixmap])
+        height = max([live.height()] + [pixmap.height() for pixmap in (tempOverlay, overlay_A, overlay_B) if pixmap])
+        x_offset = (width - live.width()) // 2
+        y_offset = (height - live.height()) // 2
+        p1 = mask_line.mapToScene(mask_line.line().p1())
+        p2 = mask_line.mapToScene(mask_line.line().p2())
+        key = (live.width(), live.height(),
+               tuple(pixmap.cacheKey() if pixmap else None for pixmap in (tempOverlay, overlay_A, overlay_B)),
+               (overlay_A or overlay_B) and (round(p1.x(), 2), round(p1.y(), 2), round(p2.x(), 2), round(p2.y(), 2)))
+        if key != self.key:
+            self.rebuild(width, height, live, tempOverlay, overlay_A, overlay_B, mask_line)
+            self.key = key
+            rects = None
+        if not (overlay_A or overlay_B):
+            # The selected snapshot hides the live frame
+            return self.result, [] if rects is not None else None
+
+        areas = [(0, 0, live.width(), live.height())] if rects is None else rects
+        self.draw_live(live, areas, x_offset, y_offset)
+        if rects is None:
+            return self.result, None
+        return self.result, [(x + x_offset, y + y_offset, w, h) for (x, y, w, h) in rects]
+
+    def draw_live(self, live, areas, x_offset, y_offset):
+        painter = QPainter(self.result)
+        for (x, y, w, h) in areas:
+            source = QRect(x, y, w, h)
+            target = source.translated(x_offset, y_offset)
+            painter.setCompositionMode(QPainter.CompositionMode_Source)
+            painter.drawPixmap(target, live, source)
+            painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+            painter.drawImage(target, self.overlay, source)
+        painter.end()
+
+    def rebuild(self, width, height, live, tempOverlay, overlay_A, overlay_B, mask_line):
+        self.rebuilds += 1
+        if self.result is None or self.result.size() != QSize(width, height):
+            self.result = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+        self.result.fill(Qt.transparent)
+        if tempOverlay:
+            painter = QPainter(self.result)
+            painter.drawPixmap((width - tempOverlay.width()) // 2, (height - tempOverlay.height()) // 2, tempOverlay)
+            painter.end()
+        self.overlay = None
+        if overlay_A or overlay_B:
+            self.build_overlay(live.size(), overlay_A, overlay_B, mask_line)
+
+    def build_overlay(self, size, overlay_A, overlay_B, mask_line):
+        self.overlay = self.apply_line_mask(size, overlay_A, overlay_B, mask_line)
+
+    def apply_line_mask(self, size, overlay_A, overlay_B, mask_line):
+        result_image = QImage(size, QImage.Format_ARGB32_Premultiplied)
+        result_image.fill(Qt.transparent)
+
+        painter = QPainter(result_image)
+        width = size.width()
+
+        # Left side of the line, as runs of rows split at the same column
+        splits = self.wipe_split(size, mask_line)
+        left, right = QRegion(), QRegion()
+        top = 0
+        for row in range(1, len(splits) + 1):
+            if row == len(splits) or splits[row] != splits[top]:
+                left += QRegion(0, top, splits[top], row - top)
+                right += QRegion(splits[top], top, width - splits[top], row - top)
+                top = row
+
+        # Draw overlay A on the left side
+        if overlay_A:
+            painter.setClipRegion(left)
+            painter.drawPixmap(0, 0, overlay_A)
+
+        # Draw overlay B on the right side
+        if overlay_B:
+            painter.setClipRegion(right)
+            painter.drawPixmap(0, 0, overlay_B)
+
+        painter.end()
+        return result_image
+
+    def wipe_split(self, size, mask_line):
+        # Per row, the A side is the columns left of the split: pixel centers strictly left of
+        # the wipe line, or whole rows on the left hand side of p1 -> p2 when it is horizontal
+        width, height = size.width(), size.height()
+        p1, p2 = self.line_points(size, mask_line)
+        dx, dy = p2.x() - p1.x(), p2.y() - p1.y()
+        if dy == 0:
+            return [width if dx * (row + 0.5 - p1.y()) > 0 else 0 for row in range(height)]
+        # ceil(x - 0.5) as -floor(0.5 - x)
+        return [min(max(-int((0.5 - (p1.x() + dx * (row + 0.5 - p1.y()) / dy)) // 1), 0), width)
+                for row in range(height)]
+
+    def line_points(self, size, mask_line):
+        # Wipe line end points in frame coordinates (the frame is centered on the scene origin)
+        offset_x = size.width() / 2
+        offset_y = size.height() / 2
+        p1_scene = mask_line.mapToScene(mask_line.line().p1())
+        p2_scene = mask_line.mapToScene(mask_line.line().p2())
+
+        # Apply the offset to the line points
+        p1_scene.setX(p1_scene.x() + offset_x)
+        p1_scene.setY(p1_scene.y() + offset_y)
+        p2_scene.setX(p2_scene.x() + offset_x)
+        p2_scene.setY(p2_scene.y() + offset_y)
+        return p1_scene, p2_scene
+
+def image_array(image, writable=False):
+    # uint32 (rows x width) view over the pixels of a 32 bit QImage, without copy
+    bits = image.bits() if writable else image.constBits()
+    return np.frombuffer(bits, np.uint32).reshape(image.height(), image.bytesPerLine() // 4)[:, :image.width()]
+
+def frame_image(pixmap):
+    # Opaque pixmaps are stored as RGB32 (0xffRRGGBB), the same pixels as premultiplied ARGB32
+    image = pixmap.toImage()
+    if image.format() not in (QImage.Format_RGB32, QImage.Format_ARGB32_Premultiplied):
+        image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    return image
+
+class NumpyCompositor(Compositor):
+    """Compositor computing the A/B wipe split in NumPy and copying the frame buffers by slices.
+
+    Each row is split where its pixel centers cross the wipe line, in chunks of rows with a
+    per pixel mask only where the line crosses them (a vertical line is a column split). Each
+    live frame is then copied with the A and B parts of the changed areas on top, instead of
+    alpha blending a clipped overlay layer. Snapshots are opaque frames and both compositors
+    split the rows at the same columns (wipe_split), so the result is the painter one."""
+
+    def __init__(self):
+        super().__init__()
+        self.layers = []  # Per overlay: (pixels, blocks, block bottoms, image)
+        self.covered = False
+
+    def wipe_chunks(self, size, mask_line, rows=32):
+        # Chunks of rows as (top, bottom, low, high, mask): columns left of low are A, right of
+        # high are B, the strip where the line crosses between them has a per pixel A mask
+        splits = np.array(self.wipe_split(size, mask_line))
+        chunks = []
+        for top in range(0, len(splits), rows):
+            split = splits[top:top + rows]
+            bottom, low, high = top + len(split), int(split.min()), int(split.max())
+            if low == high and chunks and chunks[-1][2:4] == (low, high):
+                chunks[-1] = (chunks[-1][0], bottom, low, high, None)  # Same split as the rows above
+            else:
+                chunks.append((top, bottom, low, high, np.arange(low, high) < split[:, None] if high > low else None))
+        return chunks
+
+    def build_overlay(self, size, overlay_A, overlay_B, mask_line):
+        self.layers = self.wipe_layers(size, overlay_A, overlay_B, mask_line)
+
+    def wipe_layers(self, size, overlay_A, overlay_B, mask_line):
+        # Per overlay: its pixels and the (top, bottom, left, right, mask) blocks it covers, sorted by rows
+        width, height = size.width(), size.height()
+        chunks = self.wipe_chunks(size, mask_line)
+        layers = []
+        for overlay, side_A in ((overlay_A, True), (overlay_B, False)):
+            if not overlay:
+                continue
+            image = frame_image(overlay)
+            blocks = []
+            for (top, bottom, low, high, mask) in chunks:
+                if side_A:
+                    parts = [(0, low, None), (low, high, mask)]
+                else:
+                    parts = [(low, high, None if mask is None else ~mask), (high, width, None)]
+                for (left, right, part_mask) in parts:
+                    # Outside of a smaller overlay the live frame shows through
+                    clipped_bottom, clipped_right = min(bottom, image.height()), min(right, image.width())
+                    if top < clipped_bottom and left < clipped_right:
+                        if part_mask is not None:
+                            part_mask = part_mask[:clipped_bottom - top, :clipped_right - left]
+                        blocks.append((top, clipped_bottom, left, clipped_right, part_mask))
+            layers.append((image_array(image), blocks, [block[1] for block in blocks], image))
+        self.covered = (overlay_A and overlay_B and overlay_A.width() >= width and overlay_A.height() >= height
+                        and overlay_B.width() >= width and overlay_B.height() >= height)
+        return layers
+
+    def draw_live(self, live, areas, x_offset, y_offset):
+        live_image = frame_image(live)
+        live_array = image_array(live_image)
+        result = image_array(self.result, writable=True)[y_offset:y_offset + live.height(), x_offset:x_offset + live.width()]
+        for (x, y, w, h) in areas:
+            if not self.covered:  # Otherwise A and B together hide the whole live frame
+                result[y:y + h, x:x + w] = live_array[y:y + h, x:x + w]
+            for (pixels, blocks, bottoms, image) in self.layers:
+                for index in range(bisect.bisect_right(bottoms, y), len(blocks)):
+                    block_top, bottom, block_left, right, mask = blocks[index]
+                    if block_top >= y + h:
+                        break
+                    top, bottom, left, right = max(block_top, y), min(bottom, y + h), max(block_left, x), min(right, x + w)
+                    if left >= right:
+                        continue
+                    if mask is None:
+                        result[top:bottom, left:right] = pixels[top:bottom, left:right]
+                    else:
+                        np.copyto(result[top:bottom, left:right], pixels[top:bottom, left:right],
+                                  where=mask[top - block_top:bottom - block_top, left - block_left:right - block_left])
+
+class DifferenceView:
+    """Difference of the live frame against a snapshot, as an absolute difference or a heatmap.
+
+    The channel differences are computed over the frame buffers into a scratch buffer padded
+    to whole tiles, the mean and max error are then kept per tile. Only the tiles of the
+    changed areas of a live frame are recomputed, the reference, mode or gain changing
+    recomputes everything."""
+
+    MODES = ("difference", "heatmap")
+    GAINS = (1, 4, 16, 64)  # Powers of two, applied as shifts saturated at 255
+
+    def __init__(self, tile_size=128):
+        self.tile_size = tile_size
+        self.mode = "difference"
+        self.gain = 4
+        self.key = None
+        self.result = None  # Difference image (live frame size)
+        self.reference = None  # Reference pixels aligned on the live frame
+        self.difference = None  # Channel differences, padded to whole tiles
+        self.scratch = None
+        self.tile_sum = None  # Per tile sum of the channel differences and maximum
+        self.tile_max = None
+        self.tile_pixels = None
+        self.tiles_computed = 0
+        # Heatmap: black, blue, red, yellow, white
+        stops = np.array([[0, 0, 0], [0, 0, 255], [255, 0, 0], [255, 255, 0], [255, 255, 255]], float)
+        levels = np.linspace(0, len(stops) - 1, 256)
+        rgb = np.stack([np.interp(levels, np.arange(len(stops)), stops[:, channel]) for channel in range(3)], axis=1)
+        rgb = rgb.round().astype(np.uint32)
+        self.heatmap = 0xff000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+    def compose(self, live, reference, rects=None):
+        # live: frame image (RGB32 or premultiplied ARGB32), reference: snapshot pixmap.
+        # Returns the difference image and its changed (x, y, w, h) areas (None: everything)
+        key = (live.width(), live.height(), reference.cacheKey(), self.mode, self.gain)
+        if key != self.key:
+            self.rebuild(live, reference)
+            self.key = key
+            rects = None
+        width, height = live.width(), live.height()
+        size = self.tile_size
+        if rects is None:
+            areas = [(0, 0, width, height)]
+        else:
+            # Whole tiles, their statistics are computed at once
+            areas = []
+            for (x, y, w, h) in rects:
+                left, top = x // size * size, y // size * size
+                areas.append((left, top, min(-(-(x + w) // size) * size, width) - left,
+                              min(-(-(y + h) // size) * size, height) - top))
+        live_array = image_array(live)
+        for area in areas:
+            self.compute(live_array, *area)
+        return self.result, None if rects is None else areas
+
+    def rebuild(self, live, reference):
+        width, height = live.width(), live.height()
+        if self.result is None or self.result.size() != live.size():
+            self.result = QImage(live.size(), QImage.Format_ARGB32_Premultiplied)
+        if reference.size() == live.size():
+            self.reference = frame_image(reference)
+        else:
+            # Centered like the composite, the rest compares against black
+            self.reference = QImage(live.size(), QImage.Format_ARGB32_Premultiplied)
+            self.reference.fill(Qt.black)
+            painter = QPainter(self.reference)
+            painter.drawPixmap((width - reference.width()) // 2, (height - reference.height()) // 2, reference)
+            painter.end()
+        size = self.tile_size
+        rows, columns = -(-height // size), -(-width // size)
+        if self.difference is None or self.difference.shape != (rows * size, columns * size * 4):
+            # The padding stays zero, it adds nothing to the tile sums and maximums
+            self.difference = np.zeros((rows * size, columns * size * 4), np.uint8)
+            self.scratch = np.empty((height, width * 4), np.uint8)
+        self.tile_pixels = np.outer(np.minimum(size, height - np.arange(0, height, size)),
+                                    np.minimum(size, width - np.arange(0, width, size)))
+        self.tile_sum = np.zeros((rows, columns), np.uint32)
+        self.tile_max = np.zeros((rows, columns), np.uint8)
+        self.palette = self.heatmap[np.minimum(np.arange(256) * self.gain, 255)]
+
+    def compute(self, live_array, x, y, w, h):
+        # x, y on tile boundaries
+        live_bytes = live_array[y:y + h, x:x + w].view(np.uint8)
+        reference_bytes = image_array(self.reference)[y:y + h, x:x + w].view(np.uint8)
+        difference = self.difference[y:y + h, x * 4:(x + w) * 4]
+        scratch = self.scratch[y:y + h, x * 4:(x + w) * 4]
+        np.maximum(live_bytes, reference_bytes, out=difference)
+        np.minimum(live_bytes, reference_bytes, out=scratch)
+        difference -= scratch
+        # Color channels only, the alpha (or padding) byte of a snapshot is not part of the error
+        difference.view(np.uint32)[...] &= 0x00ffffff
+
+        result = image_array(self.result, writable=True)[y:y + h, x:x + w]
+        if self.mode == "heatmap":
+            # Largest channel difference per pixel
+            channels = difference.reshape(h, w, 4)
+            error = np.maximum(channels[:, :, 0], channels[:, :, 1], out=scratch[:, :w])
+            np.maximum(error, channels[:, :, 2], out=error)
+            np.take(self.palette, error, out=result)
+        else:
+            output = result.view(np.uint8)
+            if self.gain == 1:
+                output[...] = difference
+            else:
+                # min(difference * gain, 255), by bands of rows that stay in cache
+                shift, limit = self.gain.bit_length() - 1, 255 // self.gain
+                for top in range(0, h, 32):
+                    band, out = difference[top:top + 32], output[top:top + 32]
+                    np.left_shift(band, shift, out=out)
+                    np.maximum(out, (band > limit).view(np.uint8) * np.uint8(255), out=out)
+            result |= 0xff000000
+
+        size = self.tile_size
+        rows, columns = -(-h // size), -(-w // size)
+        tiles = self.difference[y:y + rows * size, x * 4:(x + columns * size) * 4].reshape(rows, size, columns, size * 4)
+        tile_rows, tile_columns = y // size, x // size
+        self.tile_sum[tile_rows:tile_rows + rows, tile_columns:tile_columns + columns] = tiles.sum(axis=(1, 3), dtype=np.uint32)
+        self.tile_max[tile_rows:tile_rows + rows, tile_columns:tile_columns + columns] = tiles.max(axis=1).max(axis=2)
+        self.tiles_computed += rows * columns
+
+    def tile_at(self, x, y):
+        # (mean, max) channel error of the tile at pixel x, y
+        if self.tile_sum is None:
+            return None
+        tx, ty = int(x) // self.tile_size, int(y) // self.tile_size
+        if not (0 <= ty < self.tile_sum.shape[0] and 0 <= tx < self.tile_sum.shape[1]):
+            return None
+        return self.tile_sum[ty, tx] / (3 * self.tile_pixels[ty, tx]), int(self.tile_max[ty, tx])
+
+    def stats(self):
+        # Frame mean and max channel error, position and mean error of the worst tile
+        tile_mean = self.tile_sum / (3 * self.tile_pixels)
+        ty, tx = np.unravel_index(np.argmax(tile_mean), tile_mean.shape)
+        return (self.tile_sum.sum() / (3 * self.tile_pixels.sum()), int(self.tile_max.max()),
+                (int(tx) * self.tile_size, int(ty) * self.tile_size), tile_mean[ty, tx])
+
+### Saving ###
+def is_float_image(image):
+    return image.pixelFormat().typeInterpretation() == QPixelFormat.FloatingPoint
+
+def write_qoi(image, file, rows=256):
+    # Lossless QOI (qoiformat.org) of an opaque image, yields the fraction written after each block.
+    # The per pixel rules are evaluated on blocks of rows at once: a pixel equal to the previous one
+    # extends a run, otherwise the color index holds the last non-run pixel with the same hash
+    if image.format() != QImage.Format_RGB32:
+        image = image.convertToFormat(QImage.Format_RGB32)
+    width, height = image.width(), image.height()
+    file.write(b"qoif" + struct.pack(">IIBB", width, height, 3, 0))
+    pixels = image_array(image)
+    index = np.zeros(64, np.uint32)  # Transparent black, never equal to an opaque pixel
+    previous = np.uint32(0xff000000)
+    run = 0  # Pending run carried over from the previous block
+    for top in range(0, height, rows):
+        px = pixels[top:top + rows].reshape(-1) | np.uint32(0xff000000)
+        last_block = top + rows >= height
+        prev = np.empty_like(px)
+        prev[0] = previous
+        prev[1:] = px[:-1]
+        previous = px[-1]
+        same = px == prev
+        channels = [(px >> shift).astype(np.uint8) for shift in (16, 8, 0)]
+        (r, g, b) = (channel.astype(np.uint16) for channel in channels)
+        hashes = ((r * 3 + g * 5 + b * 7 + 255 * 11) % 64).astype(np.uint8)
+
+        # Index hits: the previous non-run pixel with the same hash, or the index left by the last block
+        positions = np.flatnonzero(~same)
+        order = positions[np.argsort(hashes[positions], kind="stable")]
+        sorted_hashes = hashes[order]
+        first = np.ones(len(order), bool)
+        first[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+        indexed = np.empty(len(order), np.uint32)
+        indexed[1:] = px[order[:-1]]
+        indexed[first] = index[sorted_hashes[first]]
+        last = np.ones(len(order), bool)
+        last[:-1] = first[1:]
+        index[sorted_hashes[last]] = px[order[last]]
+        hit = np.zeros(len(px), bool)
+        hit[order] = px[order] == indexed
+
+        # Runs: length so far at each pixel, a chunk ends every 62 pixels and where the run stops
+        position = np.arange(len(px))
+        start = np.maximum.accumulate(np.where(same, -1, position))
+        length = np.where(start < 0, position + 1 + run, position - start)
+        follows = np.zeros(len(px), bool)
+        follows[:-1] = same[1:]
+        ends = same & ((length % 62 == 0) | ~follows)
+        if not last_block:
+            ends[-1] = same[-1] and length[-1] % 62 == 0  # The run may go on in the next block
+        pending = run % 62 if not same[0] else 0  # Run of the last block stopped at this block's first pixel
+        run = int(length[-1]) if same[-1] and not last_block else 0
+
+        # Differences with the previous pixel, wrapping like the reference encoder
+        diffs = [(channel - (prev >> shift).astype(np.uint8)).view(np.int8).astype(np.int16)
+                 for channel, shift in zip(channels, (16, 8, 0))]
+        dr, dg, db = diffs
+        small = ~same & ~hit & (dr >= -2) & (dr <= 1) & (dg >= -2) & (dg <= 1) & (db >= -2) & (db <= 1)
+        luma = (~same & ~hit & ~small & (dg >= -32) & (dg <= 31) & (dr - dg >= -8) & (dr - dg <= 7)
+                & (db - dg >= -8) & (db - dg <= 7))
+        full = ~same & ~hit & ~small & ~luma
+        sizes = (ends | hit | small).astype(np.int64) + luma * 2 + full * 4
+        offsets = np.cumsum(sizes) - sizes + (1 if pending else 0)
+        out = np.empty(int(offsets[-1] + sizes[-1]), np.uint8)
+        if pending:
+            out[0] = 0xc0 | (pending - 1)
+        out[offsets[ends]] = 0xc0 | ((length[ends] - 1) % 62)
+        out[offsets[hit]] = hashes[hit]
+        out[offsets[small]] = (0x40 | (dr[small] + 2) << 4 | (dg[small] + 2) << 2 | (db[small] + 2)).astype(np.uint8)
+        out[offsets[luma]] = (0x80 | (dg[luma] + 32)).astype(np.uint8)
+        out[offsets[luma] + 1] = ((dr[luma] - dg[luma] + 8) << 4 | (db[luma] - dg[luma] + 8)).astype(np.uint8)
+        out[offsets[full]] = 0xfe
+        for byte, channel in enumerate(channels, 1):
+            out[offsets[full] + byte] = channel[full]
+        file.write(out.data)
+        yield min(top + rows, height) / height
+    file.write(bytes(7) + b"\x01")
+
+class ImageEncoder(QObject):
+    """Saves images on a worker thread, one after the other in the order they were queued.
+
+    PNG, uncompressed TIFF and lossless WebP are written by Qt, QOI by write_qoi (numpy).
+    Float images are written as float TIFF (values above 1 kept) or 16-bit PNG, WebP and QOI are 8-bit.
+    Files are written next to their destination and renamed once complete."""
+    FORMATS = {
+        "png": "PNG (*.png)",
+        "tiff": "TIFF, uncompressed (*.tif *.tiff)",
+        "webp": "WebP, lossless (*.webp)",
+        "qoi": "QOI (*.qoi)",
+    }
+    PNG_LEVELS = (0, 1, 3, 6, 9)
+    progress = Signal(str, float, int)  # Path, fraction written (-1 while unknown), saves queued after it
+    saved = Signal(str, float, int)  # Path, seconds, bytes
+    failed = Signal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.queued = 0
+        self._lock = threading.Lock()
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self.work, daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def formats(cls):
+        # Qt only writes TIFF and WebP with their image format plugins
+        supported = {bytes(name).decode() for name in QImageWriter.supportedImageFormats()}
+        return [name for name in cls.FORMATS if (np is not None if name == "qoi" else name in supported)]
+
+    @classmethod
+    def destination(cls, path, name_filter=None):
+        # (path, format) from the file extension, else from the chosen filter with its extension added
+        extension = os.path.splitext(path)[1].lower().lstrip(".")
+        extension = {"tif": "tiff"}.get(extension, extension)
+        if extension in cls.formats():
+            return path, extension
+        format = next((name for (name, description) in cls.FORMATS.items() if description == name_filter), "png")
+        return f"{path}.{'tif' if format == 'tiff' else format}", format
+
+    def save(self, image, path, format="png", level=6):
+        with self._lock:
+            self.queued += 1
+        self._jobs.put((image, path, format, level))
+
+    def work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            (image, path, format, level) = job
+            with self._lock:
+                self.queued -= 1
+                queued = self.queued
+            start = time.perf_counter()
+            partial = path + ".part"
+            try:
+                self.encode(image, partial, format, level, lambda fraction: self.progress.emit(path, fraction, queued))
+                os.replace(partial, path)
+            except (OSError, ValueError) as error:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                self.failed.emit(path, str(error))
+                continue
+            self.saved.emit(path, time.perf_counter() - start, os.path.getsize(path))
+
+    def encode(self, image, path, format, level, progress):
+        if format == "qoi":
+            with open(path, "wb") as file:
+                for fraction in write_qoi(image, file):
+                    progress(fraction)
+            return
+        progress(-1)
+        writer = QImageWriter(path, format.encode("ascii"))
+        if format == "png":
+            if is_float_image(image):
+                image = image.convertToFormat(QImage.Format_RGBA64)  # Qt's PNG writer would write 8 bits
+            writer.setCompression(level)  # zlib level
+        elif format == "tiff":
+            writer.setCompression(0)  # Uncompressed
+        elif format == "webp":
+            writer.setQuality(100)  # Lossless
+        if not writer.write(image):
+            raise OSError(f"{format.upper()} encoding failed: {writer.errorString()}")
+
+    def close(self):
+        # Waits for the queued saves
+        self._jobs.put(None)
+        self._worker.join()
+
 ### Main UI ###
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, backend, target_fps=CAPTURE_RATES[0], compositor=Compositor, convergence=None,
+                 idle_fps=1, snapshot_on_convergence=False, snapshot_store=None):
         super().__init__()
+        self.snapshot_store = snapshot_store or SnapshotStore()
         self.blender_hwnd = None
+        self.capture_fps = target_fps
+        self.convergence = convergence
+        self.idle_fps = idle_fps  # Capture rate once converged (None: keep the capture rate)
+        self.snapshot_on_convergence = snapshot_on_convergence
+        self.convergence_text = None
+        self.png_level = 6
+        self.image_encoder = ImageEncoder(self)
+        self.image_encoder.progress.connect(self.showSaveProgress)
+        self.image_encoder.saved.connect(self.fileSaved)
+        self.image_encoder.failed.connect(self.saveFailed)
         self.initUI()
         self.tempOverlay = None
         self.overlay_A = None
         self.overlay_B = None
         self.alpha_A = 0.0
         self.alpha_B = 0.0
-        self.current_a_thumb = None  # Store the current "A" thumbnail
-        self.current_b_thumb = None  # Store the current "B" thumbnail
-        self.current_selected_index = -1  # Store the current selected thumbnail index
+        self.current_a_key = None  # Snapshot set as "A"
+        self.current_b_key = None  # Snapshot set as "B"
+        self.diff_reference = None  # Snapshot the live frame is compared against
+        self.current_diff_key = None
         self.setFocusPolicy(Qt.StrongFocus)  # Ensure the main window can receive key events
         self.snapshots = []
-        self.screenshot_thread = ScreenshotThread(Blender.windowHandle)
-        self.screenshot_thread.imageCaptured.connect(self.updateImage)
+        self.measured_fps = None
+        self.screenshot_thread = ScreenshotThread(backend, target_fps, convergence)
+        self.screenshot_thread.frameReady.connect(self.liveImage)
+        self.screenshot_thread.fpsMeasured.connect(self.showCaptureRate)
+        self.screenshot_thread.refining.connect(self.renderRefining)
+        self.screenshot_thread.converged.connect(self.renderConverged)
         self.screenshot_thread.start()
 
         self.lastHeight = 0
         self.lastWidth = 0
+        self.lastLiveSize = None
+        self.liveFrame = None
+        self.liveFrameImage = None
+        self.liveFullPrecision = None  # Float pixels of the live frame (final render stream)
+        self.remote_server = None  # brv_remote.RemoteStreamServer the live frames are served to
+        self.compositor = compositor()
+        self.difference = DifferenceView() if np is not None else None
         # Install the event filter on the main window
         self.key_press_filter = KeyPressFilter(self)
         QApplication.instance().installEventFilter(self.key_press_filter)
+        if self.snapshot_store.session is not None:
+            self.restoreSession()
 
         self.setWindowFlags(self.windowFlags() | Qt.Window)  # Ensure it's a top-level window
 
@@ -784,16 +3102,14 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.viewer)
 
         # Create the scrollable image gallery at the bottom
-        self.scroll_area = QScrollArea(self)
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_widget = QWidget()
-        self.scroll_layout = QHBoxLayout(self.scroll_widget)
-        self.scroll_layout.setContentsMargins(0, 0, 0, 0)
-        self.scroll_layout.setSpacing(0)
-        self.scroll_widget.setLayout(self.scroll_layout)
-        self.scroll_area.setWidget(self.scroll_widget)
-        self.scroll_area.setFixedHeight(100 * self.devicePixelRatio())
-        self.scroll_layout.setAlignment(Qt.AlignLeft) 
+        self.snapshot_model = SnapshotModel(self)
+        self.snapshot_strip = SnapshotStrip(100 * self.devicePixelRatio(), self)
+        self.snapshot_strip.setModel(self.snapshot_model)
+        self.snapshot_strip.snapshotClicked.connect(self.image_clicked)
+        self.thumbnail_pool = ThumbnailPool(parent=self)
+        self.thumbnail_pool.thumbnailReady.connect(self.snapshot_model.setThumbnail)
+        self.snapshot_model.thumbnailRequested.connect(
+            lambda key: self.thumbnail_pool.request(key, self.snapshot_store.thumbnail))
 
 
 
@@ -804,7 +3120,7 @@ class MainWindow(QMainWindow):
         main_layout = QVBoxLayout()
         main_layout.addWidget(self.button_menu)
         main_layout.addWidget(self.viewer)
-        main_layout.addWidget(self.scroll_area)
+        main_layout.addWidget(self.snapshot_strip)
 
         # Set the central widget with the main layout
         central_widget = QWidget()
@@ -826,6 +3142,16 @@ class MainWindow(QMainWindow):
         saveAsAction.triggered.connect(self.saveAs)
         fileMenu.addAction(saveAsAction)
 
+        # PNG compression submenu (saving is done in the background)
+        pngMenu = fileMenu.addMenu('PNG Compression')
+        pngGroup = QActionGroup(self)
+        for level, label in zip(ImageEncoder.PNG_LEVELS, ('0 (fastest)', '1', '3', '6 (default)', '9 (smallest)')):
+            pngAction = QAction(label, self, checkable=True)
+            pngAction.setChecked(level == self.png_level)
+            pngAction.triggered.connect(lambda checked, level=level: setattr(self, 'png_level', level))
+            pngGroup.addAction(pngAction)
+            pngMenu.addAction(pngAction)
+
         # View menu
         viewMenu = menubar.addMenu('&View')
 
@@ -837,6 +3163,52 @@ class MainWindow(QMainWindow):
         fitToZoomAction.triggered.connect(self.fitToZoom)
         viewMenu.addAction(fitToZoomAction) 
 
+        # Capture rate submenu
+        rateMenu = viewMenu.addMenu('Capture Rate')
+        rateGroup = QActionGroup(self)
+        for fps in CAPTURE_RATES:
+            rateAction = QAction(f'{fps} fps', self, checkable=True)
+            rateAction.setChecked(fps == self.capture_fps)
+            rateAction.triggered.connect(lambda checked, fps=fps: self.setCaptureRate(fps))
+            rateGroup.addAction(rateAction)
+            rateMenu.addAction(rateAction)
+
+        # Convergence submenu
+        convergenceMenu = viewMenu.addMenu('Convergence')
+        convergenceMenu.setEnabled(self.convergence is not None)
+        detectAction = QAction('Detect Convergence', self, checkable=True)
+        detectAction.setChecked(self.convergence is not None)
+        detectAction.toggled.connect(self.setConvergenceDetection)
+        convergenceMenu.addAction(detectAction)
+        snapshotAction = QAction('Snapshot on Convergence', self, checkable=True)
+        snapshotAction.setChecked(self.snapshot_on_convergence)
+        snapshotAction.toggled.connect(lambda checked: setattr(self, 'snapshot_on_convergence', checked))
+        convergenceMenu.addAction(snapshotAction)
+        idle_fps = self.idle_fps or 1
+        idleAction = QAction(f'Idle Capture Rate on Convergence ({idle_fps:g} fps)', self, checkable=True)
+        idleAction.setChecked(self.idle_fps is not None)
+        idleAction.toggled.connect(lambda checked: self.setConvergenceIdleRate(idle_fps if checked else None))
+        convergenceMenu.addAction(idleAction)
+
+        # Difference compare submenu (reference set from a snapshot context menu)
+        diffMenu = viewMenu.addMenu('Difference')
+        diffMenu.setEnabled(np is not None)
+        modeGroup = QActionGroup(self)
+        for mode, label in zip(DifferenceView.MODES, ('Absolute Difference', 'Heatmap')):
+            modeAction = QAction(label, self, checkable=True)
+            modeAction.setChecked(mode == DifferenceView.MODES[0])
+            modeAction.triggered.connect(lambda checked, mode=mode: self.setDifferenceMode(mode))
+            modeGroup.addAction(modeAction)
+            diffMenu.addAction(modeAction)
+        diffMenu.addSeparator()
+        gainGroup = QActionGroup(self)
+        for gain in DifferenceView.GAINS:
+            gainAction = QAction(f'Gain x{gain}', self, checkable=True)
+            gainAction.setChecked(gain == 4)
+            gainAction.triggered.connect(lambda checked, gain=gain: self.setDifferenceGain(gain))
+            gainGroup.addAction(gainAction)
+            diffMenu.addAction(gainAction)
+
     def createButtonMenu(self):
         self.button_menu = QWidget()
         h_layout = QHBoxLayout()
@@ -873,216 +3245,245 @@ class MainWindow(QMainWindow):
         # Align buttons to the left
         h_layout.addStretch()
 
+        # Background saves
+        self.save_progress = QProgressBar()
+        self.save_progress.setMaximumWidth(300)
+        self.save_progress.hide()
+        h_layout.addWidget(self.save_progress)
+
         self.button_menu.setLayout(h_layout)
     
-    def setOverlayA(self, pixmap, thumb):
-        if self.current_a_thumb:
-            self.current_a_thumb.unmark()
+    def setOverlayA(self, pixmap, snapshot_key=None):
+        self.unmarkSnapshot(self.current_a_key)
+        self.unmarkSnapshot(snapshot_key)
         self.overlay_A = pixmap
-        self.current_a_thumb = thumb
-        if thumb:
-            thumb.mark_as("A")
+        self.current_a_key = snapshot_key
+        self.snapshot_model.setMark(snapshot_key, "A")
+        self.refreshImage()
 
-    def setOverlayB(self, pixmap, thumb):
-        if self.current_b_thumb:
-            self.current_b_thumb.unmark()
+    def setOverlayB(self, pixmap, snapshot_key=None):
+        self.unmarkSnapshot(self.current_b_key)
+        self.unmarkSnapshot(snapshot_key)
         self.overlay_B = pixmap
-        self.current_b_thumb = thumb
-        if thumb:
-            thumb.mark_as("B")
+        self.current_b_key = snapshot_key
+        self.snapshot_model.setMark(snapshot_key, "B")
+        self.refreshImage()
+
+    def setDiffReference(self, pixmap, snapshot_key=None):
+        self.unmarkSnapshot(self.current_diff_key)
+        self.unmarkSnapshot(snapshot_key)
+        self.diff_reference = pixmap
+        self.current_diff_key = snapshot_key
+        self.snapshot_model.setMark(snapshot_key, "D")
+        self.refreshImage()
+
+    def unsetDiffReference(self):
+        self.diff_reference = None
+        self.snapshot_model.setMark(self.current_diff_key, None)
+        self.current_diff_key = None
+        self.updateTitle()
+        self.refreshImage()
+
+    def unmarkSnapshot(self, snapshot_key):
+        # Stop using a snapshot as A, B or difference reference
+        mark = self.snapshot_model.marks.get(snapshot_key)
+        if mark == "A":
+            self.unsetOverlayA()
+        elif mark == "B":
+            self.unsetOverlayB()
+        elif mark == "D":
+            self.unsetDiffReference()
+
+    def setDifferenceMode(self, mode):
+        self.difference.mode = mode
+        self.refreshImage()
+
+    def setDifferenceGain(self, gain):
+        self.difference.gain = gain
+        self.refreshImage()
 
     def unsetOverlayA(self):
         self.overlay_A = None
-        self.current_a_thumb = None
+        self.snapshot_model.setMark(self.current_a_key, None)
+        self.current_a_key = None
         print("removed overlay A")
+        self.refreshImage()
 
     def unsetOverlayB(self):
         self.overlay_B = None
-        self.current_b_thumb = None
+        self.snapshot_model.setMark(self.current_b_key, None)
+        self.current_b_key = None
         print("removed overlay B")
+        self.refreshImage()
 
-    def apply_line_mask(self, base_pixmap, overlay_A, overlay_B, mask_line):
+    def blend_images(self, base_pixmap, tempOverlay, overlay_A, overlay_B, rects=None):
+        # Returns the image to display (the live frame itself when there is nothing to composite)
+        # and its changed areas
         if base_pixmap is None:
-            return None
-
-        result_image = QImage(base_pixmap.size(), QImage.Format_ARGB32)
-        result_image.fill(Qt.blue)
-
-        painter = QPainter(result_image)
-        painter.setRenderHint(QPainter.SmoothPixmapTransform)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        # Draw base image
-        painter.drawPixmap(0, 0, base_pixmap)
-        # Calculate the offsets
-        offset_x = base_pixmap.width() / 2
-        offset_y = base_pixmap.height() / 2
-        p1_scene = mask_line.mapToScene(mask_line.line().p1())
-        p2_scene = mask_line.mapToScene(mask_line.line().p2())
-
-        # Apply the offset to the line points
-        p1_scene.setX(p1_scene.x() + offset_x)
-        p1_scene.setY(p1_scene.y() + offset_y)
-        p2_scene.setX(p2_scene.x() + offset_x)
-        p2_scene.setY(p2_scene.y() + offset_y)
-
-        # Create a polygon for the left side of the line
-        polygon = QPolygonF()
-        polygon.append(QPointF(0, 0))
-        polygon.append(p1_scene)
-        polygon.append(p2_scene)
-        polygon.append(QPointF(0, base_pixmap.height()))
-
-        # Convert polygon to QPainterPath
-        path = QPainterPath()
-        path.addPolygon(polygon)
-
-        # Draw overlay A on the left side
-        painter.setClipPath(path)
-        painter.setOpacity(1)
-        painter.drawPixmap(0, 0, overlay_A)
-        
-        # Draw overlay B on the right side
-        full_rect = QPainterPath()
-        full_rect.addRect(QRectF(base_pixmap.rect()))
-        inverse_path = full_rect.subtracted(path)
-        
-        painter.setClipPath(inverse_path)
-        painter.setOpacity(1)
-        painter.drawPixmap(0, 0, overlay_B)
-
-        # Debug: Draw the polygon outline and fill it with a transparent color
-        # debug_pen = QPen(Qt.red, 2, Qt.DashLine)
-        # debug_brush = QBrush(QColor(255, 0, 0, 50))  # Semi-transparent red
-        # painter.setPen(debug_pen)
-        # painter.setBrush(debug_brush)
-        # painter.drawPolygon(polygon)
-        painter.end()
-        return QPixmap.fromImage(result_image)
-    
-    def blend_images(self, base_pixmap, tempOverlay, overlay_A, overlay_B):
-        if base_pixmap is None:
-            return None
-
-        # Determine the maximum width and height from the provided pixmaps
-        max_width = base_pixmap.width()
-        max_height = base_pixmap.height()
-        for pixmap in [tempOverlay, overlay_A, overlay_B]:
-            if pixmap:
-                max_width = max(max_width, pixmap.width())
-                max_height = max(max_height, pixmap.height())
-
-        # Create a result image with the maximum dimensions
-        result_image = QImage(max_width, max_height, QImage.Format_ARGB32)
-        result_image.fill(Qt.transparent)
-
-        painter = QPainter(result_image)
-        painter.setOpacity(1.0)
-
-        # Define a function to calculate the offset for centering
-        def get_centered_offset(pixmap, result_width, result_height):
-            x_offset = (result_width - pixmap.width()) // 2
-            y_offset = (result_height - pixmap.height()) // 2
-            return x_offset, y_offset
-
-
-        
-        if tempOverlay:
-            x_offset, y_offset = get_centered_offset(tempOverlay, max_width, max_height)
-            painter.drawPixmap(x_offset, y_offset, tempOverlay)
-        else:
-            x_offset, y_offset = get_centered_offset(base_pixmap, max_width, max_height)
-            painter.drawPixmap(x_offset, y_offset, base_pixmap)
-
-        if overlay_A or overlay_B:
-            self.viewer.line_item.setVisible(True)
-            self.viewer.rect_item.setVisible(True)
-            if overlay_A:
-                masked_pixmap = self.apply_line_mask(base_pixmap, overlay_A, base_pixmap, self.viewer.line_item)
-                x_offset, y_offset = get_centered_offset(masked_pixmap, max_width, max_height)
-                painter.drawPixmap(x_offset, y_offset, masked_pixmap)
-            if overlay_B:
-                masked_pixmap = self.apply_line_mask(base_pixmap, base_pixmap, overlay_B, self.viewer.line_item)
-                x_offset, y_offset = get_centered_offset(masked_pixmap, max_width, max_height)
-                painter.drawPixmap(x_offset, y_offset, masked_pixmap)
-            
-        else:
+            return None, rects
+        if self.diff_reference:
+            # Difference compare replaces the A/B wipe and the selected snapshot
             self.viewer.line_item.setVisible(False)
             self.viewer.rect_item.setVisible(False)
-        painter.end()
-        return QPixmap.fromImage(result_image)
+            return self.difference.compose(self.liveFrameImage, self.diff_reference, rects)
+        self.viewer.line_item.setVisible(bool(overlay_A or overlay_B))
+        self.viewer.rect_item.setVisible(bool(overlay_A or overlay_B))
+        if not (tempOverlay or overlay_A or overlay_B):
+            return base_pixmap, rects
+        return self.compositor.compose(base_pixmap, tempOverlay, overlay_A, overlay_B, self.viewer.line_item, rects)
         
-    def updateImage(self, pixmap):
+    def setCaptureRate(self, fps):
+        self.capture_fps = fps
+        self.screenshot_thread.set_target_fps(fps)
+
+    def setConvergenceDetection(self, enabled):
+        self.convergence.enabled = enabled
+        self.convergence.reset()
+        if not enabled:
+            self.renderRefining()
+
+    def setConvergenceIdleRate(self, fps):
+        self.idle_fps = fps
+        if fps is None:
+            self.screenshot_thread.set_idle_fps(None)
+
+    def renderRefining(self):
+        # Render changed again, back to the selected capture rate
+        self.screenshot_thread.set_idle_fps(None)
+        self.convergence_text = None
+        self.updateTitle()
+
+    def renderConverged(self, seconds):
+        print(f"[BlenderRenderView] Render converged in {seconds:.1f} s")
+        self.convergence_text = f'converged in {seconds:.1f} s'
+        self.updateTitle()
+        if self.snapshot_on_convergence:
+            self.snapshot()
+        if self.idle_fps is not None:
+            self.screenshot_thread.set_idle_fps(self.idle_fps)
+        SocketClient.send_message({"converged": round(seconds, 2)})
+
+    def showCaptureRate(self, fps):
+        self.measured_fps = fps
+        self.updateTitle()
+
+    def updateTitle(self):
+        title = 'Blender RenderView (0.1)'
+        if self.measured_fps is not None:
+            title += f' - {self.measured_fps:.1f} fps'
+        if self.convergence_text:
+            title += f' - {self.convergence_text}'
+        if self.diff_reference and self.difference.tile_sum is not None:
+            mean, maximum, (x, y), tile_mean = self.difference.stats()
+            title += f' - difference mean {mean:.2f} max {maximum}, worst tile ({x}, {y}) mean {tile_mean:.2f}'
+        self.setWindowTitle(title)
+
+    def liveImage(self):
+        frame = self.screenshot_thread.mailbox.take()
+        if frame is None:
+            return
+        pixmap = upload_frame(frame.image)
+        if self.remote_server is not None and frame.image.depth() == 32:
+            self.remote_server.submit(image_array(frame.image), frame.image.format().value, frame.timestamp, frame.rects)
+        self.screenshot_thread.backend.release_frame(frame.token)
+        # Replace the previous frame first so the displayed pixmap is not shared when updating its tiles
+        self.liveFrame = pixmap
+        self.liveFrameImage = frame_image(pixmap)  # Pixels of the pixmap, shared with it
+        self.screenshot_thread.backend.release_full_precision(self.liveFullPrecision)
+        self.liveFullPrecision = frame.full_precision
+        self.updateImage(pixmap, frame.rects)
+        self.screenshot_thread.mailbox.frame_displayed(frame)
+        if BlenderWindowMonitor.first_frame is None:
+            BlenderWindowMonitor.first_frame_displayed()
+
+    def refreshImage(self):
+        # Composite inputs changed (snapshot, A/B, wipe line), redraw from the last live frame
+        if self.liveFrame is not None:
+            self.updateImage(self.liveFrame)
+
+    def updateImage(self, pixmap, rects=None):
+        # rects: changed (x, y, w, h) areas of a live frame, None to redraw everything
+        if rects is not None and self.tempOverlay and not (self.overlay_A or self.overlay_B or self.diff_reference) \
+                and pixmap.size() == self.lastLiveSize:
+            return  # Live frame is hidden behind the selected snapshot
+        self.lastLiveSize = pixmap.size()
         current_transform = self.viewer.transform()
         liveview = pixmap
-        blended_pixmap = self.blend_images(liveview, self.tempOverlay, self.overlay_A, self.overlay_B)
-        if blended_pixmap.width() != self.lastWidth or blended_pixmap.height() != self.lastHeight:
+        blended, blended_rects = self.blend_images(liveview, self.tempOverlay, self.overlay_A, self.overlay_B, rects)
+        width, height = blended.width(), blended.height()
+        if width != self.lastWidth or height != self.lastHeight:
             
             # Set the image and apply the new transformation
-            self.viewer.setImage(blended_pixmap)
+            self.viewer.setImage(blended if blended is liveview else upload_frame(blended))
             
             # Adjust the position of the image in the viewer to be centered
-            offsetx = (blended_pixmap.width()/2) * -1
-            offsety = (blended_pixmap.height()/2) * -1
+            offsetx = (width/2) * -1
+            offsety = (height/2) * -1
 
             self.viewer.image_item.setPos(offsetx, offsety)
 
-            self.lastHeight = blended_pixmap.height()
-            self.lastWidth = blended_pixmap.width()
-
-        self.viewer.setImage(blended_pixmap)
+            self.lastHeight = height
+            self.lastWidth = width
+        elif blended_rects is not None and sum(w * h for (x, y, w, h) in blended_rects) < width * height // 2:
+            # Only upload and repaint the tiles that changed
+            self.viewer.updateImageTiles(blended, blended_rects)
+        elif blended is liveview:
+            # Display the live frame itself, no copy
+            self.viewer.setImage(blended)
+        else:
+            # Composite buffer is reused, copy it into the displayed pixmap
+            self.viewer.updateImageTiles(blended, [(0, 0, width, height)])
         self.viewer.setTransform(current_transform)
+        if self.diff_reference:
+            self.updateTitle()
 
     def add_image(self, pixmap):
+        # pixmap: displayed pixmap, or float QImage of a full precision snapshot
         if pixmap.isNull():
             print(f"[BlenderRenderView] No image to add")
             return
 
-        # Scale the pixmap to fit within a 200x200 bounding box while maintaining aspect ratio
-        scaled_pixmap = pixmap.scaled(QSize(200, 200), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        # The thumbnail is scaled by the thumbnail pool when the strip paints it
+        image = pixmap if isinstance(pixmap, QImage) else pixmap.toImage()
+        self.snapshot_model.prepend([self.snapshot_store.add(image)])
+        print(f"[BlenderRenderView] Snapshot added ({self.snapshot_store.describe()})")
+
+    def restoreSession(self):
+        # Thumbnails and full resolution pixels are read from the session file when used
+        start = time.perf_counter()
+        restored = self.snapshot_store.restore()
+        self.snapshot_model.prepend(restored[::-1])
+        print(f"[BlenderRenderView] Restored {len(restored)} snapshots from {self.snapshot_store.session.path} "
+              f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def selectedSnapshot(self):
+        # Row of the selected thumbnail, -1 if none
+        selection = self.snapshot_strip.selectionModel()
+        index = selection.currentIndex()
+        return index.row() if index.isValid() and selection.isSelected(index) else -1
+
+    def selectSnapshot(self, row):
+        index = self.snapshot_model.index(row)
+        self.snapshot_strip.selectionModel().setCurrentIndex(index, QItemSelectionModel.ClearAndSelect)
+        self.snapshot_strip.scrollTo(index)
+        self.tempOverlay = self.snapshot_store.get(self.snapshot_model.key(row))
 
-        image_label = SnapshotThumbs(pixmap, self)
-        image_label.setPixmap(scaled_pixmap)
-        image_label.setScaledContents(False)  # Ensure pixmap scales with label size
-        image_label.clicked.connect(self.image_clicked)  # Connect directly to image_clicked
-        self.scroll_layout.insertWidget(0, image_label)
-    
     def navigate_thumbnails(self, direction):
-        count = self.scroll_layout.count()
+        count = self.snapshot_model.rowCount()
         if count == 0:
             return
-        
-        # Unselect current thumbnail
-        if self.current_selected_index >= 0:
-            self.scroll_layout.itemAt(self.current_selected_index).widget().setStyleSheet("border: 1px solid transparent;")
-        
-        # Update the selected index
-        self.current_selected_index = (self.current_selected_index + direction) % count
-        
-        # Select the new thumbnail
-        selected_thumb = self.scroll_layout.itemAt(self.current_selected_index).widget()
-        selected_thumb.setStyleSheet("border: 1px solid white;")
-        
-        # Update tempOverlay based on the new selection
-        self.tempOverlay = selected_thumb.snapshot_fullres
-        self.updateImage(self.viewer.image_item.pixmap())
 
-    def image_clicked(self, label_image):
-        if label_image.toggled:
+        # Only the previously and newly selected thumbnails are repainted
+        self.selectSnapshot((self.selectedSnapshot() + direction) % count)
+        self.refreshImage()
+
+    def image_clicked(self, row):
+        if row == self.selectedSnapshot():
             self.tempOverlay = None
-            label_image.toggled = False
-            self.current_selected_index = -1  # No thumbnail selected
+            self.snapshot_strip.selectionModel().clear()  # No thumbnail selected
         else:
-            self.tempOverlay = label_image.snapshot_fullres
-            for i in range(self.scroll_layout.count()):
-                item = self.scroll_layout.itemAt(i).widget()
-                item.toggled = False
-                item.setStyleSheet("border: 1px solid transparent;")
-                if item == label_image:
-                    self.current_selected_index = i  # Update the selected index
-            label_image.setStyleSheet("border: 1px solid white;")
-            label_image.toggled = True
-        self.updateImage(self.viewer.image_item.pixmap())
+            self.selectSnapshot(row)
+        self.refreshImage()
     
     def invertButtonImage(self):
         button = self.sender()
@@ -1093,11 +3494,39 @@ class MainWindow(QMainWindow):
         button.setIcon(QIcon(QPixmap.fromImage(image)))
 
     def saveAs(self):
-        fileName, _ = QFileDialog.getSaveFileName(self, "Save Image", "", "PNG Files (*.png)")
+        name_filters = [ImageEncoder.FORMATS[format] for format in ImageEncoder.formats()]
+        fileName, name_filter = QFileDialog.getSaveFileName(self, "Save Image", "", ";;".join(name_filters))
         if fileName:
             pixmap = self.viewer.image_item.pixmap()
-            if pixmap:
-                pixmap.save(fileName, "PNG")
+            if not pixmap.isNull():
+                # Encoded on the worker while the view keeps updating, saves queue up
+                fileName, format = ImageEncoder.destination(fileName, name_filter)
+                image = self.fullPrecisionImage()
+                self.image_encoder.save(pixmap.toImage() if image is None else image, fileName, format, self.png_level)
+                self.showSaveProgress(fileName, 0.0, self.image_encoder.queued - 1)
+
+    def showSaveProgress(self, path, fraction, queued):
+        text = f"Saving {os.path.basename(path)}"
+        if queued:
+            text += f" (+{queued} queued)"
+        if fraction < 0:
+            self.save_progress.setRange(0, 0)  # Busy, Qt's writers don't report progress
+        else:
+            self.save_progress.setRange(0, 100)
+            self.save_progress.setValue(int(fraction * 100))
+            text += " %p%"
+        self.save_progress.setFormat(text)
+        self.save_progress.show()
+
+    def fileSaved(self, path, seconds, size):
+        print(f"[BlenderRenderView] Saved {path} ({size / 1024 ** 2:.1f} MB in {seconds:.2f} s)")
+        if self.image_encoder.queued == 0:
+            self.save_progress.hide()
+
+    def saveFailed(self, path, message):
+        print(f"[BlenderRenderView] Can't save {path}: {message}")
+        if self.image_encoder.queued == 0:
+            self.save_progress.hide()
 
     def fitToWindow(self):
         # Get the bounding rectangle of just the image item
@@ -1118,43 +3547,172 @@ class MainWindow(QMainWindow):
         self.viewer.scale(scale, scale)
         self.viewer.centerOn(0,0)
 
+    def fullPrecisionImage(self):
+        # Float image of what is displayed when it is a float live frame or snapshot on its own, None otherwise
+        if self.overlay_A or self.overlay_B or self.diff_reference:
+            return None
+        if self.tempOverlay:
+            row = self.selectedSnapshot()
+            image = self.snapshot_store.image(self.snapshot_model.key(row)) if row >= 0 else None
+            return image if image is not None and is_float_image(image) else None
+        if self.liveFullPrecision is not None:
+            (key, header, pixels) = self.liveFullPrecision
+            return SharedFrameBackend.float_image(pixels, header)
+        return None
+
     def snapshot(self):
-        self.add_image(self.viewer.image_item.pixmap())
+        image = self.fullPrecisionImage()
+        self.add_image(self.viewer.image_item.pixmap() if image is None else image)
     
     def deleteCurrent(self):
-        item = self.scroll_layout.itemAt(self.current_selected_index)
-
-        self.current_selected_index = -1
-        if item is None:
-            return
-        
-        # Remove the item from the layout
-        widget = item.widget()
-
-        self.scroll_layout.removeWidget(widget)
-        
-        # Optionally, delete the widget
-        if widget is not None:
-            if isinstance(widget, SnapshotThumbs):
+        row = self.selectedSnapshot()
+        if row >= 0:
+            self.deleteSnapshot(row)
+
+    def deleteSnapshot(self, row):
+        snapshot_key = self.snapshot_model.key(row)
+        self.unmarkSnapshot(snapshot_key)
+        if row == self.selectedSnapshot():
+            self.snapshot_strip.selectionModel().clear()
+            self.tempOverlay = None
+            self.refreshImage()
+        self.snapshot_model.removeSnapshot(row)
+        self.snapshot_store.remove(snapshot_key)
 
-                widget.unmark()
-            widget.deleteLater()
-        
     def renderRegion(self):
         self.viewer.startRenderRegionDrawing()
 
     def closeEvent(self, event):
+        self.screenshot_thread.backend.release_full_precision(self.liveFullPrecision)
+        self.liveFullPrecision = None
         self.screenshot_thread.stop()
         event.accept()
 
 def on_exit():
-    SocketClient.update_status('extui_exited')
+    if capture_blender:
+        SocketClient.update_status('extui_exited')  # Blender closes the render window
     SocketClient.stop()
 
-if __name__ == "__main__":
-    SocketClient.start()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Blender RenderView external UI")
+    parser.add_argument("--backend", choices=["win32", "x11", "synthetic", "replay", "shm", "remote"],
+                        default="win32" if sys.platform == "win32" else "x11",
+                        help="Frame source, synthetic and replay run without blender, "
+                             "shm receives the frames published by a producer (brv_frames.py), "
+                             "remote the frames served by another render view (--remote)")
+    parser.add_argument("--window-id", type=lambda value: int(value, 0),
+                        help="Capture this X11 window instead of waiting for blender (testing under Xvfb)")
+    parser.add_argument("--fps", type=int, default=CAPTURE_RATES[0], help="Target capture rate")
+    parser.add_argument("--size", default="3840x2160", help="Synthetic frame size (WIDTHxHEIGHT)")
+    parser.add_argument("--change-rate", type=float, default=10.0, help="Synthetic content changes per second")
+    parser.add_argument("--noise", type=float, default=0.1, help="Synthetic fraction of the frame changed per update")
+    parser.add_argument("--converge-after", type=float, default=0.0,
+                        help="Synthetic noise fades out over this many seconds, like a converging render")
+    parser.add_argument("--replay-dir", help="Directory of images for the replay backend")
+    parser.add_argument("--exit-after", type=float, help="Quit after this many seconds and print capture stats")
+    parser.add_argument("--convergence-threshold", type=float, default=0.5,
+                        help="Mean channel change (0-255) between frames under which the render has converged")
+    parser.add_argument("--convergence-decay", type=float, default=0.8,
+                        help="Smoothing of the change energy (0-1), higher waits for a steadier render")
+    parser.add_argument("--idle-fps", type=float, default=1, help="Capture rate once the render has converged, 0 to keep it")
+    parser.add_argument("--snapshot-on-convergence", action="store_true", help="Take a snapshot when the render converges")
+    parser.add_argument("--snapshot-budget", type=float, default=2048,
+                        help="RAM budget of the snapshots in MB, the least recently used are spilled to disk")
+    parser.add_argument("--snapshot-dir", help="Directory snapshots are spilled to (default: a temp directory)")
+    parser.add_argument("--session", metavar="BLEND_FILE",
+                        help="Keep the snapshots of this .blend file across restarts")
+    parser.add_argument("--session-dir", help="Directory of the snapshot sessions (default: ~/.blender_render_view/sessions)")
+    parser.add_argument("--compositor", choices=["painter", "numpy"], default="painter",
+                        help="A/B wipe compositor (numpy: hard edged wipe line, needs numpy)")
+    parser.add_argument("--benchmark-compositor", action="store_true",
+                        help="Compare the compositors at 1080p, 4K and 8K, then exit")
+    parser.add_argument("--remote", default="127.0.0.1:42070", metavar="HOST:PORT",
+                        help="Render view to watch with the remote backend")
+    parser.add_argument("--serve-remote", metavar="[HOST:]PORT",
+                        help="Serve the live frames to remote viewers on this port, of this machine only (127.0.0.1) "
+                             "unless a HOST is given, 0.0.0.0 for all interfaces. There is no authentication")
+    parser.add_argument("--keyframe-interval", type=float, default=brv_remote.KEYFRAME_INTERVAL,
+                        help="Seconds between the full frames sent to the remote viewers")
+    parser.add_argument("--frame-policy", choices=brv_protocol.POLICIES, default="latest",
+                        help="Frames blender drops while this viewer lags behind: all but the latest queued one, "
+                             "the new ones (skip), or none (all, the viewer falls further behind)")
+    args = parser.parse_args()
+    if np is None and (args.compositor == "numpy" or args.benchmark_compositor):
+        parser.error("numpy is required for the numpy compositor")
+    if args.backend == "replay" and not args.replay_dir:
+        parser.error("--replay-dir is required with the replay backend")
+    if np is None and (args.backend == "remote" or args.serve_remote):
+        parser.error("numpy is required for the remote stream")
+    return args
+
+def print_capture_stats():
+    pacer = mainWin.screenshot_thread.pacer
+    print(f"[BlenderRenderView] {pacer.total_frames} frames delivered, last measured {pacer.achieved_fps:.1f} fps")
+    mailbox = mainWin.screenshot_thread.mailbox
+    print(f"[BlenderRenderView] {mailbox.displayed} frames displayed (last #{mailbox.sequence}), {mailbox.stale} dropped as stale, "
+          f"latency {mailbox.latency_avg * 1000:.1f} ms avg / {mailbox.latency_max * 1000:.1f} ms max")
+    detector = mainWin.screenshot_thread.detector
+    print(f"[BlenderRenderView] {detector.delivered} changed frames delivered, {detector.dropped} unchanged frames dropped")
+    convergence = mainWin.convergence
+    if convergence is not None and convergence.convergences:
+        print(f"[BlenderRenderView] {convergence.convergences} convergences, last in {convergence.converged_after:.2f} s")
+    print(f"[BlenderRenderView] {mainWin.snapshot_store.describe()}")
+    pool = mainWin.screenshot_thread.backend.pool
+    if pool is not None:
+        print(f"[BlenderRenderView] {pool.allocations} capture surface allocations")
+
+def benchmark_compositors(repeat=10):
+    # Composite changing live frames with A/B snapshots, vertical and rotated wipe lines
+    compositors = (("painter", Compositor), ("numpy", NumpyCompositor))
+    for (width, height) in ((1920, 1080), (3840, 2160), (7680, 4320)):
+        def frame(seed):
+            image = QImage(width, height, QImage.Format_RGB32)
+            image.bits()[:] = random.Random(seed).randbytes(image.sizeInBytes())
+            return upload_frame(image)
+        live = [frame(seed) for seed in range(2)]
+        snapshots = {"A+B": (frame(2), frame(3)), "A": (frame(2), None)}
+        for angle in (0, 30):
+            line = QGraphicsLineItem(0, -32000, 0, 32000)
+            line.setPos(width / 7 + 0.25, 0)
+            line.setRotation(angle)
+            for (overlays, (overlay_A, overlay_B)) in snapshots.items():
+                results = []
+                timings = []
+                for (name, compositor_type) in compositors:
+                    compositor = compositor_type()
+                    start = time.perf_counter()
+                    compositor.compose(live[0], None, overlay_A, overlay_B, line)
+                    rebuild = time.perf_counter() - start
+                    start = time.perf_counter()
+                    for i in range(repeat):
+                        result, rects = compositor.compose(live[i % 2], None, overlay_A, overlay_B, line)
+                    timings.append(f"{name} {(time.perf_counter() - start) / repeat * 1000:6.2f} ms/frame "
+                                   f"({rebuild * 1000:6.1f} ms rebuild)")
+                    results.append(result.copy())
+                same = np.array_equal(image_array(results[0]), image_array(results[1]))
+                print(f"{width}x{height} {overlays:>3} line {angle:2d} deg: {', '.join(timings)}"
+                      + ("" if same else ", results differ"))
 
-    app = QApplication(sys.argv + ['-platform', 'windows:darkmode=1'])
+if __name__ == "__main__":
+    args = parse_args()
+    if args.benchmark_compositor:
+        app = QApplication(sys.argv[:1])
+        benchmark_compositors()
+        sys.exit()
+    backend = create_capture_backend(args)
+    capture_blender = backend.name in ("win32", "x11") and not args.window_id
+    if capture_blender:
+        SocketClient.start(capabilities=[name for name in brv_protocol.CAPABILITIES if name != "frames"])
+    elif backend.name == "shm":
+        SocketClient.start(policy=args.frame_policy)
+    elif backend.name == "remote":
+        (host, port) = args.remote.rsplit(":", 1)
+        SocketClient.start(host, int(port), capabilities=brv_remote.CAPABILITIES)
+
+    qt_args = [sys.argv[0]]
+    if sys.platform == "win32":
+        qt_args += ['-platform', 'windows:darkmode=1']
+    app = QApplication(qt_args)
     app.setStyle('Fusion')
 
     # Define a dark theme stylesheet for Fusion style
@@ -1174,11 +3732,34 @@ if __name__ == "__main__":
     dark_palette.setColor(QPalette.HighlightedText, Qt.black)
     app.setPalette(dark_palette)
 
-
-
-    BlenderWindowMonitor.start()
-    mainWin = MainWindow()
+    if capture_blender:
+        BlenderWindowMonitor.start()
+    elif args.window_id:
+        Blender.window = Blender.windowHandle = args.window_id
+    backend.open()
+    convergence = None
+    if np is not None:
+        convergence = ConvergenceMonitor(args.convergence_threshold, args.convergence_decay)
+    session = None
+    if args.session:
+        session = SnapshotSession(SnapshotSession.path_for(args.session, args.session_dir))
+    snapshot_store = SnapshotStore(int(args.snapshot_budget * 1024 * 1024), args.snapshot_dir, session=session)
+    mainWin = MainWindow(backend, args.fps, NumpyCompositor if args.compositor == "numpy" else Compositor,
+                         convergence, args.idle_fps or None, args.snapshot_on_convergence, snapshot_store)
     mainWin.show()
+    app.aboutToQuit.connect(mainWin.screenshot_thread.stop)
+    if args.serve_remote:
+        (host, _, port) = args.serve_remote.rpartition(":")
+        mainWin.remote_server = brv_remote.RemoteStreamServer(host or "127.0.0.1", int(port), args.keyframe_interval)
+        mainWin.remote_server.start()
+        app.aboutToQuit.connect(mainWin.remote_server.close)
+
+    if args.exit_after:
+        app.aboutToQuit.connect(print_capture_stats)
+        QTimer.singleShot(int(args.exit_after * 1000), app.quit)
+    app.aboutToQuit.connect(mainWin.image_encoder.close)  # Finish the queued saves
+    app.aboutToQuit.connect(mainWin.thumbnail_pool.close)
+    app.aboutToQuit.connect(snapshot_store.close)
 
     # Connect the exit signal to the application's quit method
     signal_emitter.exit_signal.connect(app.quit)
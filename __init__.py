@@ -6,18 +6,25 @@ bl_info = {
     "author": "Eisteed"
 }
 
-import json
+import ctypes
+import ctypes.util
 import selectors
+import shlex
 import socket
+import sys
 from subprocess import Popen
 import threading
 import os
+import tempfile
 import time
 from time import sleep
+import numpy as np
 import bpy # type: ignore
-from bpy.props import StringProperty, PointerProperty # type: ignore
+from bpy.props import StringProperty, PointerProperty, FloatProperty, IntProperty # type: ignore
 from bpy.types import AddonPreferences, Operator # type: ignore
 from bpy.app.handlers import persistent # type: ignore
+from . import brv_protocol
+from . import brv_frames
 
 PORT = 42069
 
@@ -29,9 +36,6 @@ firstRun = True
 status = {'status': 'initial'}  # Global status variable
 status_lock = threading.Lock()  # Lock for thread-safe access to status
 renderWindow = None
-resX = ""
-resY = ""
-resP = ""
 xmin = 1
 ymin = 1
 xmax = 1
@@ -85,6 +89,86 @@ def run_render_region_operator():
     bpy.ops.brv.set_render_region()
     return None  # To stop the timer from repeating
 
+def set_render_region(region_xmin, region_ymin, region_xmax, region_ymax):
+    # Main thread: the operator reads the region globals
+    global xmin, ymin, xmax, ymax
+    xmin, ymin, xmax, ymax = region_xmin, region_ymin, region_xmax, region_ymax
+    run_render_region_operator()
+
+class CommandDispatcher:
+    """Runs the commands received by the socket listener on blender's main thread.
+
+    The listener thread only queues them, a single bpy.app.timers pump runs those that are due.
+    A command queued while one with the same key is pending supersedes it and restarts its
+    delay, so a burst of resizes aligns the camera once and only the latest render region is set."""
+
+    lock = threading.Lock()
+    pending = {}  # key -> [function, args, first queued, due, superseded]
+    idle_interval = 0.1
+    executed = 0
+    coalesced = 0
+    max_depth = 0
+    max_wait = 0.0
+
+    @classmethod
+    def submit(cls, key, function, *args, delay=0.0):
+        # Any thread
+        now = time.perf_counter()
+        with cls.lock:
+            command = cls.pending.get(key)
+            if command is None:
+                cls.pending[key] = [function, args, now, now + delay, 0]
+            else:
+                command[0:2] = [function, args]
+                command[3] = now + delay
+                command[4] += 1
+                cls.coalesced += 1
+            cls.max_depth = max(cls.max_depth, len(cls.pending))
+
+    @classmethod
+    def pump(cls):
+        # Main thread, returns the delay until the next call
+        now = time.perf_counter()
+        with cls.lock:
+            due = [(key, command) for (key, command) in cls.pending.items() if command[3] <= now]
+            for (key, command) in due:
+                del cls.pending[key]
+            depth = len(cls.pending)
+            next_due = min((command[3] for command in cls.pending.values()), default=now + cls.idle_interval)
+        for (key, (function, args, queued, _, superseded)) in due:
+            waited = time.perf_counter() - queued
+            cls.max_wait = max(cls.max_wait, waited)
+            cls.executed += 1
+            print(f"[BRV] Running {key} after {waited * 1000:.0f} ms"
+                  f"{f', {superseded} superseded' if superseded else ''}, {depth} queued")
+            try:
+                function(*args)
+            except Exception as e:
+                print(f"[BRV] Command {key} failed: {e}")
+        return min(max(next_due - time.perf_counter(), 0.01), cls.idle_interval)
+
+    @classmethod
+    def is_pending(cls, key):
+        with cls.lock:
+            return key in cls.pending
+
+    @classmethod
+    def start(cls):
+        if not bpy.app.timers.is_registered(dispatch_commands):
+            bpy.app.timers.register(dispatch_commands, persistent=True)
+
+    @classmethod
+    def stop(cls):
+        if bpy.app.timers.is_registered(dispatch_commands):
+            bpy.app.timers.unregister(dispatch_commands)
+        with cls.lock:
+            cls.pending.clear()
+        print(f"[BRV] {cls.executed} commands run, {cls.coalesced} coalesced, "
+              f"max {cls.max_depth} queued, longest wait {cls.max_wait * 1000:.0f} ms")
+
+def dispatch_commands():
+    return CommandDispatcher.pump()
+
 # Wrapper function
 def check_resolution_wrapper():
     global firstRun
@@ -105,6 +189,11 @@ class SocketServer:
     stop_event = threading.Event()
     sel = selectors.DefaultSelector()
     clients = {}
+    readers = {}  # conn -> FrameReader buffering partial frames
+    outboxes = {}  # conn -> Outbox of the frames waiting to be written to the client
+    capabilities = {}  # conn -> capabilities shared with the client
+    frames = None  # FrameProducer publishing to the clients with the frames capability
+    wakeup = None  # Socket pair, lets other threads hand queued writes to the selector thread
 
     @classmethod
     def start(cls, host=HOST, port=PORT):
@@ -112,6 +201,7 @@ class SocketServer:
             print(f"[brv] Error port {port} already in use")
         else:
             cls.stop_event.clear()
+            cls.frames = brv_frames.FrameProducer(cls.announce_frame, consumers=cls.frame_consumers)
             cls.listener_thread = threading.Thread(target=cls.listen_for_commands, args=(host, port))
             cls.listener_thread.daemon = True
             cls.listener_thread.start()
@@ -133,6 +223,10 @@ class SocketServer:
         cls.server_socket.listen()
         cls.server_socket.setblocking(False)
         cls.sel.register(cls.server_socket, selectors.EVENT_READ, cls.accept)
+        cls.wakeup = socket.socketpair()
+        for end in cls.wakeup:
+            end.setblocking(False)
+        cls.sel.register(cls.wakeup[0], selectors.EVENT_READ, cls.handle_wakeup)
 
         print(f"[BRV] Socket Server Started. Listening on {host}:{port}...")
         while not cls.stop_event.is_set():
@@ -143,6 +237,31 @@ class SocketServer:
         cls.server_socket.close()
         print(f"[BRV] Socket server stopped.")
 
+    @classmethod
+    def handle_wakeup(cls, sock, mask):
+        # Selector thread: watch the sockets of the clients with frames left to write,
+        # disconnect those that stopped reading
+        try:
+            while sock.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        for (conn, outbox) in list(cls.outboxes.items()):
+            if outbox.stalled:
+                print(f"[BRV] {cls.clients[conn]} stopped reading: {outbox.stats()}")
+                cls.disconnect(conn)
+            elif outbox.pending():
+                cls.sel.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE, cls.handle_client)
+
+    @classmethod
+    def wake(cls):
+        if cls.wakeup is None:
+            return
+        try:
+            cls.wakeup[1].send(b"\0")
+        except OSError:
+            pass  # Already woken up (the buffer is full), or the server is stopping
+
     @classmethod
     def accept(cls, sock, mask):
         conn, addr = sock.accept()
@@ -150,41 +269,74 @@ class SocketServer:
         conn.setblocking(False)
         cls.sel.register(conn, selectors.EVENT_READ, cls.handle_client)
         cls.clients[conn] = addr
+        cls.readers[conn] = brv_protocol.FrameReader()
+        cls.outboxes[conn] = brv_protocol.Outbox(dropped=lambda message: cls.announcement_dropped(conn, message))
 
     @classmethod
     def handle_client(cls, conn, mask):
+        if conn not in cls.clients:
+            return  # Disconnected by an earlier event of the same select
+        if mask & selectors.EVENT_WRITE:
+            try:
+                if cls.outboxes[conn].flush(conn):
+                    cls.sel.modify(conn, selectors.EVENT_READ, cls.handle_client)
+            except OSError:
+                cls.disconnect(conn)
+                return
+        if not mask & selectors.EVENT_READ:
+            return
         try:
-            data = conn.recv(1024)
+            data = conn.recv(65536)
             if data:
-                received_json = json.loads(data.decode('utf-8'))
-                cls.handle_message(received_json, conn)
+                for (message, payload) in cls.readers[conn].feed(data):
+                    cls.handle_message(message, conn, payload)
             else:
                 cls.disconnect(conn)
+        except brv_protocol.ProtocolError as e:
+            print(f"[BRV] Protocol error from {cls.clients[conn]}: {e}")
+            cls.disconnect(conn)
         except ConnectionResetError:
             cls.disconnect(conn)
 
     @classmethod
-    def handle_message(cls, message, conn):
+    def handle_hello(cls, message, conn):
+        try:
+            capabilities = brv_protocol.negotiate(message)
+        except brv_protocol.ProtocolError as e:
+            cls.send(conn, brv_protocol.encode_frame({"error": str(e)}))
+            raise
+        cls.outboxes[conn].policy = brv_protocol.requested_policy(message)
+        cls.send(conn, brv_protocol.encode_frame(brv_protocol.hello()))
+        cls.capabilities[conn] = capabilities
+        if "frames" in capabilities and cls.frames is not None:
+            cls.frames.reserve(len(cls.frame_consumers()))
+
+    @classmethod
+    def handle_message(cls, message, conn, payload=b""):
+        if 'hello' in message:
+            cls.handle_hello(message, conn)
         if 'status' in message:
             cls.update_local_status(message['status'])
         if 'resolution' in message:
             cls.update_resolution(message['resolution'])
         if 'resized' in message:
-            bpy.app.timers.register(run_align_camera_operator, first_interval=0.5)
+            CommandDispatcher.submit('align_camera', run_align_camera_operator, delay=0.5)
         if 'render_region' in message:
-            global xmin, ymin, xmax, ymax
-            xmin = message['xmin']
-            ymin = message['ymin']
-            xmax = message['xmax']
-            ymax = message['ymax']
-            bpy.app.timers.register(run_render_region_operator, first_interval=0.5)
+            CommandDispatcher.submit('render_region', set_render_region, message['xmin'], message['ymin'],
+                                     message['xmax'], message['ymax'], delay=0.5)
+        if 'frame_consumed' in message and cls.frames is not None:
+            cls.frames.consumed(message['frame_consumed'], conn)
+        if 'converged' in message:
+            print(f"[BRV] Viewport render converged in {message['converged']} s")
+        if 'first_frame' in message:
+            print(f"[BRV] External ui displayed its first frame {message['first_frame']} s after launch")
     @classmethod
     def update_local_status(cls, new_status):
         global status
         status = new_status
         if status == 'extui_exited':
             status = "init"
-            bpy.app.timers.register(closeRenderWindow, first_interval=1)
+            CommandDispatcher.submit('close_render_window', closeRenderWindow, delay=1)
         #print("[BRV] Status Updated Locally: " + str(status))
 
     @classmethod
@@ -197,31 +349,62 @@ class SocketServer:
     @classmethod
     def notify_clients_status(cls):
         global status
-        status_data = json.dumps({"status": status}).encode('utf-8')
-        for conn in list(cls.clients):
-            try:
-                conn.sendall(status_data)
-            except Exception as e:
-                print(f"[BRV] Error notifying client: {e}")
-                cls.disconnect(conn)
-    
+        cls.notify_clients_data({"status": status})
+
     @classmethod
-    def notify_clients_data(cls, dictionary):
-        # Convert the data dictionary to a JSON string and encode it to bytes
-        message = json.dumps(dictionary).encode('utf-8')
-        # Send data to each client
-        for conn in list(cls.clients):
-            try:
-                conn.sendall(message)
-            except Exception as e:
-                print(f"[BRV] Error notifying client: {e}")
-                cls.disconnect(conn)
+    def notify_clients_data(cls, dictionary, payload=b"", key=None, clients=None):
+        # Any thread: frame the data dictionary (and optional binary payload) once and queue it
+        # for each client (or the given ones), a slow client never holds the others back
+        data = brv_protocol.encode_frame(dictionary, payload)
+        for conn in list(cls.clients) if clients is None else clients:
+            cls.send(conn, data, key, dictionary)
+
+    @classmethod
+    def send(cls, conn, data, key=None, message=None):
+        # Writes what the client's socket takes right away, the selector thread writes the rest
+        outbox = cls.outboxes.get(conn)
+        if outbox is None:
+            return  # Disconnected meanwhile
+        try:
+            if outbox.put(data, key, message) and outbox.flush(conn):
+                return
+        except OSError as e:
+            print(f"[BRV] Error notifying client: {e}")
+            outbox.stalled = True
+        cls.wake()
+
+    @classmethod
+    def announce_frame(cls, message, consumers):
+        # Frame announcements can be dropped for a lagging client, following its policy
+        cls.notify_clients_data(message, key="frame_ready", clients=consumers)
+
+    @classmethod
+    def announcement_dropped(cls, conn, message):
+        # The client will never display this frame, give its slot back on its behalf
+        if 'frame_ready' in message and cls.frames is not None:
+            cls.frames.consumed(message['frame_ready'], conn)
+
+    @classmethod
+    def frame_consumers(cls):
+        return [conn for (conn, capabilities) in list(cls.capabilities.items()) if "frames" in capabilities]
+
+    @classmethod
+    def publish_frame(cls, pixels, width, height, format, flags=0):
+        # Any thread: pixels in a brv_frames format, False when dropped (no ui or every slot still in use)
+        if cls.frames is None or not cls.frame_consumers():
+            return False
+        return cls.frames.publish(pixels, width, height, format, flags)
+
     @classmethod
     def disconnect(cls, conn):
-        print(f"[BRV] Disconnecting {cls.clients[conn]}")
+        outbox = cls.outboxes.pop(conn, None)
+        print(f"[BRV] Disconnecting {cls.clients[conn]}" + (f", {outbox.stats()}" if outbox else ""))
         cls.sel.unregister(conn)
         conn.close()
         del cls.clients[conn]
+        cls.readers.pop(conn, None)
+        if "frames" in cls.capabilities.pop(conn, ()) and cls.frames is not None:
+            cls.frames.forget(conn)
 
     @classmethod
     def stop(cls):
@@ -233,35 +416,194 @@ class SocketServer:
                 cls.disconnect(conn)
             if cls.server_socket:
                 cls.server_socket.close()
+            if cls.wakeup:
+                cls.sel.unregister(cls.wakeup[0])
+                for end in cls.wakeup:
+                    end.close()
+                cls.wakeup = None
+            if cls.frames is not None:
+                print(f"[BRV] {cls.frames.published} frames published, {cls.frames.dropped} dropped")
+                cls.frames.close()
         except Exception as e:
             print(f"[BRV] Can't stop socket server error, please restart blender. {e}")
 
+class NativeWindows:
+    """Top level windows of this blender process, to tell the external ui which one it has to capture"""
+
+    @classmethod
+    def list(cls):
+        try:
+            if sys.platform == "win32":
+                return cls.list_win32()
+            if os.environ.get("DISPLAY"):
+                return cls.list_x11()
+        except (OSError, AttributeError) as e:
+            print(f"[BRV] Can't list the blender windows: {e}")
+        return set()  # Unsupported platform, the external ui falls back to searching by title
+
+    @classmethod
+    def list_win32(cls):
+        user32 = ctypes.windll.user32
+        pid = os.getpid()
+        windows = set()
+
+        @ctypes.WINFUNCTYPE(ctypes.c_bool, ctypes.c_void_p, ctypes.c_void_p)
+        def add_window(hwnd, lparam):
+            window_pid = ctypes.c_ulong()
+            user32.GetWindowThreadProcessId(ctypes.c_void_p(hwnd), ctypes.byref(window_pid))
+            if window_pid.value == pid:
+                windows.add(hwnd)
+            return True
+
+        user32.EnumWindows(add_window, 0)
+        return windows
+
+    @classmethod
+    def list_x11(cls):
+        xlib = ctypes.CDLL(ctypes.util.find_library("X11"))
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XQueryTree.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+                                    ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.POINTER(ctypes.c_ulong)),
+                                    ctypes.POINTER(ctypes.c_uint)]
+        xlib.XGetWindowProperty.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long,
+                                            ctypes.c_long, ctypes.c_int, ctypes.c_ulong,
+                                            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int),
+                                            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+                                            ctypes.POINTER(ctypes.POINTER(ctypes.c_ulong))]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return set()
+        pid = os.getpid()
+        net_wm_pid = xlib.XInternAtom(display, b"_NET_WM_PID", 1)
+        windows = set()
+
+        def window_pid(window):
+            actual_type, actual_format = ctypes.c_ulong(), ctypes.c_int()
+            count, remaining = ctypes.c_ulong(), ctypes.c_ulong()
+            data = ctypes.POINTER(ctypes.c_ulong)()
+            if xlib.XGetWindowProperty(display, window, net_wm_pid, 0, 1, 0, 0, ctypes.byref(actual_type),
+                                       ctypes.byref(actual_format), ctypes.byref(count), ctypes.byref(remaining),
+                                       ctypes.byref(data)) != 0 or not data:
+                return None
+            value = data[0] if count.value else None
+            xlib.XFree(data)
+            return value
+
+        def walk(window, depth):
+            # Same depth as the external ui search: client windows sit under the window manager frames
+            if depth > 0 and window_pid(window) == pid:
+                windows.add(window)
+                return
+            if depth < 3:
+                root, parent = ctypes.c_ulong(), ctypes.c_ulong()
+                children = ctypes.POINTER(ctypes.c_ulong)()
+                count = ctypes.c_uint()
+                if xlib.XQueryTree(display, window, ctypes.byref(root), ctypes.byref(parent),
+                                   ctypes.byref(children), ctypes.byref(count)):
+                    child_ids = [children[i] for i in range(count.value)]
+                    if children:
+                        xlib.XFree(children)
+                    for child in child_ids:
+                        walk(child, depth + 1)
+
+        try:
+            if net_wm_pid:
+                walk(xlib.XDefaultRootWindow(display), 0)
+        finally:
+            xlib.XCloseDisplay(display)
+        return windows
+
 class CreateCleanRenderedViewOperator(Operator):
     bl_idname = "brw.create_clean_rendered_view"
     bl_label = "[BRV] Blender RenderWindow"
     bl_description = "Create a new Blender instance with no UI elements and rendered viewport shading to be used with external RenderWindow UI."
 
+    # Startup stages, each polled from a window manager timer until done or timed out (seconds)
+    STAGES = (
+        ('spawn', 30.0),  # External ui started and connected (python + PySide import)
+        ('handshake', 10.0),  # External ui waiting for the render window
+        ('window', 40.0),  # Render window created, found and resized by the external ui
+        ('align', 5.0),  # Camera aligned to the resized window
+    )
+    POLL_INTERVAL = 0.1
+
     def execute(self, context):
-        global resX,resY,resP, status, renderWindow
+        global status
+        status = "init"
+        self.connections = set(SocketServer.clients)  # A new connection is expected from the spawned ui
+        self.stage = 0
+        self.timings = []
+        try:
+            start_external_script()
+        except OSError as e:
+            self.report({'ERROR'}, f"[BRV] Can't start the external ui: {e}")
+            return {'CANCELLED'}
+        self.stage_start = time.perf_counter()
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(self.POLL_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
 
-        start_external_script()
-     
-        while True:
-            tries = 0
-            if status == "extui_waiting":
-                break
-            else:
-                tries = tries + 1
-            time.sleep(1)
-            if tries > 5:
-                print("[BRV] Failed to load / connect to external ui..")
-                return('FINISHED')
-            break
+    def modal(self, context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}  # Blender stays interactive during startup
+        (stage, timeout) = self.STAGES[self.stage]
+        try:
+            done = getattr(self, "poll_" + stage)(context)
+        except Exception as e:
+            return self.fail(context, f"{stage} failed: {e}")
+        elapsed = time.perf_counter() - self.stage_start
+        if not done:
+            if elapsed > timeout:
+                return self.fail(context, f"{stage} timed out after {timeout:.0f} s")
+            return {'PASS_THROUGH'}
+        self.timings.append(f"{stage} {elapsed:.2f} s")
+        self.stage += 1
+        self.stage_start = time.perf_counter()
+        if self.stage < len(self.STAGES):
+            return {'PASS_THROUGH'}
+        self.finish(context)
+        print(f"[BRV] Blender Render View started ({', '.join(self.timings)})")
+        return {'FINISHED'}
+
+    def poll_spawn(self, context):
+        if extUiProc is None or extUiProc.poll() is not None:
+            raise RuntimeError(f"external ui exited (code {extUiProc.returncode if extUiProc else None})")
+        return any(conn not in self.connections for conn in list(SocketServer.capabilities))
+
+    def poll_handshake(self, context):
+        if extUiProc.poll() is not None:
+            raise RuntimeError(f"external ui exited (code {extUiProc.returncode})")
+        if status != "extui_waiting":
+            return False
         # Send Scene resolution to external ui
-        check_and_send_resolution()
+        RenderSettingsWatcher.send(full=True)
+        self.create_render_window(context)
+        return True
+
+    def poll_window(self, context):
+        if extUiProc.poll() is not None:
+            raise RuntimeError(f"external ui exited (code {extUiProc.returncode})")
+        return status == "extui_running"
+
+    def poll_align(self, context):
+        # The ui sends 'resized' before 'extui_running', the alignment is queued until the window settled
+        return not CommandDispatcher.is_pending('align_camera')
+
+    def create_render_window(self, context):
+        global renderWindow
 
         # Step 1: Create a new main window
+        existing_windows = NativeWindows.list()
         bpy.ops.wm.window_new_main()
+        new_windows = NativeWindows.list() - existing_windows
 
         # Get the new window and its screen
         new_window = bpy.context.window_manager.windows[-1]
@@ -290,12 +632,25 @@ class CreateCleanRenderedViewOperator(Operator):
 
         bpy.context.scene.camera.data.show_passepartout = False
         bpy.context.scene.camera.data.passepartout_alpha = 0
-        resX = bpy.context.scene.render.resolution_x
-        resY = bpy.context.scene.render.resolution_y
-        resP = bpy.context.scene.render.resolution_percentage
+        # Tell the external ui which window to capture, None makes it search by title
+        SocketServer.notify_clients_data({"window_created": new_windows.pop() if len(new_windows) == 1 else None})
         SocketServer.update_status('viewport_created')
 
-        return {'FINISHED'}
+    def fail(self, context, message):
+        global extUiProc, status
+        self.finish(context)
+        print(f"[BRV] Failed to start the external ui: {message}")
+        self.report({'ERROR'}, f"[BRV] Render View: {message}")
+        if extUiProc is not None and extUiProc.poll() is None:
+            extUiProc.kill()
+        extUiProc = None
+        status = "init"
+        if render.Window:
+            closeRenderWindow()
+        return {'CANCELLED'}
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
     
 def closeRenderWindow():
     if render.Window:
@@ -309,42 +664,463 @@ load_post_done = False
 @persistent
 def load_pre_handler(idk):
     bpy.app.timers.register(closeRenderWindow, first_interval=1)
+    RenderSettingsWatcher.subscribe()
+    CommandDispatcher.submit('render_settings', RenderSettingsWatcher.send)
     
-def check_and_send_resolution():
-    global res_updating
-    global resX, resY, resP
-    current_res_x = bpy.context.scene.render.resolution_x
-    current_res_y = bpy.context.scene.render.resolution_y
-    current_res_p = bpy.context.scene.render.resolution_percentage
-    if current_res_x != resX or current_res_y != resY or current_res_p != resP:
-        resX = current_res_x
-        resY = current_res_y
-        resP = current_res_p
-        resolution_data = {
-            "resolution_x": resX,
-            "resolution_y": resY,
-            "resolution_percentage": resP
-        } 
-        SocketServer.notify_clients_data(resolution_data)
-    res_updating = False
-
-res_updating = False
-def desgraph_post_handler(scene, depsgraph):
-    global res_updating, status
-
-    if not res_updating:
-        res_updating = True
-        print("checking res")
-        bpy.app.timers.register(check_and_send_resolution, first_interval=1)
+class RenderSettingsWatcher:
+    """Sends the render settings the external ui depends on when they change.
+
+    bpy.msgbus only calls back for the subscribed properties (set from the UI or python), so editing
+    the scene costs nothing, unlike a depsgraph_update_post handler that runs on every update.
+    Changes made by the animation system are not notified (the active camera switched by the
+    markers bound to cameras), the settings are also compared after each frame change for those.
+    Notifications are coalesced through the CommandDispatcher and a message only carries the values
+    that differ from the last ones sent."""
+
+    owner = object()
+    RENDER_PROPERTIES = ("resolution_x", "resolution_y", "resolution_percentage", "use_border",
+                         "border_min_x", "border_min_y", "border_max_x", "border_max_y")
+    sent = {}
+    notifications = 0
+    messages = 0
+
+    @classmethod
+    def subscribe(cls):
+        # Subscriptions are dropped when a file is loaded, called again from the load_post handler
+        bpy.msgbus.clear_by_owner(cls.owner)
+        keys = [(bpy.types.RenderSettings, name) for name in cls.RENDER_PROPERTIES]
+        keys += [(bpy.types.Scene, "camera"), (bpy.types.Window, "scene")]
+        for key in keys:
+            bpy.msgbus.subscribe_rna(key=key, owner=cls.owner, args=(), notify=render_settings_changed)
+
+    @classmethod
+    def unsubscribe(cls):
+        bpy.msgbus.clear_by_owner(cls.owner)
+
+    @classmethod
+    def changed(cls):
+        cls.notifications += 1
+        CommandDispatcher.submit('render_settings', cls.send, delay=0.05)
+
+    @classmethod
+    def frame_changed(cls):
+        # frame_set() switches the marker camera after the frame change handlers, the settings are
+        # compared once it returned, from the dispatcher. No delay, it would be restarted by each
+        # frame of a playback. send() only sends the values that differ
+        CommandDispatcher.submit('render_settings', cls.send)
+
+    @classmethod
+    def state(cls):
+        scene = bpy.context.scene
+        state = {name: getattr(scene.render, name) for name in cls.RENDER_PROPERTIES}
+        state["camera"] = scene.camera.name if scene.camera else None
+        return state
+
+    @classmethod
+    def send(cls, full=False):
+        # full: everything, for a newly connected ui
+        state = cls.state()
+        delta = state if full else {name: value for (name, value) in state.items() if cls.sent.get(name) != value}
+        if not delta:
+            return
+        cls.sent = state
+        cls.messages += 1
+        SocketServer.notify_clients_data({"render_settings": delta})
+        if "camera" in delta and render.Window and not full:
+            CommandDispatcher.submit('align_camera', run_align_camera_operator, delay=0.5)
+
+def render_settings_changed(*args):
+    # msgbus only accepts plain functions
+    RenderSettingsWatcher.changed()
+
+class MeasureEditOverhead(Operator):
+    """Time object edits without any hook, with the former depsgraph handler and with the render settings watcher,
+    and frame changes with and without its frame change check"""
+    bl_idname = "brv.measure_edit_overhead"
+    bl_label = "[BRV] Measure Edit Overhead"
+
+    edits = 2000
+    frames = 200
+    rounds = 3
+
+    def execute(self, context):
+        obj = context.active_object or next(iter(context.scene.objects), None)
+        if obj is None:
+            self.report({'ERROR'}, "[BRV] The scene has no object to edit")
+            return {'CANCELLED'}
+        view_layer = context.view_layer
+        location = obj.location.x
+        legacy_pending = False
+
+        def legacy_check():
+            nonlocal legacy_pending
+            legacy_pending = False
+
+        def legacy_handler(scene, depsgraph):
+            # depsgraph_update_post handler used before the watcher, run on every update
+            nonlocal legacy_pending
+            if not legacy_pending:
+                legacy_pending = True
+                print("checking res")
+                bpy.app.timers.register(legacy_check, first_interval=1)
+
+        def time_edits():
+            best = None
+            for _ in range(self.rounds):
+                start = time.perf_counter()
+                for i in range(self.edits):
+                    obj.location.x = location + (i % 2) * 1e-4
+                    view_layer.update()
+                elapsed = (time.perf_counter() - start) / self.edits
+                best = elapsed if best is None else min(best, elapsed)
+            return best
+
+        scene = context.scene
+        frame = scene.frame_current
+
+        def time_frames():
+            best = None
+            for _ in range(self.rounds):
+                start = time.perf_counter()
+                for i in range(self.frames):
+                    scene.frame_set(frame + i % 2)
+                elapsed = (time.perf_counter() - start) / self.frames
+                best = elapsed if best is None else min(best, elapsed)
+            return best
+
+        RenderSettingsWatcher.unsubscribe()
+        try:
+            baseline = time_edits()
+            bpy.app.handlers.depsgraph_update_post.append(legacy_handler)
+            try:
+                legacy = time_edits()
+            finally:
+                bpy.app.handlers.depsgraph_update_post.remove(legacy_handler)
+                if bpy.app.timers.is_registered(legacy_check):
+                    bpy.app.timers.unregister(legacy_check)
+        finally:
+            RenderSettingsWatcher.subscribe()
+        watcher = time_edits()
+        obj.location.x = location
+        registered = frame_change_handler in bpy.app.handlers.frame_change_post
+        if registered:
+            bpy.app.handlers.frame_change_post.remove(frame_change_handler)
+        try:
+            frames_baseline = time_frames()
+        finally:
+            bpy.app.handlers.frame_change_post.append(frame_change_handler)
+        frames_watcher = time_frames()
+        if not registered:
+            bpy.app.handlers.frame_change_post.remove(frame_change_handler)
+        scene.frame_set(frame)
+        result = (f"{self.edits} edits of {obj.name}: {baseline * 1e6:.1f} us/edit without hook, "
+                  f"depsgraph handler {(legacy - baseline) * 1e6:+.1f} us, "
+                  f"render settings watcher {(watcher - baseline) * 1e6:+.1f} us; "
+                  f"{self.frames} frame changes: {frames_baseline * 1e6:.1f} us/frame, "
+                  f"frame change check {(frames_watcher - frames_baseline) * 1e6:+.1f} us")
+        print(f"[BRV] {result}")
+        self.report({'INFO'}, result)
+        return {'FINISHED'}
+
+class FinalRenderStream:
+    """Streams the final render (F12) to an external ui while it refines, as float frames.
+
+    Cycles does not hand its intermediate results to python, so the render is split into passes of
+    doubling sample counts, each one starting where the previous stopped (cycles.sample_offset).
+    The passes are averaged into a float buffer weighted by their sample counts, together they cost
+    the samples of a single render plus a scene sync per pass (persistent data keeps it short).
+    Adaptive sampling and denoising are off during the passes, both would make the average differ
+    from a single render. Other engines render once and the result is streamed.
+    The average is published through the colour management of the scene (view transform, look,
+    exposure, curves), display referred like the render window shows it.
+
+    render_complete / render_cancel only flag the end of a pass (they run on the render thread),
+    the result is read on the main thread: from a bpy.app.timers step while blender has a UI, from
+    a loop in background mode (blender -b) where the render operator is synchronous."""
+
+    UI_TIMEOUT = 30.0  # Seconds for a viewer to connect
+    PUBLISH_TIMEOUT = 5.0  # Seconds to wait for a free slot for the last pass
+    POLL_INTERVAL = 0.1
+    active = False
+    state = None  # 'viewer', 'render', 'rendering', 'publish', then None
+    scene = None
+    window = None
+    viewer = None  # Process of the viewer started for the stream
+    plan = []  # (sample offset, samples) of each pass
+    index = 0
+    total = 0
+    samples = 0  # Samples in the accumulated result
+    accumulated = None
+    size = None
+    saved = []  # (owner, attribute, value) to restore
+    max_fps = 2.0
+    started = 0.0
+    state_start = 0.0
+    last_publish = 0.0
+    pass_finished = False
+    cancelled = False
+    error = None  # Why the last stream stopped early, None when it completed
+    frame = None  # Display referred pixels of the accumulated result, None until published
+    image = None  # Render Result of the last pass, read back
+    display = None  # Accumulated result given to blender's colour management
+    display_read = None  # Its display referred pixels, read back
+    path = os.path.join(tempfile.gettempdir(), f"brv_final_render_{os.getpid()}.exr")
+    display_path = os.path.join(tempfile.gettempdir(), f"brv_final_render_{os.getpid()}.tif")
+
+    @classmethod
+    def begin(cls, scene, window, max_fps=2.0, first_samples=1, viewer_arguments=""):
+        cls.scene = scene
+        cls.window = window
+        cls.max_fps = max_fps
+        cls.active = True
+        cls.accumulated = None
+        cls.frame = None
+        cls.samples = 0
+        cls.index = 0
+        cls.pass_finished = cls.cancelled = False
+        cycles = scene.cycles if scene.render.engine == 'CYCLES' else None
+        cls.total = cycles.samples if cycles else 1
+        cls.plan = cls.pass_plan(cls.total, first_samples) if cycles else [(0, None)]
+        settings = scene.render.image_settings
+        touched = [(settings, 'file_format', 'OPEN_EXR'), (settings, 'color_depth', '32'),
+                   (settings, 'exr_codec', 'NONE'), (settings, 'tiff_codec', 'NONE'), (settings, 'color_mode', 'RGBA'),
+                   (settings, 'color_management', 'FOLLOW_SCENE'),
+                   (scene.render, 'use_persistent_data', True)]
+        if cycles:
+            touched += [(cycles, 'use_adaptive_sampling', False), (cycles, 'use_denoising', False),
+                        (cycles, 'time_limit', 0.0), (cycles, 'samples', cycles.samples),
+                        (cycles, 'sample_offset', 0)]
+        cls.saved = [(owner, name, getattr(owner, name)) for (owner, name, value) in touched if hasattr(owner, name)]
+        for (owner, name, value) in touched:
+            if hasattr(owner, name):
+                setattr(owner, name, value)
+        bpy.app.handlers.render_complete.append(final_render_complete)
+        bpy.app.handlers.render_cancel.append(final_render_cancel)
+        cls.started = time.perf_counter()
+        cls.viewer = None
+        if not SocketServer.frame_consumers():
+            cls.viewer = Popen(['python', os.path.join(script_dir, "RenderView_ui.py"), "--backend", "shm"]
+                               + session_arguments() + shlex.split(viewer_arguments))
+        cls.enter('viewer')
+        print(f"[BRV] Streaming the final render in {len(cls.plan)} passes ({cls.total} samples)")
+
+    @staticmethod
+    def pass_plan(total, first):
+        # 1, 1, 2, 4, 8... samples: each pass doubles the samples of the result
+        plan = []
+        done = 0
+        while done < total:
+            samples = min(max(first, done), total - done)
+            plan.append((done, samples))
+            done += samples
+        return plan
+
+    @classmethod
+    def enter(cls, state):
+        cls.state = state
+        cls.state_start = time.perf_counter()
+
+    @classmethod
+    def step(cls):
+        # bpy.app.timers function while blender has a UI
+        try:
+            cls.advance()
+        except Exception as e:
+            cls.finish(f"failed: {e}")
+        return cls.POLL_INTERVAL if cls.active else None
+
+    @classmethod
+    def run_blocking(cls):
+        # Background mode, the render operator blocks until the pass is done
+        while cls.active:
+            try:
+                cls.advance()
+            except Exception as e:
+                cls.finish(f"failed: {e}")
+            if cls.state in ('viewer', 'publish'):
+                time.sleep(cls.POLL_INTERVAL)
+
+    @classmethod
+    def advance(cls):
+        elapsed = time.perf_counter() - cls.state_start
+        if cls.cancelled:
+            cls.finish("cancelled")
+        elif cls.state == 'viewer':
+            if SocketServer.frame_consumers():
+                cls.enter('render')
+            elif elapsed > cls.UI_TIMEOUT:
+                cls.finish(f"no viewer connected within {cls.UI_TIMEOUT:.0f} s")
+        elif cls.state == 'render':
+            cls.render_pass()
+        elif cls.state == 'rendering':
+            if cls.pass_finished and not bpy.app.is_job_running('RENDER'):
+                cls.read_pass()
+        elif cls.state == 'publish':
+            if cls.publish():
+                cls.finish()
+            elif elapsed > cls.PUBLISH_TIMEOUT:
+                cls.finish("the viewer did not take the final result")
+
+    @classmethod
+    def render_pass(cls):
+        (offset, samples) = cls.plan[cls.index]
+        if samples is not None:
+            cls.scene.cycles.sample_offset = offset
+            cls.scene.cycles.samples = samples
+        cls.pass_finished = False
+        cls.enter('rendering')
+        if bpy.app.background:
+            bpy.ops.render.render(scene=cls.scene.name)
+        else:
+            with bpy.context.temp_override(window=cls.window):
+                if 'CANCELLED' in bpy.ops.render.render('INVOKE_DEFAULT', scene=cls.scene.name):
+                    cls.finish("the render could not start")
+
+    @classmethod
+    def read_pass(cls):
+        # Render Result pixels are not readable from python, they go through an uncompressed float EXR
+        cls.save_render(bpy.data.images['Render Result'], cls.path, 'OPEN_EXR', '32')
+        if cls.image is None:
+            cls.image = bpy.data.images.load(cls.path, check_existing=False)
+        else:
+            cls.image.reload()
+        (width, height) = cls.image.size
+        pixels = np.empty(width * height * 4, np.float32)
+        cls.image.pixels.foreach_get(pixels)
+        samples = cls.plan[cls.index][1] or 1
+        if cls.accumulated is None or cls.size != (width, height):
+            cls.accumulated = pixels
+            cls.samples = samples
+            cls.size = (width, height)
+        else:
+            cls.samples += samples
+            cls.accumulated += (pixels - cls.accumulated) * (samples / cls.samples)
+        cls.frame = None
+        cls.index += 1
+        if cls.index == len(cls.plan):
+            cls.enter('publish')
+            return
+        if time.perf_counter() - cls.last_publish >= 1.0 / cls.max_fps:
+            cls.publish()  # Dropped when the viewer still holds every slot, the next pass will do
+        cls.enter('render')
+
+    @classmethod
+    def save_render(cls, image, path, file_format, color_depth):
+        settings = cls.scene.render.image_settings
+        settings.file_format = file_format
+        settings.color_depth = color_depth
+        image.save_render(path, scene=cls.scene)
+
+    @classmethod
+    def display_pixels(cls):
+        # Python can't apply the view transform to pixels: the average is saved as a render in a 16-bit TIFF,
+        # which goes through the scene's colour management, and read back as is
+        (width, height) = cls.size
+        if cls.display is not None and tuple(cls.display.size) != cls.size:
+            bpy.data.images.remove(cls.display)
+            cls.display = None
+        if cls.display is None:
+            cls.display = bpy.data.images.new("BRV Final Render", width, height, alpha=True, float_buffer=True)
+        cls.display.pixels.foreach_set(cls.accumulated)
+        cls.save_render(cls.display, cls.display_path, 'TIFF', '16')
+        if cls.display_read is None:
+            cls.display_read = bpy.data.images.load(cls.display_path, check_existing=False)
+            cls.display_read.colorspace_settings.name = 'Non-Color'  # The display encoded values as saved
+        else:
+            cls.display_read.reload()
+        pixels = np.empty(width * height * 4, np.float32)
+        cls.display_read.pixels.foreach_get(pixels)
+        return pixels
+
+    @classmethod
+    def publish(cls):
+        (width, height) = cls.size
+        if cls.frame is None:
+            cls.frame = cls.display_pixels()
+        if not SocketServer.publish_frame(cls.frame, width, height, "rgba32f", brv_frames.FLIPPED):
+            return False
+        cls.last_publish = time.perf_counter()
+        SocketServer.notify_clients_data({"final_render": {
+            "samples": cls.samples, "total": cls.total, "elapsed": round(cls.last_publish - cls.started, 2),
+            "done": cls.index == len(cls.plan)}})
+        return True
+
+    @classmethod
+    def finish(cls, error=None):
+        cls.active = False
+        cls.state = None
+        cls.error = error
+        for (owner, name, value) in cls.saved:
+            try:
+                setattr(owner, name, value)
+            except (TypeError, ValueError, AttributeError) as e:
+                print(f"[BRV] Can't restore {name}: {e}")
+        cls.saved = []
+        for (handlers, handler) in ((bpy.app.handlers.render_complete, final_render_complete),
+                                    (bpy.app.handlers.render_cancel, final_render_cancel)):
+            if handler in handlers:
+                handlers.remove(handler)
+        for name in ('image', 'display', 'display_read'):
+            if getattr(cls, name) is not None:
+                bpy.data.images.remove(getattr(cls, name))
+                setattr(cls, name, None)
+        cls.accumulated = cls.frame = None
+        for path in (cls.path, cls.display_path):
+            if os.path.exists(path):
+                os.remove(path)
+        elapsed = time.perf_counter() - cls.started
+        if error:
+            print(f"[BRV] Final render stream {error} after {elapsed:.1f} s")
+        else:
+            print(f"[BRV] Final render streamed in {elapsed:.1f} s ({cls.samples} samples, {len(cls.plan)} passes)")
+        return error
+
+@persistent
+def frame_change_handler(scene, *args):
+    RenderSettingsWatcher.frame_changed()
+
+def final_render_complete(scene, *args):
+    FinalRenderStream.pass_finished = True
+
+def final_render_cancel(scene, *args):
+    FinalRenderStream.cancelled = True
+
+class StreamFinalRender(Operator):
+    """Render the scene in passes of increasing samples, streamed to the external viewer as float frames"""
+    bl_idname = "brv.stream_final_render"
+    bl_label = "[BRV] Stream Final Render"
+
+    max_fps: FloatProperty(name="Max Updates per Second", default=2.0, min=0.1)
+    first_samples: IntProperty(name="First Pass Samples", default=1, min=1)
+    viewer_arguments: StringProperty(name="Viewer Arguments", default="",
+                                     description="Added to the command line of the viewer started for the stream")
+
+    def execute(self, context):
+        if FinalRenderStream.active:
+            self.report({'ERROR'}, "[BRV] A final render is already being streamed")
+            return {'CANCELLED'}
+        FinalRenderStream.begin(context.scene, context.window, self.max_fps, self.first_samples,
+                                self.viewer_arguments)
+        if not bpy.app.background:
+            bpy.app.timers.register(FinalRenderStream.step)
+            return {'FINISHED'}
+        FinalRenderStream.run_blocking()
+        if FinalRenderStream.viewer is not None:
+            # Nothing keeps blender alive after the script, keep the frames available until the viewer is closed
+            print("[BRV] Close the viewer to exit")
+            FinalRenderStream.viewer.wait()
+        return {'FINISHED'}
 
 def register():
 
     bpy.app.handlers.load_post.append(load_pre_handler)
-    bpy.app.handlers.depsgraph_update_post.append(desgraph_post_handler)
+    bpy.app.handlers.frame_change_post.append(frame_change_handler)
     #bpy.app.timers.register(check_resolution_wrapper)
     bpy.utils.register_class(CenterCam)
     bpy.utils.register_class(RenderRegion)
     bpy.utils.register_class(CreateCleanRenderedViewOperator)
+    bpy.utils.register_class(MeasureEditOverhead)
+    bpy.utils.register_class(StreamFinalRender)
     # Add the hotkey
     wm = bpy.context.window_manager
     kc = wm.keyconfigs.addon
@@ -356,16 +1132,24 @@ def register():
         addon_keymaps.append((km, kmi))
 
     SocketServer.start()
+    CommandDispatcher.start()
+    RenderSettingsWatcher.subscribe()
 
     #BlenderMonitor.start()
 
 def unregister():
     SocketServer.stop()
+    CommandDispatcher.stop()
+    RenderSettingsWatcher.unsubscribe()
+    print(f"[BRV] Render settings watcher: {RenderSettingsWatcher.notifications} notifications, "
+          f"{RenderSettingsWatcher.messages} messages sent")
     bpy.app.handlers.load_post.remove(load_pre_handler)
-    bpy.app.handlers.depsgraph_update_post.remove(desgraph_post_handler)
+    bpy.app.handlers.frame_change_post.remove(frame_change_handler)
     bpy.utils.unregister_class(CenterCam)
     bpy.utils.unregister_class(RenderRegion)
     bpy.utils.unregister_class(CreateCleanRenderedViewOperator)
+    bpy.utils.unregister_class(MeasureEditOverhead)
+    bpy.utils.unregister_class(StreamFinalRender)
 
     # Remove keymap entry
     for km, kmi in addon_keymaps:
@@ -387,7 +1171,13 @@ def run_compiled_script():
     global extUiProc
     # Define the path to the compiled executabl
     executable_path = os.path.join(script_dir,"dist/RenderWindow_ui.exe")  
-    extUiProc = Popen([executable_path])
+    extUiProc = Popen([executable_path] + session_arguments())
+
+def session_arguments():
+    # Snapshots are kept per saved .blend file
+    if bpy.data.filepath:
+        return ["--session", bpy.data.filepath]
+    return []
 
 def start_external_script():
     
@@ -410,7 +1200,7 @@ def start_external_script():
     # print("DONE")
 
     #exec(compile(open(filepath).read(), filepath, 'exec'))
-    extUiProc = Popen(['python', filepath])
+    extUiProc = Popen(['python', filepath] + session_arguments())
     #extUiProc = Popen([executable_path])
 
 if __name__ == "__main__":
@@ -0,0 +1,378 @@
+"""Frames published through shared memory, from a producer (blender, a test generator) to the external UI.
+
+The pixels are written into a ring of slots in a shared memory block, only small control messages go
+through the socket (brv_protocol frames):
+
+    producer -> ui   {"frame_ready": {"ring": name, "slot": i, "sequence": n}}
+    ui -> producer   {"frame_consumed": {"ring": name, "slot": i, "sequence": n}}
+
+The block starts with a ring header (magic "BRVF" | version u32 | slots u32 | slot size u64), each slot
+with a frame header (sequence u64 | width u32 | height u32 | stride u32 | format 8s | flags u32) followed
+by the pixels. A published slot is not written again before the UI gave it back, so the UI can display
+the pixels in place. When a frame does not fit in the slots the producer creates a bigger ring, the UI
+attaches to the new one when it receives its first frame_ready: the resolution changes without restart.
+
+python brv_frames.py runs a test producer, to be viewed with RenderView_ui.py --backend shm.
+"""
+
+import argparse
+import collections
+import math
+import socket
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+try:
+    from . import brv_protocol  # Blender add-on package
+except ImportError:
+    import brv_protocol
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional, only used by the test producer
+
+VERSION = 1
+RING_HEADER = struct.Struct("<4sIIQ")
+SLOT_HEADER = struct.Struct("<QIII8sI")
+MAGIC = b"BRVF"
+ALIGNMENT = 64  # Slot pixels start on a cache line
+FORMATS = {"bgra8": 4, "rgba8": 4, "rgba16f": 8, "rgba32f": 16}  # Bytes per pixel
+FLIPPED = 1  # Rows stored bottom to top (blender image buffers)
+LINEAR = 2  # Float pixels in linear light, to be encoded as sRGB for display
+
+def align(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class FrameRing:
+    """Shared memory block holding the slots, created by the producer, attached by the UI"""
+
+    created = set()  # Names of the blocks created by this process, still linked
+
+    def __init__(self, memory, slots, slot_size, owner):
+        self.memory = memory
+        self.name = memory.name
+        self.slots = slots
+        self.slot_size = slot_size  # Pixel bytes per slot
+        self.owner = owner  # Unlinks the block when closed
+
+    @classmethod
+    def create(cls, slots, slot_size):
+        slot_size = align(slot_size)
+        memory = shared_memory.SharedMemory(create=True, size=cls.offset(slots, slot_size, slots))
+        RING_HEADER.pack_into(memory.buf, 0, MAGIC, VERSION, slots, slot_size)
+        cls.created.add(memory.name)
+        return cls(memory, slots, slot_size, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before python 3.13 the resource tracker would unlink the producer's block when the UI exits
+            memory = shared_memory.SharedMemory(name=name)
+            if name not in cls.created:  # Otherwise the tracker entry is the producer's own, for its unlink()
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(memory._name, "shared_memory")
+        magic, version, slots, slot_size = RING_HEADER.unpack_from(memory.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            memory.close()
+            raise brv_protocol.ProtocolError(f"Bad frame ring {name} ({bytes(magic)!r} version {version})")
+        return cls(memory, slots, slot_size, owner=False)
+
+    @staticmethod
+    def offset(slots, slot_size, slot):
+        return align(RING_HEADER.size) + slot * (align(SLOT_HEADER.size) + slot_size)
+
+    def header_offset(self, slot):
+        return self.offset(self.slots, self.slot_size, slot)
+
+    def pixels(self, slot, length=None):
+        start = self.header_offset(slot) + align(SLOT_HEADER.size)
+        return self.memory.buf[start:start + (self.slot_size if length is None else length)]
+
+    def write_header(self, slot, sequence, width, height, stride, format, flags):
+        SLOT_HEADER.pack_into(self.memory.buf, self.header_offset(slot), sequence, width, height, stride,
+                              format.encode(), flags)
+
+    def read_header(self, slot):
+        sequence, width, height, stride, format, flags = SLOT_HEADER.unpack_from(self.memory.buf,
+                                                                                 self.header_offset(slot))
+        return {"sequence": sequence, "width": width, "height": height, "stride": stride,
+                "format": format.rstrip(b"\0").decode(), "flags": flags}
+
+    def close(self):
+        # BufferError while views over the pixels are still alive, try again once they are gone
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            self.created.discard(self.name)
+
+class FrameProducer:
+    """Publishes frames into a ring, send(dictionary, consumers) delivers the control messages.
+
+    consumers() returns the UIs (any hashable id) that must each give a slot back before it is
+    written again, a single anonymous one when not given. A UI already holding HELD slots (the
+    frame it displays and the one announced next) is not sent the new frames until it gives
+    one back, so a slow UI sees fewer frames instead of holding the ring for the others."""
+
+    HELD = 2
+
+    def __init__(self, send, slots=3, consumers=None):
+        self.send = send
+        self.slots = slots
+        self.consumers = consumers
+        self.ring = None
+        self.sequence = 0
+        self.pending = {}  # slot -> consumers that have not given it back yet
+        self.writing = None
+        self.published = 0
+        self.dropped = 0  # No free slot, every one still displayed or waiting for the UI
+        self._lock = threading.Lock()
+
+    def begin(self, width, height, format, stride=None):
+        # Returns a writable view over the pixels of a free slot, None when the UI holds them all
+        stride = stride or width * FORMATS[format]
+        size = stride * height
+        with self._lock:
+            if self.ring is None or size > self.ring.slot_size or self.ring.slots < self.slots:
+                self.replace_ring(size)
+            free = [slot for slot in range(self.ring.slots) if slot not in self.pending]
+            if not free:
+                self.dropped += 1
+                return None
+            self.writing = (free[0], width, height, stride, format)
+            return self.ring.pixels(free[0], size)
+
+    def commit(self, flags=0):
+        with self._lock:
+            (slot, width, height, stride, format) = self.writing
+            self.writing = None
+            self.sequence += 1
+            self.ring.write_header(slot, self.sequence, width, height, stride, format, flags)
+            held = collections.Counter(consumer for consumers in self.pending.values() for consumer in consumers)
+            expected = {consumer for consumer in (self.consumers() if self.consumers else (None,))
+                        if held[consumer] < self.HELD}
+            if not expected:
+                self.dropped += 1  # Every UI is behind, the slot stays free
+                return
+            self.pending[slot] = expected
+            message = {"frame_ready": {"ring": self.ring.name, "slot": slot, "sequence": self.sequence}}
+            self.published += 1
+        self.send(message, list(expected))
+
+    def publish(self, pixels, width, height, format, flags=0):
+        # Copying variant of begin() / commit(), returns False when the frame was dropped
+        view = self.begin(width, height, format)
+        if view is None:
+            return False
+        view[:] = memoryview(pixels).cast("B")
+        view.release()
+        self.commit(flags)
+        return True
+
+    def consumed(self, message, consumer=None):
+        # Also called for a frame announcement that was never delivered to the consumer
+        with self._lock:
+            if self.ring is None or message["ring"] != self.ring.name:
+                return  # Slot of a replaced ring
+            slot = message["slot"]
+            if slot in self.pending:
+                self.pending[slot].discard(consumer)
+                if not self.pending[slot]:
+                    del self.pending[slot]
+
+    def forget(self, consumer):
+        # A UI disconnected, the slots it held will never be given back
+        with self._lock:
+            for slot in list(self.pending):
+                self.pending[slot].discard(consumer)
+                if not self.pending[slot]:
+                    del self.pending[slot]
+
+    def reserve(self, consumers):
+        # Enough slots for each consumer to hold its share and one to write into,
+        # the ring is replaced by a larger one on the next begin()
+        with self._lock:
+            self.slots = max(self.slots, self.HELD * consumers + 1)
+
+    def replace_ring(self, size):
+        # Grow by a quarter so a resolution creeping up does not replace the ring on every frame
+        previous = self.ring
+        self.ring = FrameRing.create(self.slots, size + size // 4)
+        self.pending.clear()
+        if previous is not None:
+            previous.close()  # The UI keeps its own mapping of the slots it still holds
+
+    def close(self):
+        with self._lock:
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+class FrameConsumer:
+    """UI side: keeps the latest announced frame and gives the slots back.
+
+    A frame announced while the previous one was not taken yet supersedes it, the older slot
+    goes back to the producer right away. send(dictionary) delivers the consumed messages."""
+
+    def __init__(self, send):
+        self.send = send
+        self.rings = {}  # name -> FrameRing, the current one and those with slots still held
+        self.current = None
+        self.latest = None  # Announced, not taken yet
+        self.held = {}  # (ring, slot, sequence) -> True while being displayed
+        self.retired = []  # Rings to close once no view of their pixels is alive
+        self.received = 0
+        self.superseded = 0
+        self._lock = threading.Lock()
+
+    def frame_ready(self, message):
+        # Socket listener thread
+        with self._lock:
+            if message["ring"] not in self.rings:
+                self.rings[message["ring"]] = FrameRing.attach(message["ring"])
+                self.retire_rings(message["ring"])
+            self.current = message["ring"]
+            stale = self.latest
+            self.latest = (message["ring"], message["slot"], message["sequence"])
+            self.received += 1
+        if stale is not None:
+            self.superseded += 1
+            self.release(stale)
+
+    def take(self):
+        # Returns (key, header, pixels view) of the latest frame, None when there is no new one.
+        # The slot stays out of the producer's hands until release(key)
+        with self._lock:
+            key = self.latest
+            self.latest = None
+            if key is None:
+                return None
+            ring = self.rings[key[0]]
+            header = ring.read_header(key[1])
+            if header["sequence"] == key[2]:
+                self.held[key] = True
+                return key, header, ring.pixels(key[1], header["stride"] * header["height"])
+        # The producer still counts the slot against this UI until it is given back
+        self.release(key)
+        raise brv_protocol.ProtocolError(f"Slot {key[1]} holds frame {header['sequence']}, expected {key[2]}")
+
+    def release(self, key):
+        with self._lock:
+            self.held.pop(key, None)
+            self.retire_rings(self.current)
+        self.send({"frame_consumed": {"ring": key[0], "slot": key[1], "sequence": key[2]}})
+
+    def retire_rings(self, current):
+        # Lock held: close the replaced rings whose slots are all given back
+        for name in [name for name in self.rings if name != current]:
+            if not any(key[0] == name for key in self.held):
+                self.retired.append(self.rings.pop(name))
+        for ring in list(self.retired):
+            try:
+                ring.close()
+                self.retired.remove(ring)
+            except BufferError:
+                pass  # A displayed image still refers to its pixels
+
+    def close(self):
+        with self._lock:
+            self.retired += self.rings.values()
+            self.rings = {}
+            self.latest = None
+            self.held.clear()
+            self.retire_rings(None)
+
+def test_pattern(width, height, format, t):
+    # Moving gradient with a bright bar, as uint8 BGRA / RGBA or float RGBA pixels
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :]
+    y = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+    red = np.broadcast_to((x + t * 0.1) % 1.0, (height, width))
+    green = np.broadcast_to(y, (height, width))
+    blue = 0.5 + 0.5 * np.sin(2 * math.pi * (x + y + t * 0.25))
+    bar = int((t * 0.2 % 1.0) * width)
+    pixels = np.empty((height, width, 4), np.float32)
+    pixels[..., 0], pixels[..., 1], pixels[..., 2], pixels[..., 3] = red, green, blue, 1.0
+    pixels[:, bar:bar + max(1, width // 50), :3] = 4.0  # Over-bright, float formats only
+    if format == "rgba32f":
+        return pixels
+    if format == "rgba16f":
+        return pixels.astype(np.float16)
+    pixels = (np.clip(pixels, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+    return np.ascontiguousarray(pixels[..., [2, 1, 0, 3]]) if format == "bgra8" else pixels
+
+def run_test_producer(host, port, fps, sizes, formats, switch_every, duration):
+    # Stands in for blender: serves one UI, publishes frames, cycles through the sizes and formats
+    if np is None:
+        raise SystemExit("The test producer needs numpy")
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen()
+    print(f"Test producer listening on {host}:{port}, start RenderView_ui.py --backend shm")
+    conn, address = server.accept()
+    send_lock = threading.Lock()
+
+    def send(message, consumers=None):
+        with send_lock:
+            conn.sendall(brv_protocol.encode_frame(message))
+
+    producer = FrameProducer(send)
+    connected = threading.Event()
+    closed = threading.Event()
+
+    def receive():
+        reader = brv_protocol.FrameReader()
+        while True:
+            try:
+                data = conn.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            for (message, payload) in reader.feed(data):
+                if 'hello' in message:
+                    brv_protocol.negotiate(message)
+                    send(brv_protocol.hello())
+                    connected.set()
+                if 'frame_consumed' in message:
+                    producer.consumed(message['frame_consumed'])
+        closed.set()
+
+    threading.Thread(target=receive, daemon=True).start()
+    connected.wait()
+    start = time.perf_counter()
+    frame = 0
+    try:
+        while not closed.is_set() and (not duration or time.perf_counter() - start < duration):
+            t = time.perf_counter() - start
+            step = int(t // switch_every) if switch_every else 0
+            (width, height) = sizes[step % len(sizes)]
+            format = formats[step % len(formats)]
+            flags = LINEAR if format.endswith("f") else 0
+            producer.publish(test_pattern(width, height, format, t), width, height, format, flags)
+            frame += 1
+            time.sleep(max(0.0, start + frame / fps - time.perf_counter()))
+    finally:
+        conn.close()
+        server.close()
+        producer.close()
+    elapsed = time.perf_counter() - start
+    print(f"{producer.published} frames published in {elapsed:.1f} s ({producer.published / elapsed:.1f} fps), "
+          f"{producer.dropped} dropped (no free slot)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test producer publishing frames to the UI through shared memory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=42069)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--sizes", default="1280x720,1920x1080", help="Comma separated sizes, cycled")
+    parser.add_argument("--formats", default="bgra8,rgba32f,rgba16f,rgba8", help="Comma separated formats, cycled")
+    parser.add_argument("--switch-every", type=float, default=3, help="Seconds between size / format changes")
+    parser.add_argument("--duration", type=float, default=0, help="Seconds, 0 until the UI disconnects")
+    args = parser.parse_args()
+    sizes = [tuple(int(value) for value in size.lower().split("x")) for size in args.sizes.split(",")]
+    run_test_producer(args.host, args.port, args.fps, sizes, args.formats.split(","), args.switch_every, args.duration)
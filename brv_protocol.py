@@ -0,0 +1,235 @@
+"""Framing of the messages between blender (SocketServer) and the external UI (SocketClient).
+
+Each frame is a fixed header, a JSON object and an optional binary payload:
+
+    magic "BR" | version u8 | flags u8 | JSON length u32 | payload length u32 | JSON | payload
+
+TCP delivers a byte stream, so FrameReader buffers what is received and returns only whole
+frames, however the writes were coalesced or split. After connecting, the client sends a
+hello with its version and capabilities and the server answers with its own, both sides
+then only use the capabilities they have in common.
+
+The server queues what it sends to each client in an Outbox written without blocking, so a
+client reading slowly only delays (or loses, depending on its policy) its own frames.
+
+python brv_protocol.py runs a load test over a local socket.
+"""
+
+import argparse
+import collections
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+
+VERSION = 1
+CAPABILITIES = ("binary", "frames")
+POLICIES = ("latest", "skip", "all")  # What an Outbox does with the droppable messages of a lagging client
+HEADER = struct.Struct("!2sBBII")
+MAGIC = b"BR"
+MAX_JSON = 16 * 1024 * 1024
+MAX_PAYLOAD = 1024 * 1024 * 1024
+
+class ProtocolError(Exception):
+    pass
+
+def encode_frame(message, payload=b""):
+    data = json.dumps(message).encode('utf-8')
+    return HEADER.pack(MAGIC, VERSION, 0, len(data), len(payload)) + data + bytes(payload)
+
+def hello(capabilities=CAPABILITIES, policy=None):
+    message = {"hello": {"version": VERSION, "capabilities": list(capabilities)}}
+    if policy is not None:
+        message["hello"]["policy"] = policy
+    return message
+
+def negotiate(message, capabilities=CAPABILITIES):
+    # Capabilities shared with the peer's hello, ProtocolError if its version is not supported
+    peer = message["hello"]
+    if peer.get("version") != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {peer.get('version')} (expected {VERSION})")
+    return set(peer.get("capabilities", ())) & set(capabilities)
+
+def requested_policy(message):
+    # Outbox policy asked for in a client's hello, "latest" when none or an unknown one
+    policy = message["hello"].get("policy")
+    return policy if policy in POLICIES else "latest"
+
+class FrameReader:
+    """Incremental parser: feed() the received bytes, get back the complete (message, payload) frames"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+
+    def feed(self, data):
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            magic, version, flags, json_length, payload_length = HEADER.unpack_from(self.buffer, offset)
+            if magic != MAGIC:
+                raise ProtocolError(f"Bad frame magic {bytes(magic)!r}")
+            if version != VERSION:
+                raise ProtocolError(f"Unsupported frame version {version}")
+            if json_length > MAX_JSON or payload_length > MAX_PAYLOAD:
+                raise ProtocolError(f"Frame too large ({json_length} + {payload_length} bytes)")
+            end = offset + HEADER.size + json_length + payload_length
+            if len(self.buffer) < end:
+                break  # Rest of the frame not received yet
+            start = offset + HEADER.size
+            try:
+                message = json.loads(self.buffer[start:start + json_length].decode('utf-8'))
+            except ValueError as error:
+                raise ProtocolError(f"Bad frame JSON: {error}")
+            frames.append((message, bytes(self.buffer[start + json_length:end])))
+            offset = end
+        del self.buffer[:offset]
+        self.frames += len(frames)
+        return frames
+
+class Outbox:
+    """Frames waiting to be written to one peer, flushed as its non-blocking socket accepts them.
+
+    put() takes an encoded frame, so a broadcast is only encoded once. Frames put with a key
+    (frame announcements) can be dropped when the peer lags, as its policy says: "latest" only
+    keeps the newest queued one per key, "skip" discards new ones while more than limit bytes
+    are waiting, "all" keeps everything. Other frames are always queued, past hard_limit bytes
+    the peer is stalled and put() returns False. dropped(message) is called with the message
+    given along with each discarded frame, outside the lock."""
+
+    def __init__(self, policy="latest", limit=256 * 1024, hard_limit=64 * 1024 * 1024, dropped=None):
+        self.policy = policy
+        self.limit = limit
+        self.hard_limit = hard_limit
+        self.dropped = dropped
+        self.queue = collections.deque()  # [remaining bytes, key, message, time queued]
+        self.queued = 0  # Bytes waiting
+        self.partial = False  # Head of the queue partly written, can't be discarded anymore
+        self.stalled = False
+        self.sent = 0
+        self.skipped = 0
+        self.peak = 0  # Most bytes waiting at once
+        self.lag = 0.0  # Seconds from put() to written, smoothed
+        self.max_lag = 0.0
+        self.lock = threading.Lock()
+
+    def put(self, data, key=None, message=None):
+        data = memoryview(data)
+        discarded = []
+        with self.lock:
+            if key is not None and self.policy == "latest":
+                for entry in list(self.queue)[1 if self.partial else 0:]:
+                    if entry[1] == key:
+                        self.queue.remove(entry)
+                        self.queued -= len(entry[0])
+                        discarded.append(entry[2])
+            if key is not None and self.policy == "skip" and self.queued >= self.limit:
+                discarded.append(message)
+            else:
+                self.queue.append([data, key, message, time.perf_counter()])
+                self.queued += len(data)
+                self.peak = max(self.peak, self.queued)
+            if self.queued > self.hard_limit:
+                self.stalled = True
+            self.skipped += len(discarded)
+        if self.dropped is not None:
+            for dropped in discarded:
+                self.dropped(dropped)
+        return not self.stalled
+
+    def flush(self, sock):
+        # Writes what the socket takes without blocking, True once nothing is left waiting.
+        # Socket errors other than a full send buffer are raised
+        with self.lock:
+            while self.queue:
+                entry = self.queue[0]
+                try:
+                    sent = sock.send(entry[0])
+                except (BlockingIOError, InterruptedError):
+                    return False
+                self.queued -= sent
+                if sent < len(entry[0]):
+                    entry[0] = entry[0][sent:]
+                    self.partial = True
+                    return False
+                self.queue.popleft()
+                self.partial = False
+                self.sent += 1
+                lag = time.perf_counter() - entry[3]
+                self.lag += (lag - self.lag) * 0.1
+                self.max_lag = max(self.max_lag, lag)
+            return True
+
+    def pending(self):
+        with self.lock:
+            return bool(self.queue)
+
+    def stats(self):
+        return (f"{self.sent} messages sent, {self.skipped} dropped ({self.policy}), lag {self.lag * 1000:.1f} ms "
+                f"(max {self.max_lag * 1000:.1f} ms), {self.queued} bytes waiting (peak {self.peak})")
+
+def load_test(messages=50000, payload_size=1024, binary_every=10, seed=0):
+    # Pushes numbered frames through a local socket in randomly split and coalesced writes,
+    # read in small chunks on the other side, and checks nothing is lost, reordered or corrupted
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen()
+    received = []
+    errors = []
+
+    def receive():
+        conn, _ = server.accept()
+        reader = FrameReader()
+        sizes = random.Random(seed + 1)
+        with conn:
+            while True:
+                data = conn.recv(sizes.choice((7, 512, 4096, 65536)))
+                if not data:
+                    break
+                try:
+                    for (message, payload) in reader.feed(data):
+                        if zlib.crc32(payload) != message.get("crc", 0):
+                            errors.append(f"Payload of message {message['sequence']} corrupted")
+                        received.append(message["sequence"])
+                except ProtocolError as error:
+                    errors.append(str(error))
+                    break
+
+    receiver = threading.Thread(target=receive)
+    receiver.start()
+    client = socket.create_connection(server.getsockname())
+    generator = random.Random(seed)
+    payload = bytes(generator.getrandbits(8) for _ in range(payload_size))
+    start = time.perf_counter()
+    pending = bytearray()
+    for sequence in range(messages):
+        data = payload if binary_every and sequence % binary_every == 0 else b""
+        pending += encode_frame({"sequence": sequence, "resized": True, "crc": zlib.crc32(data)}, data)
+        if generator.random() < 0.3 or sequence == messages - 1:
+            # Flush in pieces that cut through headers and bodies
+            while pending:
+                size = generator.randint(1, max(1, len(pending)))
+                client.sendall(pending[:size])
+                del pending[:size]
+    client.shutdown(socket.SHUT_WR)
+    receiver.join()
+    elapsed = time.perf_counter() - start
+    client.close()
+    server.close()
+    lost = messages - len(received)
+    in_order = received == list(range(len(received)))
+    print(f"{messages} messages ({payload_size} byte payload every {binary_every}) in {elapsed:.2f} s, "
+          f"{messages / elapsed:.0f} messages/s, lost: {lost}, in order: {in_order}, errors: {errors[:3]}")
+    return lost == 0 and in_order and not errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the BRV message framing over a local socket")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--payload", type=int, default=1024, help="Binary payload size in bytes")
+    parser.add_argument("--binary-every", type=int, default=10, help="Attach the payload to one message in N, 0 for none")
+    args = parser.parse_args()
+    raise SystemExit(0 if load_test(args.messages, args.payload, args.binary_every) else 1)
@@ -0,0 +1,665 @@
+"""Delta compressed stream of the live frames, to watch a render view from another machine.
+
+The artist's UI (RenderView_ui.py --serve-remote [HOST:]PORT, 127.0.0.1 unless a HOST is given, there
+is no authentication) serves the frames it displays, a remote UI
+(RenderView_ui.py --backend remote --remote HOST:PORT) rebuilds them. Frames are 32-bit pixels
+cut in tiles, only the tiles that differ from what the viewer has are sent, in brv_protocol frames:
+
+    server -> viewer  {"remote_frame": {"sequence", "width", "height", "format", "tile", "level",
+                       "keyframe", "tiles", "latency"}} + zlib(changed tile bitmap | tile pixels)
+    viewer -> server  {"remote_ack": {"sequence": n}}, {"remote_keyframe": true} to get every tile again
+
+The tiles are split in byte planes and, but in keyframes, sent as their byte difference with what the
+viewer has: while a render converges each frame only moves the pixels a little, the small differences
+compress about twice better with zlib (level 1) than the pixels themselves. Every tile is sent as is
+on a keyframe (on connect, on request and every keyframe_interval seconds). The bandwidth and round
+trip of the link are measured from the acknowledgements: a viewer only has about a bandwidth-delay
+product of frames in flight, the changes made meanwhile are merged into its next frame, and the colour
+precision is lowered (level) while frames have to wait, then raised back once the link keeps up.
+
+python brv_remote.py streams generated frames over localhost through a proxy limiting the bandwidth
+and adding latency, and reports the bytes per frame and the latency. --proxy runs the proxy alone,
+to shape the link between two UIs.
+"""
+
+import argparse
+import collections
+import queue
+import socket
+import threading
+import time
+import zlib
+
+try:
+    from . import brv_protocol  # Blender add-on package
+except ImportError:
+    import brv_protocol
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Required by the encoder and decoder, the UIs check it before using them
+
+TILE = 64
+LEVELS = (0, 2, 3, 4)  # Low bits dropped from the colour channels, alpha is always kept
+CAPABILITIES = ("binary", "remote")
+KEYFRAME_INTERVAL = 10.0
+
+def quantize(pixels, level):
+    # Clears the dropped bits of the colour channels and sets the middle of the step instead
+    bits = LEVELS[level]
+    if not bits:
+        return pixels
+    step = (0xFF >> bits << bits) * 0x010101
+    middle = (1 << (bits - 1)) * 0x010101
+    return (pixels & np.uint32(0xFF000000 | step)) | np.uint32(middle)
+
+def tile_view(pixels, tile):
+    # (rows, columns, tile, tile) view over a (height, width) array, both multiples of the tile size
+    height, width = pixels.shape
+    return pixels.reshape(height // tile, tile, width // tile, tile).swapaxes(1, 2)
+
+def padded(width, height, tile):
+    return (-(-height // tile) * tile, -(-width // tile) * tile)
+
+class TileEncoder:
+    """Changed tiles of the frames sent to one viewer, against its reconstruction.
+
+    The reference is what the viewer has (quantized to the level it was sent with), so the
+    tiles sent at a coarse level are sent again when the level goes back up."""
+
+    def __init__(self, tile=TILE):
+        self.tile = tile
+        self.reference = None  # Padded (height, width) uint32, the viewer's reconstruction
+        self.key = None  # (width, height, format) of the reference
+
+    def encode(self, pixels, format, level, keyframe=False):
+        # pixels: (height, width) uint32. Returns (header, payload), None when the viewer has this frame
+        height, width = pixels.shape
+        if (width, height, format) != self.key:
+            self.reference = np.zeros(padded(width, height, self.tile), np.uint32)
+            self.key = (width, height, format)
+            keyframe = True
+        frame = np.zeros_like(self.reference)
+        frame[:height, :width] = quantize(pixels, level)
+        tiles = tile_view(frame, self.tile)
+        reference = tile_view(self.reference, self.tile)
+        if keyframe:
+            changed = np.ones(tiles.shape[:2], bool)
+        else:
+            changed = (tiles != reference).any(axis=(2, 3))
+            if not changed.any():
+                return None
+        data = tiles[changed]  # (tiles, tile, tile) copies
+        if not keyframe:
+            data.view(np.uint8)[:] -= reference[changed].view(np.uint8)  # Wraps around, so does the decoder
+        reference[changed] = tiles[changed]
+        planes = data.view(np.uint8).reshape(len(data), self.tile, self.tile, 4).transpose(0, 3, 1, 2)
+        payload = zlib.compress(np.packbits(changed).tobytes() + planes.tobytes(), 1)
+        header = {"width": width, "height": height, "format": format, "tile": self.tile, "level": level,
+                  "keyframe": keyframe, "tiles": int(len(data))}
+        return header, payload
+
+class TileDecoder:
+    """Rebuilds the frames of a remote_frame stream, decode() returns the (x, y, w, h) tiles updated"""
+
+    def __init__(self):
+        self.pixels = None  # Padded (height, width) uint32
+        self.key = None
+        self.frames = 0
+        self.keyframes = 0
+        self.bytes = 0
+
+    def image(self):
+        (width, height, format, tile) = self.key
+        return self.pixels[:height, :width]
+
+    def decode(self, header, payload):
+        width, height, tile = header["width"], header["height"], header["tile"]
+        key = (width, height, header["format"], tile)
+        if key != self.key:
+            if not header["keyframe"]:
+                raise brv_protocol.ProtocolError("Delta frame received without its keyframe")
+            self.pixels = np.zeros(padded(width, height, tile), np.uint32)
+            self.key = key
+        tiles = tile_view(self.pixels, tile)
+        (rows, columns) = tiles.shape[:2]
+        data = zlib.decompress(payload)
+        mask_size = (rows * columns + 7) // 8
+        changed = np.unpackbits(np.frombuffer(data, np.uint8, mask_size))[:rows * columns].reshape(rows, columns)
+        changed = changed.astype(bool)
+        count = int(changed.sum())
+        if count != header["tiles"] or len(data) != mask_size + count * tile * tile * 4:
+            raise brv_protocol.ProtocolError(f"Remote frame holds {len(data)} bytes for {header['tiles']} tiles")
+        planes = np.frombuffer(data, np.uint8, offset=mask_size).reshape(count, 4, tile, tile)
+        update = planes.transpose(0, 2, 3, 1).copy().view(np.uint32).reshape(count, tile, tile)
+        if not header["keyframe"]:
+            update.view(np.uint8)[:] += tiles[changed].view(np.uint8)
+        tiles[changed] = update
+        self.frames += 1
+        self.keyframes += bool(header["keyframe"])
+        self.bytes += len(payload)
+        rects = []
+        for (ty, tx) in zip(*np.nonzero(changed)):
+            x, y = int(tx) * tile, int(ty) * tile
+            if rects and rects[-1][1] == y and rects[-1][0] + rects[-1][2] == x:
+                last = rects[-1]
+                rects[-1] = (last[0], y, last[2] + min(tile, width - x), last[3])
+            else:
+                rects.append((x, y, min(tile, width - x), min(tile, height - y)))
+        return rects
+
+class RateController:
+    """When a viewer can be sent a frame and at which level, from its acknowledgements.
+
+    Frames are sent while the bytes in flight fit in the bandwidth-delay product of the link
+    (times gain) plus a frame, which keeps the link busy while the acknowledgements come back
+    with about one round trip of frames queued on it, and at most max_delay seconds. The
+    bandwidth is the highest delivery rate measured over the last seconds, the delay the round
+    trip of the frames sent on an idle link, less their own transmission. Before the first
+    acknowledgement, window frames can be in flight. Otherwise the changes pile up into the
+    next frame instead of a queue. Each second new content waited more than max_delay for the
+    link, the level goes one step coarser. After a few seconds without that, it goes one step
+    finer when the throughput leaves room for frames about twice larger, or anyway to probe
+    the link."""
+
+    def __init__(self, window=2, max_delay=0.25, calm_seconds=3, gain=2.0, filter_seconds=5):
+        self.window = window
+        self.max_delay = max_delay
+        self.calm_seconds = calm_seconds
+        self.gain = gain
+        self.filter_seconds = filter_seconds  # How long the bandwidth and round trip samples are kept
+        self.level = 0
+        self.inflight = {}  # sequence -> (bytes, time sent, time captured, delivered, delivered time, idle link)
+        self.waiting = None  # Since when new content is held back
+        self.waited = 0.0  # Seconds new content was held back during the current second
+        self.calm = 0  # Seconds in a row without waiting
+        self.capacity = None  # Bytes/s, bottleneck bandwidth
+        self.rate_samples = collections.deque()  # (time, bytes/s), decreasing rates
+        self.rtt_samples = collections.deque()  # (time, seconds, bytes) of the frames sent on an idle link
+        self.delivered = 0  # Bytes acknowledged
+        self.delivered_time = time.perf_counter()  # Last acknowledgement, or send on an idle link
+        self.frame_size = None  # Bytes per frame, smoothed
+        self.second_start = time.perf_counter()
+        self.second_bytes = 0
+        self.second_frames = 0
+        self.frames = 0
+        self.bytes = 0
+        self.held_back = 0
+        self.latency = 0.0  # Capture to acknowledgement, smoothed
+        self.max_latency = 0.0
+        self.levels = [0] * len(LEVELS)  # Frames sent at each level
+        self._lock = threading.Lock()
+
+    def delay(self):
+        # Lock held: round trip of the link without the transmission of the frames (seconds)
+        return max(0.0, min(rtt - size / self.capacity for (when, rtt, size) in self.rtt_samples))
+
+    def budget(self):
+        # Lock held: bytes that can be in flight, None until the link was measured
+        if self.capacity is None:
+            return None
+        delay = self.delay()
+        return min(self.capacity * self.gain * delay + self.frame_size, self.capacity * (delay + self.max_delay))
+
+    def ready(self, fresh=True):
+        # fresh: the frame to send has new content, not only a finer level or a keyframe of the same
+        with self._lock:
+            inflight = sum(entry[0] for entry in self.inflight.values())
+            budget = self.budget()
+            now = time.perf_counter()
+            if not self.inflight or (len(self.inflight) < self.window if budget is None else inflight < budget):
+                if self.waiting is not None:
+                    self.waited += now - self.waiting
+                    self.waiting = None
+                return True
+            if fresh and self.waiting is None:
+                self.waiting = now
+                self.held_back += 1
+            return False
+
+    def sent(self, sequence, size, captured):
+        with self._lock:
+            now = time.perf_counter()
+            idle = not self.inflight
+            if idle:
+                self.delivered_time = now  # Don't count the idle time in the next rate sample
+            self.inflight[sequence] = (size, now, captured, self.delivered, self.delivered_time, idle)
+            self.frame_size = size if self.frame_size is None else self.frame_size * 0.9 + size * 0.1
+            self.frames += 1
+            self.bytes += size
+            self.levels[self.level] += 1
+
+    def acknowledged(self, sequence):
+        with self._lock:
+            if sequence not in self.inflight:
+                return
+            (size, sent, captured, delivered, delivered_time, idle) = self.inflight.pop(sequence)
+            now = time.perf_counter()
+            latency = now - captured
+            self.latency = latency if self.frames == 1 else self.latency * 0.9 + latency * 0.1
+            self.max_latency = max(self.max_latency, latency)
+            self.second_bytes += size
+            self.second_frames += 1
+            # Delivery rate: bytes acknowledged since this frame was sent over the time it took,
+            # the bottleneck bandwidth at most, whatever the frames queued in front of it.
+            # Windowed max filter, only the rates that can still become the highest are kept
+            self.delivered += size
+            self.delivered_time = now
+            rate = (self.delivered - delivered) / max(now - delivered_time, 1e-3)
+            while self.rate_samples and self.rate_samples[0][0] < now - self.filter_seconds:
+                self.rate_samples.popleft()
+            while self.rate_samples and self.rate_samples[-1][1] <= rate:
+                self.rate_samples.pop()
+            self.rate_samples.append((now, rate))
+            self.capacity = self.rate_samples[0][1]
+            if idle:
+                # The latest sample is kept however old, the link may never be idle again
+                self.rtt_samples.append((now, now - sent, size))
+                while self.rtt_samples[0][0] < now - self.filter_seconds:
+                    self.rtt_samples.popleft()
+
+    def tick(self):
+        # Returns True when the level changed
+        now = time.perf_counter()
+        with self._lock:
+            elapsed = now - self.second_start
+            if elapsed < 1.0:
+                return False
+            rate = self.second_bytes / elapsed
+            level = self.level
+            if self.waiting is not None:
+                self.waited += now - self.waiting
+                self.waiting = now
+            if self.waited > self.max_delay:
+                self.calm = 0
+                self.level = min(self.level + 1, len(LEVELS) - 1)
+            else:
+                self.calm += 1
+                if self.level > 0 and self.calm >= self.calm_seconds and \
+                        (self.capacity is None or rate * 2 < self.capacity or self.calm >= 3 * self.calm_seconds):
+                    self.level -= 1
+                    self.calm = 0
+            self.waited = 0.0
+            self.second_start = now
+            self.second_bytes = 0
+            self.second_frames = 0
+            return self.level != level
+
+    def stats(self):
+        per_frame = self.bytes / self.frames if self.frames else 0
+        levels = ", ".join(f"{count} at level {level}" for (level, count) in enumerate(self.levels) if count)
+        return (f"{self.frames} frames ({levels or 'none'}), {per_frame / 1024:.1f} KB/frame, "
+                f"{self.held_back} waits for the link, latency {self.latency * 1000:.0f} ms "
+                f"(max {self.max_latency * 1000:.0f} ms)" + (f", link {self.capacity * 8 / 1e6:.1f} Mbit/s "
+                f"x {self.delay() * 1000:.0f} ms round trip" if self.capacity is not None else ""))
+
+class RemoteSession:
+    """One remote viewer of a RemoteStreamServer: a thread reading its messages, one encoding and
+    sending its frames, so a slow viewer never holds the others back."""
+
+    def __init__(self, server, conn, address):
+        self.server = server
+        self.conn = conn
+        self.address = address
+        self.encoder = TileEncoder(server.tile)
+        self.rate = RateController()
+        self.connected = threading.Event()  # Hello received
+        self.closed = threading.Event()
+        self.keyframe_requested = True
+        self.last_keyframe = 0.0
+        self.encoded = None  # (frame version, level) last sent
+        self.sequence = 0
+        self.send_lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.receive, daemon=True).start()
+        threading.Thread(target=self.stream, daemon=True).start()
+
+    def send(self, message, payload=b""):
+        with self.send_lock:
+            self.conn.sendall(brv_protocol.encode_frame(message, payload))
+
+    def receive(self):
+        reader = brv_protocol.FrameReader()
+        try:
+            while not self.closed.is_set():
+                data = self.conn.recv(65536)
+                if not data:
+                    break
+                for (message, payload) in reader.feed(data):
+                    if 'hello' in message:
+                        brv_protocol.negotiate(message, CAPABILITIES)
+                        self.send(brv_protocol.hello(CAPABILITIES))
+                        self.connected.set()
+                    if 'remote_ack' in message:
+                        self.rate.acknowledged(message['remote_ack']['sequence'])
+                    if 'remote_keyframe' in message:
+                        self.keyframe_requested = True
+                    self.server.wake()
+        except (OSError, brv_protocol.ProtocolError) as e:
+            print(f"[BlenderRenderView] Remote viewer {self.address}: {e}")
+        self.close()
+
+    def stream(self):
+        self.connected.wait()
+        try:
+            while not self.closed.is_set():
+                frame = self.server.wait_frame(self)
+                if self.rate.tick():
+                    self.server.wake()
+                if frame is None:
+                    continue
+                (pixels, format, captured, keyframe) = frame
+                if captured is None:
+                    captured = time.perf_counter()  # Same content again, its latency starts now
+                encoded = self.encoder.encode(pixels, format, self.rate.level, keyframe)
+                if encoded is None:
+                    continue
+                (header, payload) = encoded
+                self.sequence += 1
+                header["sequence"] = self.sequence
+                header["latency"] = round(self.rate.latency, 4)
+                self.rate.sent(self.sequence, len(payload), captured)
+                self.send({"remote_frame": header}, payload)
+        except OSError as e:
+            if not self.closed.is_set():
+                print(f"[BlenderRenderView] Remote viewer {self.address}: {e}")
+        self.close()
+
+    def wanted(self, version, now):
+        # Server lock held: (keyframe, fresh) for the frame to send next, None when the viewer is up to date
+        keyframe = self.keyframe_requested or now - self.last_keyframe >= self.server.keyframe_interval
+        if not keyframe and (version, self.rate.level) == self.encoded:
+            return None
+        fresh = self.encoded is None or version != self.encoded[0]
+        if not self.rate.ready(fresh):
+            return None
+        self.encoded = (version, self.rate.level)
+        if keyframe:
+            self.keyframe_requested = False
+            self.last_keyframe = now
+        return (keyframe, fresh)
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+        self.server.session_closed(self)
+        print(f"[BlenderRenderView] Remote viewer {self.address} disconnected: {self.rate.stats()}")
+
+class RemoteStreamServer:
+    """Serves the frames submitted by the UI to the remote viewers, each at the pace of its link.
+
+    Viewers are not authenticated, the server only listens on the loopback interface unless it is
+    given another host (0.0.0.0 for all), to expose the render view on a trusted network only.
+
+    submit() copies the changed areas of a frame and returns at once, the sessions encode the
+    latest frame from their own thread whenever their link can take it."""
+
+    def __init__(self, host="127.0.0.1", port=42070, keyframe_interval=KEYFRAME_INTERVAL, tile=TILE):
+        self.host = host
+        self.port = port
+        self.keyframe_interval = keyframe_interval
+        self.tile = tile
+        self.pixels = None  # (height, width) uint32, latest frame
+        self.format = None
+        self.captured = 0.0
+        self.version = 0
+        self.sessions = []
+        self.server_socket = None
+        self.stopped = False
+        self.changed = threading.Condition()
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen()
+        threading.Thread(target=self.accept, daemon=True).start()
+        print(f"[BlenderRenderView] Serving the render view to remote viewers on {self.host}:{self.port}")
+
+    def accept(self):
+        while not self.stopped:
+            try:
+                (conn, address) = self.server_socket.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            print(f"[BlenderRenderView] Remote viewer connected from {address}")
+            session = RemoteSession(self, conn, address)
+            with self.changed:
+                self.sessions.append(session)
+            session.start()
+
+    def submit(self, pixels, format, captured, rects=None):
+        # UI thread: pixels is a (height, width) uint32 view only valid during the call,
+        # rects the (x, y, w, h) areas changed since the previous frame (None for all of it)
+        with self.changed:
+            if self.pixels is None or self.pixels.shape != pixels.shape or format != self.format or rects is None:
+                self.pixels = pixels.copy()
+                self.format = format
+            else:
+                for (x, y, w, h) in rects:
+                    self.pixels[y:y + h, x:x + w] = pixels[y:y + h, x:x + w]
+            self.captured = captured
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait_frame(self, session):
+        # Session thread: (pixels copy, format, capture time or None, keyframe) of the frame to send
+        # next, None after waiting a bit for one
+        with self.changed:
+            self.changed.wait(0.1)
+            if self.pixels is None:
+                return None
+            wanted = session.wanted(self.version, time.perf_counter())
+            if wanted is None:
+                return None
+            (keyframe, fresh) = wanted
+            return (self.pixels.copy(), self.format, self.captured if fresh else None, keyframe)
+
+    def wake(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    def session_closed(self, session):
+        with self.changed:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def close(self):
+        self.stopped = True
+        if self.server_socket is not None:
+            self.server_socket.close()
+        for session in list(self.sessions):
+            session.close()
+
+class ShapedProxy:
+    """TCP relay limiting the bandwidth and adding latency in both directions, to try a remote
+    link on one machine. A bounded queue per direction gives the sender TCP backpressure."""
+
+    def __init__(self, port, target, bandwidth, latency, chunk=16384, queued_chunks=64):
+        self.port = port
+        self.target = target
+        self.bandwidth = bandwidth  # Bytes/s, 0 for unlimited
+        self.latency = latency  # Seconds, one way
+        self.chunk = chunk
+        self.queued_chunks = queued_chunks
+        self.server_socket = None
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(("127.0.0.1", self.port))
+        self.server_socket.listen()
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                (conn, address) = self.server_socket.accept()
+            except OSError:
+                break
+            upstream = socket.create_connection(self.target)
+            for sock in (conn, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.relay(conn, upstream)
+            self.relay(upstream, conn)
+
+    def relay(self, source, destination):
+        chunks = queue.Queue(self.queued_chunks)
+        link = {"free": time.perf_counter()}  # When the link is done sending the previous chunk
+
+        def read():
+            while True:
+                try:
+                    data = source.recv(self.chunk)
+                except OSError:
+                    data = b""
+                if data:
+                    now = time.perf_counter()
+                    link["free"] = max(now, link["free"]) + (len(data) / self.bandwidth if self.bandwidth else 0)
+                    chunks.put((link["free"] + self.latency, data))
+                else:
+                    chunks.put((0, b""))
+                    break
+
+        def write():
+            while True:
+                (due, data) = chunks.get()
+                if not data:
+                    break
+                time.sleep(max(0.0, due - time.perf_counter()))
+                try:
+                    destination.sendall(data)
+                except OSError:
+                    break
+            for sock in (source, destination):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        threading.Thread(target=read, daemon=True).start()
+        threading.Thread(target=write, daemon=True).start()
+
+    def close(self):
+        if self.server_socket is not None:
+            self.server_socket.close()
+
+def test_frames(width, height, seed=0):
+    # Like a progressive render: the running mean of noisy samples of a gradient, where a third
+    # of the tiles (background) converged from the start
+    generator = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    clean = np.empty((height, width, 3), np.float32)  # B, G, R bytes of ARGB32 pixels
+    clean[..., 0] = 60 + 30 * y
+    clean[..., 1] = 40 + 55 * (x + y)
+    clean[..., 2] = 40 + 160 * x
+    noise = [generator.normal(0, 60, clean.shape).astype(np.float32) for _ in range(4)]
+    background = generator.random((-(-height // TILE), -(-width // TILE))) < 1 / 3
+    background = np.repeat(np.repeat(background, TILE, 0), TILE, 1)[:height, :width]
+    mean = clean.copy()
+    pixels = np.full((height, width, 4), 255, np.uint8)
+    samples = 0
+    while True:
+        samples += 1
+        mean += (clean + noise[samples % len(noise)] - mean) / samples
+        mean[background] = clean[background]
+        np.clip(mean, 0, 255, out=pixels[..., :3], casting="unsafe")
+        yield pixels.view(np.uint32)[..., 0].copy()
+
+def run_test(width, height, fps, duration, bandwidth, latency, keyframe_interval, port=42080):
+    # Generated frames -> RemoteStreamServer -> ShapedProxy -> decoder, over localhost
+    server = RemoteStreamServer("127.0.0.1", port, keyframe_interval)
+    server.start()
+    proxy = ShapedProxy(port + 1, ("127.0.0.1", port), bandwidth, latency)
+    proxy.start()
+    viewer = socket.create_connection(("127.0.0.1", port + 1))
+    viewer.sendall(brv_protocol.encode_frame(brv_protocol.hello(CAPABILITIES)))
+    decoder = TileDecoder()
+    decode_time = [0.0]
+
+    def receive():
+        reader = brv_protocol.FrameReader()
+        while True:
+            try:
+                data = viewer.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            for (message, payload) in reader.feed(data):
+                if 'remote_frame' in message:
+                    start = time.perf_counter()
+                    decoder.decode(message['remote_frame'], payload)
+                    decode_time[0] += time.perf_counter() - start
+                    viewer.sendall(brv_protocol.encode_frame({"remote_ack": {"sequence": message['remote_frame']['sequence']}}))
+
+    receiver = threading.Thread(target=receive, daemon=True)
+    receiver.start()
+    time.sleep(0.5)
+    frames = test_frames(width, height)
+    start = time.perf_counter()
+    count = 0
+    pixels = None
+    while time.perf_counter() - start < duration:
+        pixels = next(frames)
+        server.submit(pixels, 4, time.perf_counter())
+        count += 1
+        time.sleep(max(0.0, start + count / fps - time.perf_counter()))
+    session = server.sessions[0]
+    sent = session.rate.frames
+    sent_bytes = session.rate.bytes
+    print(f"{width}x{height} at {fps} fps for {duration} s, link {bandwidth * 8 / 1e6:.1f} Mbit/s "
+          f"+ {latency * 1000:.0f} ms: {count} frames rendered, {session.rate.stats()}, "
+          f"{sent_bytes * 8 / duration / 1e6:.2f} Mbit/s, raw frames would need "
+          f"{width * height * 4 * fps * 8 / 1e6:.0f} Mbit/s")
+    # The render stopped changing, the level goes back up until the viewer has the exact frame
+    settle = time.perf_counter()
+    identical = False
+    while time.perf_counter() - settle < 30 and not identical:
+        time.sleep(0.5)
+        identical = decoder.key is not None and session.rate.level == 0 and not session.rate.inflight \
+            and np.array_equal(decoder.image(), pixels)
+    print(f"Viewer decoded {decoder.frames} frames ({decoder.keyframes} keyframes), "
+          f"{decoder.bytes / max(1, decoder.frames) / 1024:.1f} KB/frame, "
+          f"{decode_time[0] / max(1, decoder.frames) * 1000:.1f} ms/frame to decode, "
+          f"{session.rate.frames - sent} refinement frames after the render stopped, "
+          f"identical to the last frame {time.perf_counter() - settle:.1f} s later: {identical}")
+    viewer.close()
+    server.close()
+    proxy.close()
+    return identical
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remote render view stream over a shaped localhost link")
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of changing frames")
+    parser.add_argument("--bandwidth", type=float, default=20, help="Link bandwidth in Mbit/s, 0 for unlimited")
+    parser.add_argument("--latency", type=float, default=20, help="One way link latency in ms")
+    parser.add_argument("--keyframe-interval", type=float, default=KEYFRAME_INTERVAL, help="Seconds between keyframes")
+    parser.add_argument("--proxy", type=int, metavar="PORT",
+                        help="Only run the shaped proxy on this port, relaying to --target (between two UIs)")
+    parser.add_argument("--target", default="127.0.0.1:42070", help="HOST:PORT the proxy relays to")
+    args = parser.parse_args()
+    bandwidth = args.bandwidth * 1e6 / 8
+    if args.proxy:
+        (host, port) = args.target.rsplit(":", 1)
+        ShapedProxy(args.proxy, (host, int(port)), bandwidth, args.latency / 1000).start()
+        print(f"Relaying 127.0.0.1:{args.proxy} to {args.target} at {args.bandwidth} Mbit/s + {args.latency} ms, "
+              f"start RenderView_ui.py --backend remote --remote 127.0.0.1:{args.proxy}")
+        threading.Event().wait()
+    if np is None:
+        raise SystemExit("The remote stream needs numpy")
+    (width, height) = (int(value) for value in args.size.lower().split("x"))
+    raise SystemExit(0 if run_test(width, height, args.fps, args.duration, bandwidth, args.latency / 1000,
+                                   args.keyframe_interval) else 1)
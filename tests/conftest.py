@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the root of the add-on, next to the blender __init__.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class AddonRoot:
+    # The root __init__.py imports bpy, collect it as a plain directory instead of
+    # a package that pytest would import to set up the tests below it
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collect_directory(self, path, parent):
+        if str(path) == ROOT:
+            return pytest.Dir.from_parent(parent, path=path)
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(AddonRoot(), "brv-addon-root")
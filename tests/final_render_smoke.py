@@ -0,0 +1,43 @@
+"""Final render stream with Cycles on the CPU, in background mode, to a viewer started offscreen:
+
+    blender -b --factory-startup --python tests/final_render_smoke.py
+
+Also runs with the bpy module (python tests/final_render_smoke.py). Exits with 1 when the stream
+did not publish every sample or the render settings were not restored."""
+
+import importlib
+import os
+import sys
+import time
+
+import bpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(ROOT))
+addon = importlib.import_module(os.path.basename(ROOT))
+
+SAMPLES = 16
+
+
+def main():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Inherited by the viewer
+    addon.register()
+    scene = bpy.context.scene
+    scene.render.engine = 'CYCLES'
+    scene.cycles.device = 'CPU'
+    scene.cycles.samples = SAMPLES
+    scene.render.resolution_x, scene.render.resolution_y, scene.render.resolution_percentage = 320, 180, 100
+    file_format = scene.render.image_settings.file_format
+    start = time.perf_counter()
+    try:
+        bpy.ops.brv.stream_final_render(viewer_arguments="--exit-after 10")
+    finally:
+        addon.unregister()
+    stream = addon.FinalRenderStream
+    print(f"[BRV smoke] blender {bpy.app.version_string}, {stream.samples} / {stream.total} samples "
+          f"in {len(stream.plan)} passes, {time.perf_counter() - start:.1f} s, error: {stream.error}")
+    restored = scene.render.image_settings.file_format == file_format and scene.cycles.samples == SAMPLES
+    sys.exit(0 if stream.error is None and stream.samples == SAMPLES and restored else 1)
+
+
+main()
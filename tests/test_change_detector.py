@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+
+import RenderView_ui
+
+
+def random_image(width, height):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.bits()[:] = os.urandom(image.sizeInBytes())
+    return image
+
+
+@pytest.fixture(params=["numpy", "crc32"])
+def detector(request, monkeypatch):
+    if request.param == "crc32":
+        monkeypatch.setattr(RenderView_ui, "np", None)
+    elif RenderView_ui.np is None:
+        pytest.skip("numpy is not installed")
+    return RenderView_ui.FrameChangeDetector()
+
+
+@pytest.mark.parametrize("width, height", [(640, 360), (333, 201)])
+def test_single_row_changes_are_detected(detector, width, height):
+    image = random_image(width, height)
+    assert len(detector.changed_tiles(image)) == ((width + 127) // 128) * ((height + 127) // 128)
+    assert detector.changed_tiles(image) == []
+
+    # One pixel in rows that a sampled hash would skip
+    pixels = image.bits()
+    for x, y in ((width - 1, height - 1), (5, 129)):
+        offset = y * image.bytesPerLine() + x * 4
+        pixels[offset] = pixels[offset] ^ 1
+    assert sorted(detector.changed_tiles(image)) == sorted([((width - 1) // 128, (height - 1) // 128), (0, 1)])
+    assert detector.changed_tiles(image) == []
+    assert (detector.delivered, detector.dropped) == (2, 2)
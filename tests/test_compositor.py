@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PySide6.QtWidgets")
+from PySide6 import QtGui
+np = pytest.importorskip("numpy")
+
+import RenderView_ui
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def random_frame(width, height, seed):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.bits()[:] = np.random.default_rng(seed).integers(0, 256, image.sizeInBytes(), np.uint8).tobytes()
+    return RenderView_ui.upload_frame(image)
+
+
+@pytest.mark.parametrize("angle", [0, 30, -45, 80, 90, 180])
+@pytest.mark.parametrize("x", [-40.0, 0.0, 17.25, 60.5])
+@pytest.mark.parametrize("overlays", ["A+B", "A", "B", "small B"])
+def test_numpy_wipe_matches_the_painter(app, angle, x, overlays):
+    (width, height) = (161, 97)
+    live = [random_frame(width, height, seed) for seed in range(2)]
+    overlay_A = random_frame(width, height, 2) if "A" in overlays else None
+    overlay_B = random_frame(width, height, 3) if overlays == "A+B" or overlays == "B" else None
+    if overlays == "small B":
+        overlay_B = random_frame(width - 30, height - 20, 3)
+    line = QtWidgets.QGraphicsLineItem(0, -32000, 0, 32000)
+    line.setPos(x, 3.5)
+    line.setRotation(angle)
+    painter, numpy = RenderView_ui.Compositor(), RenderView_ui.NumpyCompositor()
+    for frame in live:
+        # A full frame, then the changed area of the next one
+        rects = None if frame is live[0] else [(10, 20, 50, 30)]
+        expected, _ = painter.compose(frame, None, overlay_A, overlay_B, line, rects)
+        result, _ = numpy.compose(frame, None, overlay_A, overlay_B, line, rects)
+        assert np.array_equal(RenderView_ui.image_array(result), RenderView_ui.image_array(expected))
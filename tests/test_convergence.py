@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+np = pytest.importorskip("numpy")
+
+import RenderView_ui
+
+
+class EventBackend(RenderView_ui.CaptureBackend):
+    # Noisy frames still above the convergence threshold, then nothing new, like a shared memory producer that stopped
+    name = "events"
+
+    def __init__(self, frames, grabs):
+        self.frames = frames
+        self.grabs = grabs
+        self.thread = None
+
+    def grab(self):
+        self.grabs -= 1
+        if self.grabs == 0:
+            self.thread._is_running = False
+        if not self.frames:
+            return None
+        image = QtGui.QImage(64, 48, QtGui.QImage.Format_RGB32)
+        image.bits()[:] = os.urandom(image.sizeInBytes())
+        self.frames -= 1
+        return image
+
+
+def test_settles_when_the_backend_has_no_new_frame():
+    backend = EventBackend(frames=3, grabs=12)
+    monitor = RenderView_ui.ConvergenceMonitor(settle_time=0.05)
+    thread = RenderView_ui.ScreenshotThread(backend, target_fps=100, convergence=monitor)
+    backend.thread = thread
+    converged = []
+    thread.converged.connect(converged.append)
+    thread.mailbox.post = lambda frame: False  # No UI
+    thread.run()
+    assert monitor.energy > monitor.threshold  # Never decayed below it
+    assert monitor.convergences == 1 and len(converged) == 1
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+np = pytest.importorskip("numpy")
+
+import RenderView_ui
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+
+def random_frame(width, height):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.bits()[:] = os.urandom(image.sizeInBytes())
+    return RenderView_ui.frame_image(RenderView_ui.upload_frame(image))
+
+
+@pytest.mark.parametrize("gain", RenderView_ui.DifferenceView.GAINS)
+def test_difference_gain_saturates(app, gain):
+    live, reference = random_frame(300, 200), random_frame(300, 200)
+    view = RenderView_ui.DifferenceView()
+    view.gain = gain
+    result, rects = view.compose(live, QtGui.QPixmap.fromImage(reference))
+    assert rects is None
+
+    channels = [RenderView_ui.image_array(image).view(np.uint8).astype(int) for image in (live, reference)]
+    expected = np.minimum(abs(channels[0] - channels[1]) * gain, 255)
+    expected.reshape(-1, 4)[:, 3] = 255
+    assert np.array_equal(RenderView_ui.image_array(result).view(np.uint8), expected)
+
+
+def test_statistics_ignore_the_reference_alpha(app):
+    live = QtGui.QImage(300, 200, QtGui.QImage.Format_RGB32)
+    live.fill(0xff102030)
+    reference = QtGui.QImage(300, 200, QtGui.QImage.Format_ARGB32_Premultiplied)
+    reference.fill(0x80102034)  # Same color but blue 4 higher, half transparent
+    view = RenderView_ui.DifferenceView()
+    view.compose(live, QtGui.QPixmap.fromImage(reference))
+    (mean, maximum, worst, tile_mean) = view.stats()
+    assert (mean, maximum, tile_mean) == (pytest.approx(4 / 3), 4, pytest.approx(4 / 3))
+    assert view.tile_at(299, 199) == (pytest.approx(4 / 3), 4)
@@ -0,0 +1,22 @@
+"""Final render stream in blender -b, see final_render_smoke.py. Skipped when blender is not installed
+(the BLENDER environment variable gives its path)."""
+
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+BLENDER = os.environ.get("BLENDER") or shutil.which("blender")
+
+pytestmark = pytest.mark.skipif(not BLENDER, reason="needs blender")
+
+def test_stream_final_render_in_background():
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "final_render_smoke.py")
+    result = subprocess.run([BLENDER, "-b", "--factory-startup", "--python-exit-code", "1", "--python", script],
+                            env=dict(os.environ, QT_QPA_PLATFORM="offscreen"), capture_output=True, text=True,
+                            timeout=300)
+    assert result.returncode == 0, result.stdout[-4000:] + result.stderr[-4000:]
+    displayed = re.search(r"(\d+) frames displayed", result.stdout)
+    assert displayed and int(displayed.group(1)) > 0, result.stdout[-4000:]
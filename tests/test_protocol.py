@@ -0,0 +1,186 @@
+import json
+import socket
+
+import pytest
+
+import brv_protocol
+from brv_protocol import HEADER, MAGIC, VERSION, FrameReader, ProtocolError, encode_frame
+
+FRAMES = [({"hello": {"version": VERSION}}, b""), ({"frame_ready": 1, "size": [4, 2]}, bytes(range(200))),
+          ({"render": "é"}, b"\x00" * 3)]
+STREAM = b"".join(encode_frame(message, payload) for (message, payload) in FRAMES)
+
+
+def test_coalesced_frames():
+    reader = FrameReader()
+    assert reader.feed(STREAM + STREAM) == FRAMES + FRAMES
+    assert reader.frames == 6
+    assert reader.buffer == b""
+
+
+@pytest.mark.parametrize("chunk", [1, 3, HEADER.size, HEADER.size + 1, 64])
+def test_split_frames(chunk):
+    reader = FrameReader()
+    frames = []
+    for start in range(0, len(STREAM), chunk):
+        frames += reader.feed(STREAM[start:start + chunk])
+    assert frames == FRAMES
+    assert reader.buffer == b""
+
+
+def test_frame_returned_once_complete():
+    reader = FrameReader()
+    frame = encode_frame(*FRAMES[1])
+    assert reader.feed(frame[:-1]) == []
+    assert reader.feed(frame[-1:] + STREAM[:5]) == [FRAMES[1]]
+    assert bytes(reader.buffer) == STREAM[:5]
+
+
+def test_bad_magic():
+    with pytest.raises(ProtocolError, match="magic"):
+        FrameReader().feed(b"XX" + encode_frame({"a": 1})[2:])
+
+
+def test_bad_magic_after_a_valid_frame():
+    reader = FrameReader()
+    with pytest.raises(ProtocolError, match="magic"):
+        reader.feed(encode_frame({"a": 1}) + b"GET / HTTP/1.1\r\n")
+
+
+def test_bad_version():
+    data = HEADER.pack(MAGIC, VERSION + 1, 0, 2, 0) + b"{}"
+    with pytest.raises(ProtocolError, match="version"):
+        FrameReader().feed(data)
+
+
+def test_frame_too_large():
+    with pytest.raises(ProtocolError, match="too large"):
+        FrameReader().feed(HEADER.pack(MAGIC, VERSION, 0, brv_protocol.MAX_JSON + 1, 0))
+
+
+def test_bad_json():
+    data = b"{not json"
+    with pytest.raises(ProtocolError, match="JSON"):
+        FrameReader().feed(HEADER.pack(MAGIC, VERSION, 0, len(data), 0) + data)
+
+
+def test_negotiate():
+    message = json.loads(json.dumps(brv_protocol.hello(("binary", "other"))))
+    assert brv_protocol.negotiate(message) == {"binary"}
+    with pytest.raises(ProtocolError):
+        brv_protocol.negotiate({"hello": {"version": VERSION + 1}})
+
+
+class PartialSocket:
+    # Takes at most accept bytes per send, then reports a full buffer until drained
+    def __init__(self, accept):
+        self.accept = accept
+        self.full = False
+        self.received = bytearray()
+
+    def send(self, data):
+        if self.full:
+            raise BlockingIOError
+        sent = min(self.accept, len(data))
+        self.received += data[:sent]
+        self.full = sent < len(data)
+        return sent
+
+    def drain(self):
+        self.full = False
+
+
+def frames(data):
+    return [message for (message, payload) in FrameReader().feed(data)]
+
+
+def outbox(policy, **options):
+    dropped = []
+    return brv_protocol.Outbox(policy, dropped=dropped.append, **options), dropped
+
+
+def test_requested_policy():
+    message = json.loads(json.dumps(brv_protocol.hello(policy="skip")))
+    assert brv_protocol.requested_policy(message) == "skip"
+    assert brv_protocol.requested_policy(brv_protocol.hello(policy="unknown")) == "latest"
+    assert brv_protocol.requested_policy(brv_protocol.hello()) == "latest"
+
+
+def test_outbox_all_keeps_everything():
+    box, dropped = outbox("all", limit=10)
+    for i in range(5):
+        assert box.put(encode_frame({"frame_ready": i}), key="frame", message=i)
+    sock = PartialSocket(1 << 20)
+    assert box.flush(sock)
+    assert frames(sock.received) == [{"frame_ready": i} for i in range(5)]
+    assert dropped == [] and box.sent == 5 and not box.pending()
+
+
+def test_outbox_latest_keeps_the_newest_per_key():
+    box, dropped = outbox("latest")
+    box.put(encode_frame({"frame_ready": 0}), key="frame", message=0)
+    box.put(encode_frame({"resolution": 1}))
+    box.put(encode_frame({"frame_ready": 1}), key="frame", message=1)
+    box.put(encode_frame({"other": 0}), key="other", message="other")
+    box.put(encode_frame({"frame_ready": 2}), key="frame", message=2)
+    assert dropped == [0, 1]
+    sock = PartialSocket(1 << 20)
+    assert box.flush(sock)
+    assert frames(sock.received) == [{"resolution": 1}, {"other": 0}, {"frame_ready": 2}]
+    assert box.skipped == 2
+
+
+def test_outbox_latest_never_drops_a_partly_written_frame():
+    box, dropped = outbox("latest")
+    first = encode_frame({"frame_ready": 0}, bytes(100))
+    box.put(first, key="frame", message=0)
+    sock = PartialSocket(10)
+    assert not box.flush(sock)
+    box.put(encode_frame({"frame_ready": 1}), key="frame", message=1)
+    box.put(encode_frame({"frame_ready": 2}), key="frame", message=2)
+    assert dropped == [1]
+    while not box.flush(sock):
+        sock.drain()
+    assert frames(sock.received) == [{"frame_ready": 0}, {"frame_ready": 2}]
+    assert box.queued == 0
+
+
+def test_outbox_skip_drops_new_frames_while_behind():
+    box, dropped = outbox("skip", limit=100)
+    big = encode_frame({"frame_ready": 0}, bytes(100))
+    box.put(big, key="frame", message=0)
+    box.put(encode_frame({"frame_ready": 1}), key="frame", message=1)
+    box.put(encode_frame({"resolution": 1}))  # Not droppable
+    assert dropped == [1]
+    sock = PartialSocket(1 << 20)
+    assert box.flush(sock)
+    box.put(encode_frame({"frame_ready": 2}), key="frame", message=2)
+    assert box.flush(sock)
+    assert frames(sock.received) == [{"frame_ready": 0}, {"resolution": 1}, {"frame_ready": 2}]
+    assert box.queued == 0
+
+
+def test_outbox_stalls_past_the_hard_limit():
+    box, dropped = outbox("all", hard_limit=1000)
+    assert box.put(encode_frame({"a": 0}, bytes(500)))
+    assert not box.put(encode_frame({"a": 1}, bytes(500)))
+    assert box.stalled
+
+
+def test_outbox_flush_over_a_socket():
+    left, right = socket.socketpair()
+    left.setblocking(False)
+    right.settimeout(5)
+    box, dropped = outbox("all")
+    payload = bytes(range(256)) * 4096  # More than a socket buffer
+    for i in range(8):
+        box.put(encode_frame({"frame_ready": i}, payload))
+    reader = FrameReader()
+    received = []
+    while len(received) < 8:
+        box.flush(left)
+        received += reader.feed(right.recv(1 << 20))
+    assert received == [({"frame_ready": i}, payload) for i in range(8)]
+    assert box.flush(left) and box.sent == 8
+    left.close()
+    right.close()
@@ -0,0 +1,127 @@
+import io
+import os
+import struct
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+from PySide6 import QtCore
+np = pytest.importorskip("numpy")
+
+import RenderView_ui
+
+
+def read_qoi(data):
+    # Straightforward decoder following the specification, returns (width, height, 0xffRRGGBB pixels)
+    assert data[:4] == b"qoif"
+    width, height, channels, colorspace = struct.unpack(">IIBB", data[4:14])
+    assert (channels, colorspace) == (3, 0)
+    assert data[-8:] == bytes(7) + b"\x01"
+    index = [(0, 0, 0, 0)] * 64
+    r, g, b, a = 0, 0, 0, 255
+    pixels = []
+    position = 14
+    while len(pixels) < width * height:
+        byte = data[position]
+        position += 1
+        run = 1
+        if byte == 0xfe:
+            r, g, b = data[position:position + 3]
+            position += 3
+        elif byte == 0xff:
+            r, g, b, a = data[position:position + 4]
+            position += 4
+        elif byte >> 6 == 0:
+            r, g, b, a = index[byte]
+        elif byte >> 6 == 1:
+            r = (r + (byte >> 4 & 3) - 2) % 256
+            g = (g + (byte >> 2 & 3) - 2) % 256
+            b = (b + (byte & 3) - 2) % 256
+        elif byte >> 6 == 2:
+            dg = (byte & 63) - 32
+            second = data[position]
+            position += 1
+            r = (r + dg + (second >> 4) - 8) % 256
+            g = (g + dg) % 256
+            b = (b + dg + (second & 15) - 8) % 256
+        else:
+            run = (byte & 63) + 1
+        index[(r * 3 + g * 5 + b * 7 + a * 11) % 64] = (r, g, b, a)
+        pixels += [a << 24 | r << 16 | g << 8 | b] * run
+    assert len(pixels) == width * height
+    assert position == len(data) - 8
+    return width, height, pixels
+
+
+def image(pixels):
+    height, width = pixels.shape
+    result = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    RenderView_ui.image_array(result, writable=True)[...] = pixels
+    return result
+
+
+def random_pixels(width, height, seed):
+    random = np.random.default_rng(seed)
+    # Long runs, small and medium steps, colors seen before and noise
+    steps = random.choice([0, 0, 0, 1, 2, 3, 40, 255], size=(height, width, 3)).astype(np.uint8)
+    rows = np.cumsum(steps, axis=1, dtype=np.uint8)
+    palette = random.integers(0, 256, size=(6, 3), dtype=np.uint8)
+    repeated = random.random((height, width)) < 0.2
+    rows[repeated] = palette[random.integers(0, 6, size=repeated.sum())]
+    rows[height // 2] = rows[height // 2, 0]  # A run over a whole row, longer than 62
+    rgb = rows.astype(np.uint32)
+    return rgb[:, :, 0] << 16 | rgb[:, :, 1] << 8 | rgb[:, :, 2]
+
+
+@pytest.mark.parametrize("width, height, rows", [(97, 61, 256), (97, 61, 5), (300, 7, 1), (1, 1, 256)])
+def test_write_qoi_round_trip(width, height, rows):
+    pixels = random_pixels(width, height, seed=width * height + rows)
+    file = io.BytesIO()
+    fractions = list(RenderView_ui.write_qoi(image(pixels), file, rows=rows))
+    assert fractions[-1] == 1
+
+    decoded = read_qoi(file.getvalue())
+    assert decoded[:2] == (width, height)
+    assert decoded[2] == (pixels | 0xff000000).reshape(-1).tolist()
+
+
+def test_write_qoi_ignores_the_padding_byte():
+    # RGB32 captures leave the fourth byte undefined, the file is opaque
+    pixels = random_pixels(40, 30, seed=1) | (np.arange(40 * 30, dtype=np.uint32).reshape(30, 40) % 256 << 24)
+    file = io.BytesIO()
+    list(RenderView_ui.write_qoi(image(pixels), file))
+    assert read_qoi(file.getvalue())[2] == (pixels | 0xff000000).reshape(-1).tolist()
+
+
+def test_offered_formats_are_writable():
+    supported = {bytes(name).decode() for name in QtGui.QImageWriter.supportedImageFormats()}
+    for name in RenderView_ui.ImageEncoder.formats():
+        assert name == "qoi" or name in supported
+
+
+def test_formats_without_the_webp_plugin(monkeypatch):
+    class Writer:
+        @staticmethod
+        def supportedImageFormats():
+            return [QtCore.QByteArray(b"png")]
+
+    monkeypatch.setattr(RenderView_ui, "QImageWriter", Writer)
+    assert RenderView_ui.ImageEncoder.formats() == ["png", "qoi"]
+    assert RenderView_ui.ImageEncoder.destination("render.webp") == ("render.webp.png", "png")
+
+
+@pytest.mark.parametrize("format, stored", [("tiff", QtGui.QImage.Format_RGBA32FPx4), ("png", QtGui.QImage.Format_RGBA64)])
+def test_float_images_keep_their_precision(tmp_path, format, stored):
+    if format not in RenderView_ui.ImageEncoder.formats():
+        pytest.skip(f"No {format} writer")
+    image = QtGui.QImage(8, 4, QtGui.QImage.Format_RGBA32FPx4)
+    pixels = np.frombuffer(image.bits(), np.float32).reshape(4, 8, 4)
+    pixels[:] = (0.123457, 2.5, 0.5, 1.0)
+    path = str(tmp_path / f"render.{format}")
+    RenderView_ui.ImageEncoder().encode(image, path, format, 6, lambda fraction: None)
+    written = QtGui.QImage(path)
+    assert written.format() == stored
+    color = written.pixelColor(7, 3)
+    assert color.redF() == pytest.approx(0.123457, abs=1e-4)  # 8 bits would be 1 / 255 off
+    assert color.greenF() == (2.5 if format == "tiff" else 1.0)
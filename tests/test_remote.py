@@ -0,0 +1,116 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import brv_remote
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(monkeypatch, bandwidth, delay, frame_size, seconds=10):
+    # Frames always waiting to be sent over a link of bandwidth bytes/s and delay seconds of round
+    # trip, returns the controller, the bytes acknowledged per second and the worst queueing delay
+    clock = Clock()
+    monkeypatch.setattr(brv_remote.time, "perf_counter", clock)
+    rate = brv_remote.RateController()
+    link_free = clock.now
+    acks = []  # (time, sequence, queued seconds)
+    sequence = 0
+    start = clock.now
+    acknowledged = 0
+    worst_queue = 0.0
+    while clock.now < start + seconds:
+        if rate.ready():
+            sequence += 1
+            rate.sent(sequence, frame_size, clock.now)
+            transmit = max(clock.now, link_free)
+            link_free = transmit + frame_size / bandwidth
+            acks.append((link_free + delay, sequence, transmit - clock.now))
+            clock.now += 0.001  # Encoding
+            continue
+        (clock.now, acked, queued) = acks.pop(0)
+        rate.acknowledged(acked)
+        if clock.now > start + seconds / 2:  # Once the link is measured
+            acknowledged += frame_size
+            worst_queue = max(worst_queue, queued)
+    return rate, acknowledged / (seconds / 2), worst_queue
+
+
+@pytest.mark.parametrize("bandwidth, delay, frame_size", [
+    (20e6 / 8, 0.04, 70000),  # Frames shorter than the round trip
+    (5e6 / 8, 0.04, 70000),  # Frames longer than the round trip
+    (100e6 / 8, 0.1, 20000),  # Many frames in flight
+])
+def test_rate_controller_fills_the_link(monkeypatch, bandwidth, delay, frame_size):
+    rate, throughput, worst_queue = simulate(monkeypatch, bandwidth, delay, frame_size)
+    assert throughput > 0.95 * bandwidth
+    assert rate.capacity == pytest.approx(bandwidth, rel=0.05)
+    assert rate.delay() == pytest.approx(delay, rel=0.1)
+    # About one round trip and a frame queued on the link, instead of a fixed number of frames
+    assert worst_queue <= rate.gain * delay + 2 * frame_size / bandwidth
+    assert worst_queue <= rate.max_delay + frame_size / bandwidth
+
+
+def test_server_listens_on_the_loopback_by_default():
+    server = brv_remote.RemoteStreamServer(port=0)
+    server.start()
+    try:
+        assert server.server_socket.getsockname()[0] == "127.0.0.1"
+    finally:
+        server.close()
+
+
+def random_frame(generator, width=333, height=201):
+    return generator.integers(0, 2 ** 32, (height, width), np.uint32)
+
+
+@pytest.mark.parametrize("level", range(len(brv_remote.LEVELS)))
+def test_tiles_round_trip(level):
+    generator = np.random.default_rng(level)
+    encoder, decoder = brv_remote.TileEncoder(), brv_remote.TileDecoder()
+    frame = random_frame(generator)
+    for index in range(4):
+        header, payload = encoder.encode(frame, 4, level)
+        assert header["keyframe"] == (index == 0)
+        decoder.decode(header, payload)
+        assert np.array_equal(decoder.image(), brv_remote.quantize(frame, level))
+        # Some tiles change, the deltas against the previous pixels wrap around
+        (top, right) = (generator.integers(0, 201), generator.integers(1, 333))
+        frame = frame.copy()
+        frame[top:, :right] = random_frame(generator, right, 201 - top)
+
+
+def test_partial_edge_tile():
+    encoder, decoder = brv_remote.TileEncoder(), brv_remote.TileDecoder()
+    frame = random_frame(np.random.default_rng(0))
+    decoder.decode(*encoder.encode(frame, 4, 0))
+    frame[200, 332] ^= 0x00ffffff  # Bottom right pixel, in a 13 x 9 tile
+    header, payload = encoder.encode(frame, 4, 0)
+    assert header["tiles"] == 1
+    assert decoder.decode(header, payload) == [(320, 192, 13, 9)]
+    assert np.array_equal(decoder.image(), frame)
+
+
+def test_unchanged_frame_is_not_sent():
+    encoder = brv_remote.TileEncoder()
+    frame = random_frame(np.random.default_rng(0))
+    encoder.encode(frame, 4, 2)
+    assert encoder.encode(frame.copy(), 4, 2) is None
+    assert encoder.encode(frame, 4, 2, keyframe=True)[0]["tiles"] == 4 * 6
+
+
+def test_level_change_resends_the_tiles():
+    encoder, decoder = brv_remote.TileEncoder(), brv_remote.TileDecoder()
+    frame = random_frame(np.random.default_rng(0))
+    decoder.decode(*encoder.encode(frame, 4, len(brv_remote.LEVELS) - 1))
+    header, payload = encoder.encode(frame, 4, 0)  # Exact frame once the link keeps up again
+    assert header["tiles"] == 4 * 6
+    decoder.decode(header, payload)
+    assert np.array_equal(decoder.image(), frame)
+    assert encoder.encode(frame, 4, 0) is None
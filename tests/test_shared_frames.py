@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+np = pytest.importorskip("numpy")
+
+import brv_frames
+import RenderView_ui
+
+
+@pytest.fixture
+def link():
+    # Producer and backend talking directly instead of through the socket
+    backend = RenderView_ui.SharedFrameBackend()
+    producer = brv_frames.FrameProducer(lambda message, consumers: backend.consumer.frame_ready(message["frame_ready"]))
+    backend.consumer = brv_frames.FrameConsumer(lambda message: producer.consumed(message["frame_consumed"]))
+    backend.build_tables()
+    yield producer, backend
+    backend.consumer.close()
+    producer.close()
+
+
+def publish(producer, value, width=64, height=32):
+    pixels = np.full((height, width, 4), value, np.float32)
+    pixels[..., 3] = 1.0
+    assert producer.publish(pixels, width, height, "rgba32f")
+
+
+def test_float_slot_held_until_released(link):
+    (producer, backend) = link
+    publish(producer, 0.25)
+    assert backend.grab() is not None
+    precise = backend.full_precision()
+    assert backend.full_precision() is None  # Handed over once
+    assert len(producer.pending) == 1  # Held, not copied
+
+    image = RenderView_ui.SharedFrameBackend.float_image(precise[2], precise[1])
+    assert image.format() == QtGui.QImage.Format_RGBA32FPx4
+    assert image.pixelColor(10, 10).redF() == pytest.approx(0.25, abs=1e-4)
+
+    backend.release_full_precision(precise)
+    assert not producer.pending
+
+
+def test_float_slot_not_taken_is_released_by_the_next_grab(link):
+    (producer, backend) = link
+    publish(producer, 0.25)
+    backend.grab()  # Unchanged frame, the UI never takes its float pixels
+    publish(producer, 0.5)
+    backend.grab()
+    assert len(producer.pending) == 1
+    precise = backend.full_precision()
+    assert precise[0][2] == 2  # Sequence of the second frame
+    backend.release_full_precision(precise)
+    assert not producer.pending
+
+
+def test_slot_with_another_frame_is_given_back(link):
+    (producer, backend) = link
+    for attempt in range(3):
+        publish(producer, 0.25)
+        (ring, slot, sequence) = backend.consumer.latest
+        producer.ring.write_header(slot, sequence + 100, 64, 32, 64 * 16, "rgba32f", 0)  # Overwritten meanwhile
+        assert backend.grab() is None  # Skipped
+        assert not producer.pending
+    # Still sent new frames after more errors than it may hold slots
+    publish(producer, 0.5)
+    assert backend.grab() is not None
+    backend.release_full_precision(backend.full_precision())
@@ -0,0 +1,107 @@
+import os
+import zlib
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+
+import RenderView_ui
+
+Session = RenderView_ui.SnapshotSession
+THUMBNAIL = [4, 2, 16, QtGui.QImage.Format_RGB32.value]
+
+
+def append(session, index, size=1000):
+    pixels = bytes([index]) * size
+    record = session.append({"index": index}, bytes([index]) * 32, zlib.compress(pixels))
+    return record, pixels
+
+
+def test_records_survive_a_restart(tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    session = Session(path)
+    written = [append(session, index) for index in range(3)]
+    session.close()
+
+    session = Session(path)
+    records = session.records()
+    assert [metadata["index"] for (record, metadata) in records] == [0, 1, 2]
+    for ((record, metadata), (_, pixels)) in zip(records, written):
+        assert session.pixels(record) == pixels
+        thumbnail = session.thumbnail(record, THUMBNAIL)
+        assert (thumbnail.width(), thumbnail.height()) == (4, 2)
+        assert bytes(thumbnail.constBits())[:1] == bytes([metadata["index"]])
+    session.close()
+
+
+def test_torn_record_is_dropped(tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    session = Session(path)
+    append(session, 0)
+    session.close()
+    size = os.path.getsize(path)
+    with open(path, "ab") as file:
+        # Crash while writing the next record: header written, data cut short
+        file.write(Session.RECORD.pack(Session.RECORD_MAGIC, 0, 10, 32, 500) + b"{}")
+
+    session = Session(path)
+    assert [metadata["index"] for (record, metadata) in session.records()] == [0]
+    assert os.path.getsize(path) == size
+    (record, pixels) = append(session, 1)  # Appended right after the valid data
+    session.close()
+
+    session = Session(path)
+    records = session.records()
+    assert [metadata["index"] for (record, metadata) in records] == [0, 1]
+    assert session.pixels(records[1][0]) == pixels
+    session.close()
+
+
+def test_deleted_records_are_compacted_on_close(tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    session = Session(path)
+    written = [append(session, index, size=100000) for index in range(3)]
+    session.delete(written[0][0])
+    session.delete(written[2][0])
+    size = os.path.getsize(path)
+    session.close()
+    assert os.path.getsize(path) < size / 2
+
+    session = Session(path)
+    records = session.records()
+    assert [metadata["index"] for (record, metadata) in records] == [1]
+    assert session.pixels(records[0][0]) == written[1][1]
+    assert session.dead_bytes == 0
+    session.close()
+
+
+def test_a_few_deleted_records_are_kept_until_they_weigh(tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    session = Session(path)
+    written = [append(session, index) for index in range(3)]
+    session.delete(written[1][0])
+    size = os.path.getsize(path)
+    session.close()
+    assert os.path.getsize(path) == size  # Less than half of the file is dead
+
+    session = Session(path)
+    assert [metadata["index"] for (record, metadata) in session.records()] == [0, 2]
+    assert session.dead_bytes > 0
+    session.close()
+
+
+def test_file_removed_once_empty(tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    session = Session(path)
+    (record, pixels) = append(session, 0)
+    session.delete(record)
+    session.close()
+    assert not os.path.exists(path)
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "scene.brvs"
+    path.write_bytes(b"PK\x03\x04" + bytes(100))
+    with pytest.raises(ValueError):
+        Session(str(path))
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtGui = pytest.importorskip("PySide6.QtGui")
+
+import RenderView_ui
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtGui.QGuiApplication.instance() or QtGui.QGuiApplication([])
+
+
+def wait_for(condition, timeout=10):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def random_image(width=64, height=48):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.bits()[:] = os.urandom(image.sizeInBytes())
+    return image
+
+
+def pixels(image):
+    return bytes(image.convertToFormat(QtGui.QImage.Format_RGB32).constBits())
+
+
+def test_compressed_in_the_background(app):
+    store = RenderView_ui.SnapshotStore()
+    image = random_image()
+    key = store.add(image)
+    entry = store.entries[key]
+    wait_for(lambda: entry.compressed is not None)
+    assert entry.raw is None
+    assert pixels(store.get(key).toImage()) == pixels(image)
+    assert pixels(store.image(key)) == pixels(image)
+    store.close()
+
+
+def test_spilled_over_budget_and_read_back(app, tmp_path):
+    store = RenderView_ui.SnapshotStore(budget=1, directory=str(tmp_path))
+    images = [random_image() for _ in range(3)]
+    keys = [store.add(image) for image in images]
+    wait_for(lambda: all(store.entries[key].path for key in keys))
+    assert store.stats()["spilled"] == 3 and store.stats()["resident_bytes"] == 0
+    assert sorted(os.listdir(tmp_path)) == sorted(f"snapshot_{key}.zlib" for key in keys)
+    for (key, image) in zip(keys, images):
+        assert pixels(store.image(key)) == pixels(image)
+
+    store.remove(keys[0])
+    assert not os.path.exists(tmp_path / f"snapshot_{keys[0]}.zlib")
+    store.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spill_directory_removed_on_close(app):
+    store = RenderView_ui.SnapshotStore(budget=1)
+    key = store.add(random_image())
+    wait_for(lambda: store.entries[key].path)
+    directory = store.directory
+    assert os.path.isdir(directory)
+    store.close()
+    assert not os.path.exists(directory)
+
+
+def test_session_restored(app, tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    store = RenderView_ui.SnapshotStore(session=RenderView_ui.SnapshotSession(path))
+    images = [random_image(), random_image(80, 20)]
+    keys = [store.add(image) for image in images]
+    wait_for(lambda: all(store.entries[key].record for key in keys))
+    store.close()
+
+    store = RenderView_ui.SnapshotStore(budget=1, session=RenderView_ui.SnapshotSession(path))
+    restored = store.restore()
+    assert len(restored) == 2
+    for (key, image) in zip(restored, images):
+        assert pixels(store.image(key)) == pixels(image)
+        assert store.thumbnail(key).width() <= RenderView_ui.SnapshotStore.thumbnail_size.width()
+    store.close()
+
+
+def test_deleted_while_written_to_the_session(app, tmp_path):
+    path = str(tmp_path / "scene.brvs")
+    session = RenderView_ui.SnapshotSession(path)
+    store = RenderView_ui.SnapshotStore(session=session)
+    deleted = threading.Event()
+    append, delete = session.append, session.delete
+
+    def append_while_removed(metadata, thumbnail, data):
+        record = append(metadata, thumbnail, data)
+        store.remove(key)  # The user deletes the snapshot before the worker recorded where it went
+        return record
+
+    def delete_record(record):
+        delete(record)
+        deleted.set()
+
+    session.append, session.delete = append_while_removed, delete_record
+    key = store.add(random_image())
+    assert deleted.wait(10)
+    assert session.records() == []
+    store.close()
+    assert not os.path.exists(path)  # Nothing left in the session
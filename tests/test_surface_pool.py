@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("PySide6.QtGui")
+
+import RenderView_ui
+
+
+def pool_with(released):
+    allocated = iter(range(100))
+    return RenderView_ui.CaptureSurfacePool(lambda key: [next(allocated)], released.append, count=2)
+
+
+def test_clear_waits_for_the_surface_being_uploaded():
+    released = []
+    pool = pool_with(released)
+    surface = pool.acquire((64, 32))
+    token = pool.lock_current()
+    freed_during_upload = []
+
+    def upload():
+        time.sleep(0.1)
+        freed_during_upload.append(surface in released)
+        pool.unlock(token)
+
+    ui = threading.Thread(target=upload)
+    ui.start()
+    pool.clear()
+    ui.join()
+    assert freed_during_upload == [False]
+    assert sorted(map(tuple, released)) == [(0,), (1,)]
+
+
+def test_clear_leaves_a_surface_still_locked_allocated():
+    released = []
+    pool = pool_with(released)
+    surface = pool.acquire((64, 32))
+    token = pool.lock_current()
+    pool.clear(timeout=0.01)
+    assert surface not in released and len(released) == 1
+    pool.unlock(token)  # Too late, nothing is freed from the UI thread
+    assert len(released) == 1
@@ -0,0 +1,49 @@
+"""X11 shared memory capture of a real window, under Xvfb. Skipped when Xvfb or xterm is not installed."""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32" or not (shutil.which("Xvfb") and shutil.which("xterm")),
+                                reason="needs Xvfb and xterm")
+
+def wait_for(condition, timeout=10):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise TimeoutError
+        time.sleep(0.05)
+
+def test_capture_xterm_window(tmp_path):
+    display = 97
+    xvfb = subprocess.Popen(["Xvfb", f":{display}", "-screen", "0", "1280x720x24", "-nolisten", "tcp"])
+    env = dict(os.environ, DISPLAY=f":{display}")
+    window_file = tmp_path / "window"
+    xterm = None
+    try:
+        wait_for(lambda: os.path.exists(f"/tmp/.X11-unix/X{display}"))
+        # xterm exports its own window id
+        xterm = subprocess.Popen(["xterm", "-geometry", "80x24", "-e", "sh", "-c",
+                                  f"echo $WINDOWID > {window_file}; while true; do date; sleep 0.1; done"], env=env)
+        wait_for(lambda: window_file.exists() and window_file.read_text().strip())
+        window = int(window_file.read_text())
+        result = subprocess.run([sys.executable, "RenderView_ui.py", "--backend", "x11", "--window-id", hex(window),
+                                 "--exit-after", "3"], env=dict(env, QT_QPA_PLATFORM="offscreen"), cwd=ROOT,
+                                capture_output=True, text=True, timeout=60)
+        delivered = re.search(r"(\d+) frames delivered", result.stdout)
+        assert delivered, result.stdout + result.stderr
+        assert int(delivered.group(1)) > 0
+        # The clock printed every 0.1 s keeps changing the window
+        changed = re.search(r"(\d+) changed frames delivered", result.stdout)
+        assert changed and int(changed.group(1)) > 1
+    finally:
+        if xterm is not None:
+            xterm.kill()
+        xvfb.kill()